@@ -1,37 +1,20 @@
 #!/usr/bin/env python3
 """
 Risk Stratification Web Application (CSV-based)
-- Reads patient data from trainingk.csv
+- Reads patient data from trainingk.csv, or from SQLite with STORAGE_BACKEND=sqlite
 - Supports filtering and new patient addition
 - Generates AI recommendations
 """
 
 import os
-import io
 import re
-import smtplib
-import traceback
+import threading
+import time
 from datetime import datetime
+import numpy as np
 import pandas as pd
 
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from email.mime.application import MIMEApplication
-
-from flask import Flask, render_template, jsonify, request, send_file
-
-# ReportLab for PDF generation
-from reportlab.lib.pagesizes import A4
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image, Table, TableStyle, PageBreak
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.enums import TA_CENTER, TA_LEFT
-from reportlab.lib import colors
-from reportlab.lib.units import inch
-
-# Matplotlib for charts embedded in PDF
-import matplotlib
-matplotlib.use('Agg')  # non-interactive backend
-import matplotlib.pyplot as plt
+from flask import Flask, Response, render_template, jsonify, request, send_file
 
 # dotenv for env variables
 from dotenv import load_dotenv
@@ -39,8 +22,25 @@ load_dotenv()
 
 # Import AI recommendations and ML model
 from risk.recommendations import get_ai_recommendations
-from risk.model import load_model, assign_label
-from risk.preprocess import preprocess_features, feature_cols, target_cols
+from risk.model import load_model
+from risk.labels import assign_label
+from risk.backends import backend_of
+from risk.preprocess import preprocess_record, target_cols
+from risk.db import (init_patient_store, query_patients, query_patients_by_label, summarize_patients,
+                     count_patients, insert_patient, get_patient_record, get_dataset_version)
+from risk.search import PatientSearchIndex
+from risk.schema import load_patient_table, append_patient_rows
+from risk.outbox import DeliveryQueue
+from risk.prediction_cache import PredictionCache, feature_key
+from risk.http_cache import conditional_json
+from risk.response_cache import ResponseCache
+from risk.export import (EXPORT_MAX_PATIENTS, start_export, get_export_progress, stream_zip,
+                         build_merged_pdf, report_filename)
+from risk.smtp_pool import SMTPConnectionPool
+from risk.email_service import init_email_service, send_bulk_recommendations_emails
+from risk.metrics import metrics, span
+from risk.profiling import install_flask_profiler
+from risk.logger import logger, hot, install_flask_request_logging
 
 # ---------------------------
 # Email configuration
@@ -52,11 +52,20 @@ EMAIL_HOST_PASSWORD = os.getenv("EMAIL_HOST_PASSWORD")
 EMAIL_USE_TLS = os.getenv("EMAIL_USE_TLS", "True") == "True"
 EMAIL_FROM_NAME = os.getenv("EMAIL_FROM_NAME", EMAIL_HOST_USER or "no-reply")
 
+# Authenticated SMTP sessions are reused across messages instead of reconnecting per email
+smtp_pool = SMTPConnectionPool(EMAIL_HOST, EMAIL_PORT, EMAIL_HOST_USER, EMAIL_HOST_PASSWORD,
+                               use_tls=EMAIL_USE_TLS, size=int(os.getenv("SMTP_POOL_SIZE", 4)))
+
 def send_email(to_email: str, subject: str, message: str, attachment_bytes: bytes = None, attachment_filename: str = None):
     """Send an email using SMTP with optional attachment"""
     if not (EMAIL_HOST and EMAIL_HOST_USER and EMAIL_HOST_PASSWORD):
+        metrics.inc("risk_email_failures_total", kind="report")
         raise RuntimeError("SMTP configuration is incomplete")
 
+    from email.mime.text import MIMEText
+    from email.mime.multipart import MIMEMultipart
+    from email.mime.application import MIMEApplication
+
     msg = MIMEMultipart()
     msg["From"] = f"{EMAIL_FROM_NAME} <{EMAIL_HOST_USER}>"
     msg["To"] = to_email
@@ -70,22 +79,57 @@ def send_email(to_email: str, subject: str, message: str, attachment_bytes: byte
         part['Content-Disposition'] = f'attachment; filename="{attachment_filename}"'
         msg.attach(part)
 
-    with smtplib.SMTP(EMAIL_HOST, EMAIL_PORT) as server:
-        if EMAIL_USE_TLS:
-            server.starttls()
-        server.login(EMAIL_HOST_USER, EMAIL_HOST_PASSWORD)
-        server.send_message(msg)
+    try:
+        with span("smtp_send"):
+            smtp_pool.send_message(msg)
+    except Exception:
+        metrics.inc("risk_email_failures_total", kind="report")
+        raise
+
+    hot("email_sent", "Email sent", to=to_email, subject=subject)
+
+def deliver_patient_report(kind: str, payload: dict):
+    """Delivery queue handler: render the patient's PDF report and email it"""
+    if kind != 'patient_report':
+        raise ValueError(f"Unknown delivery kind: {kind}")
+
+    from risk.report import create_patient_pdf_bytes
 
-    print(f"[INFO] Email sent to {to_email} (subject: {subject})")
+    patient = payload['patient']
+    pdf_bytes = create_patient_pdf_bytes(patient)
+    attachment_name = f"patient_report_{patient['DESYNPUF_ID']}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+
+    message_body = (
+        f"Hello,\n\nPlease find attached the risk prediction report for patient {patient['DESYNPUF_ID']}.\n\n"
+        f"Summary:\n30-day: {patient.get('RISK_30D', 0):.2f}%\n60-day: {patient.get('RISK_60D', 0):.2f}%\n90-day: {patient.get('RISK_90D', 0):.2f}%\n"
+        f"Label: {patient.get('RISK_LABEL', 'Unknown')}\n\nRegards,\nRisk Stratification System"
+    )
+    send_email(payload['to'], "Patient Risk Prediction Report", message_body,
+               attachment_bytes=pdf_bytes, attachment_filename=attachment_name)
+
+# Reports are rendered and emailed by background workers, off the request path
+delivery_queue = DeliveryQueue(
+    deliver_patient_report,
+    workers=int(os.getenv("DELIVERY_WORKERS", 2)),
+    max_attempts=int(os.getenv("DELIVERY_MAX_ATTEMPTS", 5)),
+    base_delay=float(os.getenv("DELIVERY_RETRY_DELAY", 30))
+)
 
 # ---------------------------
 # CSV Data Management
 # ---------------------------
 CSV_FILE = "trainingk.csv"
 
+# "csv" serves an in-memory copy of trainingk.csv; "sqlite" serves from risk/db.py's patient table
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "csv").lower()
+
+# In-memory patient table and its search index, reloaded when the CSV changes on disk
+_patient_table = {'df': None, 'index': None, 'mtime': None}
+_patient_table_lock = threading.Lock()
+
 # Load ML model
 def load_ml_model():
-    """Load the trained ML model"""
+    """Load the trained ML model; returns (model, version), model is None when unavailable"""
     try:
         # Try to load the most recent model
         model_paths = [
@@ -94,35 +138,83 @@ def load_ml_model():
         
         for model_path in model_paths:
             if os.path.exists(model_path):
-                print(f"Loading ML model from {model_path}")
-                return load_model(model_path)
+                version = f"{os.path.basename(model_path)}@{os.stat(model_path).st_mtime_ns}"
+                model = load_model(model_path)
+                logger.info(f"Loaded ML model from {model_path} ({backend_of(model['RISK_30D'])})")
+                return model, version
         
-        print("No ML model found, using fallback prediction")
-        return None
+        logger.warning("No ML model found, using fallback prediction")
+        return None, 'fallback'
     except Exception as e:
-        print(f"Error loading ML model: {e}")
-        return None
+        logger.error(f"Error loading ML model: {e}")
+        return None, 'fallback'
+
+# The model (and the sklearn stack it unpickles) is loaded on first use, not at import
+_ml_model = {'loaded': False, 'model': None, 'version': None}
+_ml_model_lock = threading.Lock()
+
+def get_ml_model():
+    """Trained model, loaded once on first call; None when no model file exists"""
+    if not _ml_model['loaded']:
+        with _ml_model_lock:
+            if not _ml_model['loaded']:
+                model, version = load_ml_model()
+                _ml_model.update(model=model, version=version, loaded=True)
+    return _ml_model['model']
+
+def get_model_version():
+    """Identifier of the loaded model ('fallback' for the formula), part of prediction cache keys"""
+    get_ml_model()
+    return _ml_model['version']
+
+# Repeat submissions of the same patient are answered without re-running the model
+prediction_cache = PredictionCache()
+
+# Encoded /api/data pages per filter combination, dropped when the dataset version changes
+data_cache = ResponseCache()
+
+def warm_up():
+    """Load the model and the PDF stack so the first prediction/report doesn't pay for them"""
+    start = time.perf_counter()
+    try:
+        get_ml_model()
+        import risk.report  # noqa: F401  (reportlab)
+        logger.info(f"Warm-up finished in {time.perf_counter() - start:.1f}s")
+    except Exception as e:
+        logger.error(f"Warm-up failed: {e}")
 
-# Load model at startup
-ml_model = load_ml_model()
+def preload():
+    """Load the model, patient table and PDF stack synchronously
+
+    Called by wsgi.py in the gunicorn master before it forks, so every worker shares
+    these pages copy-on-write instead of loading its own copy.
+    """
+    get_ml_model()
+    if STORAGE_BACKEND != 'sqlite':
+        get_patient_table()
+    import risk.report  # noqa: F401  (reportlab)
 
-def predict_single_patient(patient_data, regressors):
+def start_warm_up():
+    """Run warm_up() in a background thread when WARM_UP=1"""
+    if os.getenv("WARM_UP", "0") == "1":
+        threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+
+def patient_feature_vector(patient_data):
+    """The model's feature_cols values for one patient (1 x n array), as preprocess_features computes them"""
+    return np.array([preprocess_record(patient_data)])
+
+def predict_single_patient(patient_data, regressors, X=None):
     """Predict risk for a single patient using ML model"""
     try:
-        # Create DataFrame
-        patient_df = pd.DataFrame([patient_data])
-        
-        # Preprocess
-        processed_df = preprocess_features(patient_df)
-        
-        # Get features
-        X = processed_df[feature_cols].values
+        if X is None:
+            X = patient_feature_vector(patient_data)
         
         # Make predictions
         predictions = {}
-        for col in target_cols:
-            pred = regressors[col].predict(X)
-            predictions[col] = float(pred[0])
+        with span("model_predict"):
+            for col in target_cols:
+                pred = regressors[col].predict(X)
+                predictions[col] = float(pred[0])
         
         # Assign risk label
         risk_label = assign_label(predictions['RISK_30D'])
@@ -131,7 +223,8 @@ def predict_single_patient(patient_data, regressors):
         top_features = "AGE, TOTAL_CLAIMS_COST, COMOR_COUNT"  # Default
         
         # Generate AI recommendations
-        ai_recommendations = get_ai_recommendations(patient_data, top_features)
+        with span("recommendations"):
+            ai_recommendations = get_ai_recommendations(patient_data, top_features)
         
         return {
             'RISK_30D': round(predictions['RISK_30D'], 2),
@@ -143,257 +236,241 @@ def predict_single_patient(patient_data, regressors):
         }
         
     except Exception as e:
-        print(f"Error in predict_single_patient: {e}")
+        logger.error(f"Error in predict_single_patient: {e}")
         raise e
 
 def load_csv_data():
-    """Load data from CSV file"""
+    """Load data from CSV file using the compact patient schema"""
     try:
-        df = pd.read_csv(CSV_FILE, low_memory=False)
-        return df
+        return load_patient_table(CSV_FILE)
     except Exception as e:
-        print(f"Error loading CSV: {e}")
+        logger.error(f"Error loading CSV: {e}")
         return pd.DataFrame()
 
+def _csv_mtime():
+    try:
+        return os.stat(CSV_FILE).st_mtime_ns
+    except OSError:
+        return None
+
+def get_patient_table():
+    """Return the cached patient DataFrame and its search index"""
+    mtime = _csv_mtime()
+    with _patient_table_lock:
+        if _patient_table['df'] is None or _patient_table['mtime'] != mtime:
+            with span("csv_load"):
+                df = load_csv_data()
+                _patient_table.update(df=df, index=PatientSearchIndex.from_frame(df), mtime=mtime)
+        return _patient_table['df'], _patient_table['index']
+
+def append_patient_row(data):
+    """Append one patient to the CSV and to the in-memory table and search index"""
+    df, search_index = get_patient_table()
+    new_row = pd.DataFrame([data])
+
+    with _patient_table_lock:
+        if not df.empty and set(new_row.columns) <= set(df.columns):
+            # Same schema: append a single line instead of rewriting the whole file
+            try:
+                with span("csv_append"):
+                    new_row.reindex(columns=df.columns).to_csv(CSV_FILE, mode='a', header=False, index=False)
+            except Exception as e:
+                logger.error(f"Error appending to CSV: {e}")
+                return False
+            updated = append_patient_rows(df, new_row)
+        else:
+            updated = append_patient_rows(df, new_row)
+            with span("csv_rewrite"):
+                saved = save_csv_data(updated)
+            if not saved:
+                return False
+
+        search_index.add(data.get('DESYNPUF_ID'), data.get('TOP_3_FEATURES'), data.get('AI_RECOMMENDATIONS'))
+        _patient_table.update(df=updated, index=search_index, mtime=_csv_mtime())
+    return True
+
+def dataset_version():
+    """(version, last-modified unix time) of the patient data behind /api/data and /api/summary
+
+    SQLite keeps a counter bumped by every insert and rescore. The CSV file is shared by
+    all workers, so its size and mtime serve as the version there.
+    """
+    if STORAGE_BACKEND == 'sqlite':
+        version, updated_at = get_dataset_version()
+        return (f"{version}.{int(updated_at * 1000):x}", updated_at) if version else (None, None)
+    try:
+        stat = os.stat(CSV_FILE)
+    except OSError:
+        return None, None
+    return f"{stat.st_mtime_ns:x}.{stat.st_size:x}", stat.st_mtime
+
 def save_csv_data(df):
     """Save data to CSV file"""
     try:
         df.to_csv(CSV_FILE, index=False)
         return True
     except Exception as e:
-        print(f"Error saving CSV: {e}")
+        logger.error(f"Error saving CSV: {e}")
         return False
 
+def save_new_patient(data):
+    """Persist a newly scored patient to the configured storage backend"""
+    if STORAGE_BACKEND == 'sqlite':
+        try:
+            with span("sqlite_insert"):
+                insert_patient(data)
+            return True
+        except Exception as e:
+            logger.error(f"Error saving patient to SQLite: {e}")
+            return False
+
+    return append_patient_row(data)
+
 def get_patient_by_id(patient_id: str):
     """Get patient data by ID"""
-    df = load_csv_data()
+    df, _ = get_patient_table()
     if df.empty:
         return pd.DataFrame()
     
     patient = df[df['DESYNPUF_ID'] == patient_id]
     return patient
 
-# ---------------------------
-# Flask app initialization
-# ---------------------------
-app = Flask(__name__)
+def _frame_to_records(df):
+    """DataFrame rows as dicts, with NaN replaced by None"""
+    return df.astype(object).where(df.notna(), None).to_dict('records')
 
-# ---------------------------
-# PDF Generation (same as before)
-# ---------------------------
-def _create_risk_bar_chart_png(risk30, risk60, risk90):
-    """Create PNG bytes for risk bar chart"""
-    fig, ax = plt.subplots(figsize=(6, 3.5))
-    labels = ['30-day', '60-day', '90-day']
-    values = [risk30 if risk30 is not None else 0,
-              risk60 if risk60 is not None else 0,
-              risk90 if risk90 is not None else 0]
-    ax.bar(labels, values)
-    ax.set_ylim(0, max(100, max(values) * 1.1))
-    ax.set_ylabel('Risk (%)')
-    ax.set_title('Predicted Risk over Time')
-    plt.tight_layout()
-
-    buf = io.BytesIO()
-    fig.savefig(buf, format='png')
-    plt.close(fig)
-    buf.seek(0)
-    return buf.getvalue()
-
-def _create_label_pie_chart_png(risk_label):
-    """Create PNG bytes for risk label pie chart"""
-    labels = [risk_label if risk_label else 'Unknown']
-    sizes = [1]
-    fig, ax = plt.subplots(figsize=(4, 2.5))
-    ax.pie(sizes, labels=labels, startangle=90, wedgeprops=dict(width=0.5))
-    ax.set_title('Risk Level')
-    plt.tight_layout()
-
-    buf = io.BytesIO()
-    fig.savefig(buf, format='png')
-    plt.close(fig)
-    buf.seek(0)
-    return buf.getvalue()
-
-def create_patient_pdf_bytes(patient: dict, include_large_table: bool = True):
-    """Build a PDF report for a single patient and return bytes"""
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=30, leftMargin=30, topMargin=30, bottomMargin=18)
-    elements = []
-
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle('Title', parent=styles['Heading1'], fontSize=18, alignment=TA_CENTER, spaceAfter=14)
-    h2_style = ParagraphStyle('H2', parent=styles['Heading2'], fontSize=12, alignment=TA_LEFT, spaceAfter=8)
-    normal = styles['Normal']
-
-    # Title
-    title = Paragraph("Patient Risk Assessment Report", title_style)
-    elements.append(title)
-
-    # Patient Info block
-    gender_str = 'Male' if patient.get('GENDER') == 1 else 'Female'
-    info_html = f"""
-    <b>Patient Information</b><br/>
-    <b>Patient ID:</b> {patient.get('DESYNPUF_ID', 'N/A')}<br/>
-    <b>Age:</b> {patient.get('AGE', 'N/A')}<br/>
-    <b>Gender:</b> {gender_str}<br/>
-    <b>Email:</b> {patient.get('EMAIL', 'Not Provided')}<br/>
-    <b>Total Claims Cost:</b> {patient.get('TOTAL_CLAIMS_COST', 'N/A')}<br/>
-    <b>Index Date:</b> {patient.get('INDEX_DATE', 'N/A')}<br/>
-    <b>Report Generated:</b> {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
-    """
-    elements.append(Paragraph(info_html, normal))
-    elements.append(Spacer(1, 12))
-
-    # Risk summary table
-    risk_30 = patient.get('RISK_30D', 'N/A')
-    risk_60 = patient.get('RISK_60D', 'N/A')
-    risk_90 = patient.get('RISK_90D', 'N/A')
-    label = patient.get('RISK_LABEL', 'N/A')
-    top_feats = patient.get('TOP_3_FEATURES', 'N/A')
-
-    table_data = [
-        ['Metric', 'Value'],
-        ['30-Day Risk (%)', f"{risk_30}"],
-        ['60-Day Risk (%)', f"{risk_60}"],
-        ['90-Day Risk (%)', f"{risk_90}"],
-        ['Risk Label', str(label)],
-        ['Top Features', str(top_feats)]
-    ]
-    table = Table(table_data, colWidths=[2.5 * inch, 3.5 * inch])
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#d3d3d3")),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
-        ('GRID', (0, 0), (-1, -1), 0.25, colors.HexColor("#cccccc"))
-    ]))
-    elements.append(table)
-    elements.append(Spacer(1, 14))
-
-    # Charts
-    try:
-        bar_png = _create_risk_bar_chart_png(
-            risk30=(risk_30 if isinstance(risk_30, (int, float)) else (float(risk_30) if str(risk_30).replace('.', '', 1).isdigit() else 0)),
-            risk60=(risk_60 if isinstance(risk_60, (int, float)) else (float(risk_60) if str(risk_60).replace('.', '', 1).isdigit() else 0)),
-            risk90=(risk_90 if isinstance(risk_90, (int, float)) else (float(risk_90) if str(risk_90).replace('.', '', 1).isdigit() else 0))
-        )
-        pie_png = _create_label_pie_chart_png(label)
-        bar_img = Image(io.BytesIO(bar_png), width=6 * inch, height=3 * inch)
-        elements.append(bar_img)
-        elements.append(Spacer(1, 8))
-        pie_img = Image(io.BytesIO(pie_png), width=3.5 * inch, height=2.5 * inch)
-        elements.append(pie_img)
-        elements.append(Spacer(1, 12))
-    except Exception as chart_err:
-        print(f"Chart generation error: {chart_err}")
-        elements.append(Paragraph("Charts unavailable due to rendering error.", normal))
-        elements.append(Spacer(1, 8))
-
-    # AI Recommendations section
-    recommendations = patient.get('AI_RECOMMENDATIONS', 'No recommendations available')
-    elements.append(Paragraph("<b>AI-Generated Recommendations:</b>", h2_style))
-    elements.append(Paragraph(str(recommendations), normal))
-    elements.append(Spacer(1, 12))
-
-    # Footer
-    elements.append(Spacer(1, 16))
-    elements.append(Paragraph("Generated by Risk Stratification System", styles['Italic']))
-
-    # Build PDF
-    try:
-        doc.build(elements)
-    except Exception as build_err:
-        print(f"PDF build failed: {build_err}")
-        raise
+def get_export_patients(limit: int, risk_label: str = None):
+    """Highest 30-day risk patients (optionally one label) as report dicts"""
+    if STORAGE_BACKEND == 'sqlite':
+        return _frame_to_records(query_patients(risk_label=risk_label, limit=limit))
 
-    buffer.seek(0)
-    return buffer.getvalue()
+    df, _ = get_patient_table()
+    if df.empty:
+        return []
+    if risk_label:
+        df = df[df['RISK_LABEL'] == risk_label]
+    return _frame_to_records(df.nlargest(limit, 'RISK_30D'))
 
 # ---------------------------
-# Flask endpoints
+# Services (shared by the Flask views below and the ASGI app in asgi.py)
 # ---------------------------
-@app.route('/')
-def index():
-    return render_template('index.html')
+HIGH_RISK_LABELS = ['Very High Risk', 'High Risk']
 
-@app.route('/api/data')
-def api_data():
-    """Get patient data with filtering support"""
-    limit = request.args.get('limit', default=100, type=int)
-    risk_label = request.args.get('risk_label', default=None)
-    gender = request.args.get('gender', default=None)
-    min_age = request.args.get('min_age', default=None, type=int)
-    max_age = request.args.get('max_age', default=None, type=int)
-    search = request.args.get('search', default=None)
-    
-    # Load data from CSV
-    df = load_csv_data()
-    if df.empty:
-        return jsonify({'error': 'No data available'}), 500
-    
-    # Apply filters
-    if risk_label and risk_label != 'All':
-        df = df[df['RISK_LABEL'] == risk_label]
-    
+def _int_arg(args, name, default=None):
+    """Integer query parameter; missing or invalid values give the default, like request.args.get(type=int)"""
+    try:
+        return int(args.get(name))
+    except (TypeError, ValueError):
+        return default
+
+def _patient_row_to_dict(row):
+    gender_val = row.get('GENDER')
+    if pd.isna(gender_val):
+        gender = 'Unknown'
+    else:
+        gender = 'Male' if int(gender_val) == 1 else 'Female'
+
+    return {
+        'patient_id': str(row.get('DESYNPUF_ID')),
+        'age': int(row.get('AGE')) if pd.notna(row.get('AGE')) else None,
+        'gender': gender,
+        'claims_cost': float(row.get('TOTAL_CLAIMS_COST')) if pd.notna(row.get('TOTAL_CLAIMS_COST')) else 0.0,
+        'risk_30d': float(row.get('RISK_30D')) if pd.notna(row.get('RISK_30D')) else None,
+        'risk_60d': float(row.get('RISK_60D')) if pd.notna(row.get('RISK_60D')) else None,
+        'risk_90d': float(row.get('RISK_90D')) if pd.notna(row.get('RISK_90D')) else None,
+        'risk_label': str(row.get('RISK_LABEL')) if pd.notna(row.get('RISK_LABEL')) else 'Unknown',
+        'top_features': str(row.get('TOP_3_FEATURES')) if pd.notna(row.get('TOP_3_FEATURES')) else 'N/A',
+        'ai_recommendations': str(row.get('AI_RECOMMENDATIONS')) if pd.notna(row.get('AI_RECOMMENDATIONS')) else 'N/A',
+        'email': str(row.get('EMAIL')) if pd.notna(row.get('EMAIL')) else '',
+        'index_date': str(row.get('INDEX_DATE')) if pd.notna(row.get('INDEX_DATE')) else 'N/A'
+    }
+
+def parse_patient_filters(args):
+    """Normalized /api/data filters: query strings that select the same rows give equal dicts"""
+    risk_label = args.get('risk_label') or None
+    if risk_label == 'All':
+        risk_label = None
+    gender = args.get('gender')
+    gender_value = None
     if gender and gender != 'All':
         gender_value = 1 if gender == 'Male' else 0
-        df = df[df['GENDER'] == gender_value]
-    
-    if min_age is not None:
-        df = df[df['AGE'] >= min_age]
-    
-    if max_age is not None:
-        df = df[df['AGE'] <= max_age]
-    
-    if search:
-        search_mask = (
-            df['DESYNPUF_ID'].astype(str).str.contains(search, case=False, na=False) |
-            df['TOP_3_FEATURES'].astype(str).str.contains(search, case=False, na=False) |
-            df['AI_RECOMMENDATIONS'].astype(str).str.contains(search, case=False, na=False)
-        )
-        df = df[search_mask]
-    
-    # Sort by risk and limit
-    df = df.sort_values('RISK_30D', ascending=False)
-    df = df.head(limit)
-    
-    # Convert to JSON format
-    def row_to_dict(row):
-        gender_val = row.get('GENDER')
-        if pd.isna(gender_val):
-            gender = 'Unknown'
-        else:
-            gender = 'Male' if int(gender_val) == 1 else 'Female'
-        
+    # Both search backends match case-insensitively
+    search = str(args.get('search') or '').strip().lower() or None
+
+    return {
+        'limit': _int_arg(args, 'limit', 100),
+        'risk_label': risk_label,
+        'gender': gender_value,
+        'min_age': _int_arg(args, 'min_age'),
+        'max_age': _int_arg(args, 'max_age'),
+        'search': search,
+    }
+
+def list_patients(args):
+    """Filtered, risk-ordered patient list for /api/data; returns (body, status)"""
+    return query_patient_list(**parse_patient_filters(args))
+
+def query_patient_list(limit=100, risk_label=None, gender=None, min_age=None, max_age=None, search=None):
+    """list_patients() for already-normalized filters"""
+    if STORAGE_BACKEND == 'sqlite':
+        # Filters, ordering and LIMIT run as one indexed query
+        df = query_patients(risk_label=risk_label, gender=gender, min_age=min_age,
+                            max_age=max_age, search=search, limit=limit)
+    else:
+        df, search_index = get_patient_table()
+        if df.empty:
+            return {'error': 'No data available'}, 500
+
+        # Search first: index positions refer to the full table
+        if search:
+            positions = search_index.search(search)
+            if positions is not None:
+                df = df.iloc[positions]
+
+        # Apply filters
+        if risk_label:
+            df = df[df['RISK_LABEL'] == risk_label]
+
+        if gender is not None:
+            df = df[df['GENDER'] == gender]
+
+        if min_age is not None:
+            df = df[df['AGE'] >= min_age]
+
+        if max_age is not None:
+            df = df[df['AGE'] <= max_age]
+
+        # Sort by risk and limit
+        df = df.sort_values('RISK_30D', ascending=False)
+        df = df.head(limit)
+
+    data = [_patient_row_to_dict(r) for _, r in df.iterrows()]
+    return {'data': data}, 200
+
+def summarize_population():
+    """Totals, average risks and label counts for /api/summary ({} when there is no data)"""
+    if STORAGE_BACKEND == 'sqlite':
+        stats = summarize_patients()
+        if not stats['total_patients']:
+            return {}
+        counts = stats['label_counts']
         return {
-            'patient_id': str(row.get('DESYNPUF_ID')),
-            'age': int(row.get('AGE')) if pd.notna(row.get('AGE')) else None,
-            'gender': gender,
-            'claims_cost': float(row.get('TOTAL_CLAIMS_COST')) if pd.notna(row.get('TOTAL_CLAIMS_COST')) else 0.0,
-            'risk_30d': float(row.get('RISK_30D')) if pd.notna(row.get('RISK_30D')) else None,
-            'risk_60d': float(row.get('RISK_60D')) if pd.notna(row.get('RISK_60D')) else None,
-            'risk_90d': float(row.get('RISK_90D')) if pd.notna(row.get('RISK_90D')) else None,
-            'risk_label': str(row.get('RISK_LABEL')) if pd.notna(row.get('RISK_LABEL')) else 'Unknown',
-            'top_features': str(row.get('TOP_3_FEATURES')) if pd.notna(row.get('TOP_3_FEATURES')) else 'N/A',
-            'ai_recommendations': str(row.get('AI_RECOMMENDATIONS')) if pd.notna(row.get('AI_RECOMMENDATIONS')) else 'N/A',
-            'email': str(row.get('EMAIL')) if pd.notna(row.get('EMAIL')) else '',
-            'index_date': str(row.get('INDEX_DATE')) if pd.notna(row.get('INDEX_DATE')) else 'N/A'
+            'total_patients': stats['total_patients'],
+            'avg_risk_30d': stats['avg_risk_30d'],
+            'avg_risk_60d': stats['avg_risk_60d'],
+            'avg_risk_90d': stats['avg_risk_90d'],
+            'very_high_risk': counts.get('Very High Risk', 0),
+            'high_risk': counts.get('High Risk', 0),
+            'moderate_risk': counts.get('Moderate Risk', 0),
+            'low_risk': counts.get('Low Risk', 0),
+            'very_low_risk': counts.get('Very Low Risk', 0)
         }
-    
-    data = [row_to_dict(r) for _, r in df.iterrows()]
-    return jsonify({'data': data})
 
-@app.route('/api/summary')
-def api_summary():
-    """Get summary statistics"""
-    df = load_csv_data()
+    df, _ = get_patient_table()
     if df.empty:
-        return jsonify({})
-    
-    summary = {
+        return {}
+
+    return {
         'total_patients': len(df),
         'avg_risk_30d': float(df['RISK_30D'].mean()) if not df['RISK_30D'].isna().all() else 0,
         'avg_risk_60d': float(df['RISK_60D'].mean()) if not df['RISK_60D'].isna().all() else 0,
@@ -404,222 +481,403 @@ def api_summary():
         'low_risk': int((df['RISK_LABEL'] == 'Low Risk').sum()),
         'very_low_risk': int((df['RISK_LABEL'] == 'Very Low Risk').sum())
     }
-    
-    return jsonify(summary)
 
-@app.route('/api/health')
-def api_health():
-    """Health check endpoint"""
+def check_health():
+    """Health check body and status"""
     try:
-        df = load_csv_data()
+        if STORAGE_BACKEND == 'sqlite':
+            records = count_patients()
+            if not records:
+                return {'status': 'unhealthy', 'data': 'no_data'}, 500
+            return {'status': 'healthy', 'data': 'sqlite_loaded', 'records': records}, 200
+
+        df, _ = get_patient_table()
         if df.empty:
-            return jsonify({'status': 'unhealthy', 'data': 'no_data'}), 500
-        return jsonify({'status': 'healthy', 'data': 'csv_loaded', 'records': len(df)})
+            return {'status': 'unhealthy', 'data': 'no_data'}, 500
+        return {'status': 'healthy', 'data': 'csv_loaded', 'records': len(df)}, 200
     except Exception as e:
-        return jsonify({'status': 'unhealthy', 'error': str(e)}), 500
+        return {'status': 'unhealthy', 'error': str(e)}, 500
+
+PREDICT_DEFAULTS = {
+    # Demographics
+    'GENDER': 1,  # 1=Male, 0=Female
+    # Insurance
+    'PARTA': 12,
+    'PARTB': 12,
+    'HMO': 0,
+    'PARTD': 12,
+    # Chronic conditions
+    'RENAL_DISEASE': 0,
+    'ALZHEIMER': 0,
+    'HEARTFAILURE': 0,
+    'CANCER': 0,
+    'PULMONARY': 0,
+    'OSTEOPOROSIS': 0,
+    'RHEUMATOID': 0,
+    'STROKE': 0,
+    # Vitals
+    'BMI': 25.0,
+    'BP_S': 120.0,
+    'GLUCOSE': 100.0,
+    'HbA1c': 5.5,
+    'CHOLESTEROL': 200.0,
+    # Trends
+    'BP_trend': 0.0,
+    'HbA1c_trend': 0.0,
+    # Costs
+    'OUTPATIENT_COST': 0.0,
+    'ED_COST': 0.0,
+    'TOTAL_CLAIMS_COST': 0.0,
+    # Utilization
+    'IN_ADM': 0,
+    'OUT_VISITS': 0,
+    'ED_VISITS': 0,
+    # Adherence
+    'RX_ADH': 0.8,
+    # Derived
+    'COMOR_COUNT': 0,
+    'COMOR_WEIGHTED_SCORE': 0,
+    'CLAIMS_FLAG': 0,
+    'TOP_3_FEATURES': 'AGE, BMI, GLUCOSE'
+}
+
+DISEASE_WEIGHTS = {
+    'HEARTFAILURE': 3.0,    # Highest risk - heart failure
+    'STROKE': 2.8,          # Very high risk - stroke
+    'CANCER': 2.5,          # High risk - cancer
+    'RENAL_DISEASE': 2.3,   # High risk - kidney disease
+    'PULMONARY': 2.0,       # Moderate-high risk - lung disease
+    'ALZHEIMER': 1.8,       # Moderate risk - dementia
+    'RHEUMATOID': 1.5,      # Moderate risk - arthritis
+    'OSTEOPOROSIS': 1.2     # Lower risk - bone disease
+}
+
+# Fields score_patient() fills in and the prediction cache stores
+SCORED_FIELDS = ['RISK_30D', 'RISK_60D', 'RISK_90D', 'RISK_LABEL', 'TOP_3_FEATURES', 'AI_RECOMMENDATIONS']
+
+def _fallback_prediction(data):
+    """Simple formula used when no model is loaded or the model fails"""
+    age = float(data.get('AGE', 50))
+    bmi = float(data.get('BMI', 25))
+    glucose = float(data.get('GLUCOSE', 100))
+
+    risk_30d = min(95, max(5, (age - 30) * 0.5 + (bmi - 20) * 0.3 + (glucose - 80) * 0.1))
+    risk_60d = risk_30d * 1.1
+    risk_90d = risk_30d * 1.2
+
+    data.update({
+        'RISK_30D': round(risk_30d, 2),
+        'RISK_60D': round(risk_60d, 2),
+        'RISK_90D': round(risk_90d, 2),
+        'RISK_LABEL': assign_label(risk_30d),
+        'TOP_3_FEATURES': 'AGE, BMI, GLUCOSE'
+    })
+
+    with span("recommendations"):
+        ai_recommendations = get_ai_recommendations(data, data.get('TOP_3_FEATURES', 'AGE, BMI, GLUCOSE'))
+    data['AI_RECOMMENDATIONS'] = ai_recommendations
+
+def score_patient(data):
+    """Fill defaults and derived fields, then predict risks in place (CPU-bound); returns the model used"""
+    # Generate new patient ID if not provided
+    if not data.get('DESYNPUF_ID'):
+        data['DESYNPUF_ID'] = f"NEW_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+
+    # Set default values for missing fields (all 29 features)
+    for key, value in PREDICT_DEFAULTS.items():
+        if key not in data:
+            data[key] = value
+
+    # Calculate weighted comorbidity score based on chronic conditions
+    data['COMOR_WEIGHTED_SCORE'] = 0
+    for disease, weight in DISEASE_WEIGHTS.items():
+        data['COMOR_WEIGHTED_SCORE'] += data.get(disease, 0) * weight
+
+    # Keep simple count for backward compatibility
+    chronic_conditions = ['ALZHEIMER', 'HEARTFAILURE', 'CANCER', 'PULMONARY',
+                         'OSTEOPOROSIS', 'RHEUMATOID', 'STROKE', 'RENAL_DISEASE']
+    data['COMOR_COUNT'] = sum(data.get(condition, 0) for condition in chronic_conditions)
+
+    # Calculate CLAIMS_FLAG
+    data['CLAIMS_FLAG'] = 1 if data.get('TOTAL_CLAIMS_COST', 0) > 0 else 0
+
+    # Same features + same model = same result: serve resubmissions from the cache
+    ml_model = get_ml_model()
+    try:
+        with span("preprocess"):
+            X = patient_feature_vector(data)
+        cache_key = feature_key(X, get_model_version())
+    except (TypeError, ValueError):
+        # Non-numeric input: let the model/fallback report it, and don't cache
+        X, cache_key = None, None
+    cached = prediction_cache.get(cache_key) if cache_key else None
+    if cached is not None:
+        model_used = cached.pop('model_used')
+        data.update(cached)
+        return model_used
+
+    # Generate risk predictions using ML model
+    if ml_model:
+        try:
+            predictions = predict_single_patient(data, ml_model, X)
+            data.update(predictions)
+            hot("prediction", "ML model prediction", risk_30d=predictions['RISK_30D'], risk_60d=predictions['RISK_60D'],
+                risk_90d=predictions['RISK_90D'], label=predictions['RISK_LABEL'])
+            if cache_key:
+                prediction_cache.put(cache_key, dict(predictions, model_used='ML Model'))
+            return 'ML Model'
+        except Exception as e:
+            # Not cached: the next submission should retry the model
+            logger.warning(f"ML model prediction failed: {e}, using fallback")
+            metrics.inc("risk_model_fallbacks_total", reason="model_error")
+            _fallback_prediction(data)
+            return 'Fallback Formula'
+
+    metrics.inc("risk_model_fallbacks_total", reason="no_model")
+    _fallback_prediction(data)
+    if cache_key:
+        prediction_cache.put(cache_key, dict({col: data[col] for col in SCORED_FIELDS}, model_used='Fallback Formula'))
+    return 'Fallback Formula'
+
+def store_patient(data, model_used):
+    """Save a scored patient and queue its report email; returns (body, status)"""
+    if not save_new_patient(data):
+        return {'error': 'Failed to save patient data'}, 500
+
+    # Queue the PDF report email if an address was provided
+    delivery_id = None
+    email_addr = data.get('EMAIL')
+    if email_addr:
+        try:
+            delivery_queue.start()
+            delivery_id = delivery_queue.enqueue('patient_report', {'to': email_addr, 'patient': data})
+        except Exception as mail_err:
+            logger.error(f"Failed to queue email: {mail_err}")
+
+    return {
+        'success': True,
+        'predictions': {
+            'RISK_30D': data.get('RISK_30D'),
+            'RISK_60D': data.get('RISK_60D'),
+            'RISK_90D': data.get('RISK_90D'),
+            'RISK_LABEL': data.get('RISK_LABEL'),
+            'TOP_3_FEATURES': data.get('TOP_3_FEATURES'),
+            'AI_RECOMMENDATIONS': data.get('AI_RECOMMENDATIONS')
+        },
+        'message': f'New patient {data["DESYNPUF_ID"]} added successfully',
+        'model_used': model_used,
+        'delivery_id': delivery_id
+    }, 200
+
+def email_high_risk_patients():
+    """Email AI recommendations to every high-risk patient with an address; returns (body, status)"""
+    try:
+        if STORAGE_BACKEND == 'sqlite':
+            df = query_patients_by_label(HIGH_RISK_LABELS)
+        else:
+            df, _ = get_patient_table()
+            df = df[df['RISK_LABEL'].isin(HIGH_RISK_LABELS)]
+
+        # NaN would count as an email address / recommendation text, so use None
+        patients = _frame_to_records(df)
+        report = send_bulk_recommendations_emails(patients)
+
+        return {
+            'success': report['failed'] == 0,
+            'message': (f"Sent {report['sent']} of {report['attempted']} emails to high-risk patients "
+                        f"({report['emails_per_second']}/s, {report['failed']} failed, "
+                        f"{report['skipped_no_email']} without email)"),
+            'report': report
+        }, 200
+    except Exception as e:
+        logger.exception(f"Bulk email error: {e}")
+        return {'success': False, 'error': str(e)}, 500
+
+def data_cache_key(filters):
+    """Response cache key for normalized /api/data filters"""
+    return tuple(sorted(filters.items()))
+
+def prediction_cache_stats():
+    """Prediction cache counters plus the model version current entries are keyed on"""
+    return dict(prediction_cache.stats(), model_version=get_model_version())
+
+def parse_export_args(args):
+    """Validate /api/export-pdf parameters; returns (options, None) or (None, (error_body, status))"""
+    limit = _int_arg(args, 'limit', 100)
+    export_format = (args.get('format') or 'pdf').lower()
+    export_id = args.get('export_id')
+
+    if export_format not in ('pdf', 'zip'):
+        return None, ({'error': "format must be 'pdf' or 'zip'"}, 400)
+    if limit < 1:
+        return None, ({'error': 'limit must be a positive integer'}, 400)
+    if limit > EXPORT_MAX_PATIENTS:
+        return None, ({'error': f'limit exceeds the export cap of {EXPORT_MAX_PATIENTS} patients'}, 400)
+    if export_id and not re.fullmatch(r'[A-Za-z0-9_-]{1,64}', export_id):
+        return None, ({'error': 'Invalid export_id'}, 400)
+    if export_id and get_export_progress(export_id):
+        return None, ({'error': 'export_id already in use'}, 409)
+
+    return {'limit': limit, 'format': export_format, 'risk_label': args.get('risk_label') or None,
+            'export_id': export_id}, None
+
+def export_filename(export_format):
+    stamp = datetime.now().strftime('%Y%m%d')
+    if export_format == 'zip':
+        return f'risk_stratification_reports_{stamp}.zip'
+    return f'risk_stratification_report_{stamp}.pdf'
+
+def get_report_patient(patient_id):
+    """One patient's stored fields as a report dict, or None"""
+    if STORAGE_BACKEND == 'sqlite':
+        return get_patient_record(patient_id)
+    rows = get_patient_by_id(patient_id)
+    return _frame_to_records(rows)[0] if not rows.empty else None
+
+# ---------------------------
+# Flask app initialization
+# ---------------------------
+app = Flask(__name__)
+init_email_service(app)
+# Registered before the profiler, so the profile report also gets an X-Request-ID
+install_flask_request_logging(app)
+install_flask_profiler(app)
+
+if STORAGE_BACKEND == 'sqlite':
+    init_patient_store(CSV_FILE)
+
+# ---------------------------
+# Flask endpoints
+# ---------------------------
+@app.route('/')
+def index():
+    return render_template('index.html')
+
+def _versioned_response(produce, cache=None, cache_key=None):
+    """Flask response for a read endpoint, 304 when the client's ETag/date is current"""
+    version, last_modified = dataset_version()
+    status, headers, body = conditional_json(request.headers, version, last_modified, produce,
+                                             lambda content: app.json.dumps(content).encode('utf-8'),
+                                             cache, cache_key)
+    return Response(body, status=status, headers=headers)
+
+@app.route('/api/data')
+def api_data():
+    """Get patient data with filtering support"""
+    filters = parse_patient_filters(request.args)
+    return _versioned_response(lambda: query_patient_list(**filters), data_cache, data_cache_key(filters))
+
+@app.route('/api/summary')
+def api_summary():
+    """Get summary statistics"""
+    return _versioned_response(lambda: (summarize_population(), 200))
+
+@app.route('/api/health')
+def api_health():
+    """Health check endpoint"""
+    body, status = check_health()
+    return jsonify(body), status
 
 @app.route('/api/predict', methods=['POST'])
 def api_predict():
     """Predict for a new patient and save to CSV"""
     try:
         data = request.json or {}
-        
-        # Generate new patient ID if not provided
-        if not data.get('DESYNPUF_ID'):
-            data['DESYNPUF_ID'] = f"NEW_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-        
-        # Set default values for missing fields (all 29 features)
-        defaults = {
-            # Demographics
-            'GENDER': 1,  # 1=Male, 0=Female
-            # Insurance
-            'PARTA': 12,
-            'PARTB': 12,
-            'HMO': 0,
-            'PARTD': 12,
-            # Chronic conditions
-            'RENAL_DISEASE': 0,
-            'ALZHEIMER': 0,
-            'HEARTFAILURE': 0,
-            'CANCER': 0,
-            'PULMONARY': 0,
-            'OSTEOPOROSIS': 0,
-            'RHEUMATOID': 0,
-            'STROKE': 0,
-            # Vitals
-            'BMI': 25.0,
-            'BP_S': 120.0,
-            'GLUCOSE': 100.0,
-            'HbA1c': 5.5,
-            'CHOLESTEROL': 200.0,
-            # Trends
-            'BP_trend': 0.0,
-            'HbA1c_trend': 0.0,
-            # Costs
-            'OUTPATIENT_COST': 0.0,
-            'ED_COST': 0.0,
-            'TOTAL_CLAIMS_COST': 0.0,
-            # Utilization
-            'IN_ADM': 0,
-            'OUT_VISITS': 0,
-            'ED_VISITS': 0,
-            # Adherence
-            'RX_ADH': 0.8,
-            # Derived
-            'COMOR_COUNT': 0,
-            'COMOR_WEIGHTED_SCORE': 0,
-            'CLAIMS_FLAG': 0,
-            'TOP_3_FEATURES': 'AGE, BMI, GLUCOSE'
-        }
-        
-        for key, value in defaults.items():
-            if key not in data:
-                data[key] = value
-        
-        # Calculate weighted disease score based on chronic conditions
-        disease_weights = {
-            'HEARTFAILURE': 3.0,    # Highest risk - heart failure
-            'STROKE': 2.8,          # Very high risk - stroke
-            'CANCER': 2.5,          # High risk - cancer
-            'RENAL_DISEASE': 2.3,   # High risk - kidney disease
-            'PULMONARY': 2.0,       # Moderate-high risk - lung disease
-            'ALZHEIMER': 1.8,       # Moderate risk - dementia
-            'RHEUMATOID': 1.5,      # Moderate risk - arthritis
-            'OSTEOPOROSIS': 1.2     # Lower risk - bone disease
-        }
-        
-        # Calculate weighted comorbidity score
-        data['COMOR_WEIGHTED_SCORE'] = 0
-        for disease, weight in disease_weights.items():
-            data['COMOR_WEIGHTED_SCORE'] += data.get(disease, 0) * weight
-        
-        # Keep simple count for backward compatibility
-        chronic_conditions = ['ALZHEIMER', 'HEARTFAILURE', 'CANCER', 'PULMONARY', 
-                             'OSTEOPOROSIS', 'RHEUMATOID', 'STROKE', 'RENAL_DISEASE']
-        data['COMOR_COUNT'] = sum(data.get(condition, 0) for condition in chronic_conditions)
-        
-        # Calculate CLAIMS_FLAG
-        data['CLAIMS_FLAG'] = 1 if data.get('TOTAL_CLAIMS_COST', 0) > 0 else 0
-        
-        # Generate risk predictions using ML model
-        if ml_model:
-            try:
-                # Use the ML model to predict
-                predictions = predict_single_patient(data, ml_model)
-                
-                # Update data with ML predictions
-                data.update(predictions)
-                
-                print(f"ML Model Prediction: 30D={predictions['RISK_30D']:.2f}, 60D={predictions['RISK_60D']:.2f}, 90D={predictions['RISK_90D']:.2f}, Label={predictions['RISK_LABEL']}")
-                
-            except Exception as e:
-                print(f"ML model prediction failed: {e}, using fallback")
-                # Fallback to simple prediction
-                age = float(data.get('AGE', 50))
-                bmi = float(data.get('BMI', 25))
-                glucose = float(data.get('GLUCOSE', 100))
-                
-                risk_30d = min(95, max(5, (age - 30) * 0.5 + (bmi - 20) * 0.3 + (glucose - 80) * 0.1))
-                risk_60d = risk_30d * 1.1
-                risk_90d = risk_30d * 1.2
-                
-                if risk_30d >= 80:
-                    risk_label = 'Very High Risk'
-                elif risk_30d >= 60:
-                    risk_label = 'High Risk'
-                elif risk_30d >= 40:
-                    risk_label = 'Moderate Risk'
-                elif risk_30d >= 20:
-                    risk_label = 'Low Risk'
-                else:
-                    risk_label = 'Very Low Risk'
-                
-                data.update({
-                    'RISK_30D': round(risk_30d, 2),
-                    'RISK_60D': round(risk_60d, 2),
-                    'RISK_90D': round(risk_90d, 2),
-                    'RISK_LABEL': risk_label,
-                    'TOP_3_FEATURES': 'AGE, BMI, GLUCOSE'
-                })
-                
-                ai_recommendations = get_ai_recommendations(data, data.get('TOP_3_FEATURES', 'AGE, BMI, GLUCOSE'))
-                data['AI_RECOMMENDATIONS'] = ai_recommendations
-        else:
-            # Fallback to simple prediction if no ML model
-            age = float(data.get('AGE', 50))
-            bmi = float(data.get('BMI', 25))
-            glucose = float(data.get('GLUCOSE', 100))
-            
-            risk_30d = min(95, max(5, (age - 30) * 0.5 + (bmi - 20) * 0.3 + (glucose - 80) * 0.1))
-            risk_60d = risk_30d * 1.1
-            risk_90d = risk_30d * 1.2
-            
-            if risk_30d >= 80:
-                risk_label = 'Very High Risk'
-            elif risk_30d >= 60:
-                risk_label = 'High Risk'
-            elif risk_30d >= 40:
-                risk_label = 'Moderate Risk'
-            elif risk_30d >= 20:
-                risk_label = 'Low Risk'
-            else:
-                risk_label = 'Very Low Risk'
-            
-            data.update({
-                'RISK_30D': round(risk_30d, 2),
-                'RISK_60D': round(risk_60d, 2),
-                'RISK_90D': round(risk_90d, 2),
-                'RISK_LABEL': risk_label,
-                'TOP_3_FEATURES': 'AGE, BMI, GLUCOSE'
-            })
-            
-            ai_recommendations = get_ai_recommendations(data, data.get('TOP_3_FEATURES', 'AGE, BMI, GLUCOSE'))
-            data['AI_RECOMMENDATIONS'] = ai_recommendations
-        
-        # Load existing CSV and add new patient
-        df = load_csv_data()
-        new_row = pd.DataFrame([data])
-        df = pd.concat([df, new_row], ignore_index=True)
-        
-        # Save updated CSV
-        if save_csv_data(df):
-            # Send email if email provided
-            email_addr = data.get('EMAIL')
-            if email_addr:
-                try:
-                    pdf_bytes = create_patient_pdf_bytes(data)
-                    attachment_name = f"patient_report_{data['DESYNPUF_ID']}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-                    
-                    message_body = (
-                        f"Hello,\n\nPlease find attached the risk prediction report for patient {data['DESYNPUF_ID']}.\n\n"
-                        f"Summary:\n30-day: {data.get('RISK_30D', 0):.2f}%\n60-day: {data.get('RISK_60D', 0):.2f}%\n90-day: {data.get('RISK_90D', 0):.2f}%\n"
-                        f"Label: {data.get('RISK_LABEL', 'Unknown')}\n\nRegards,\nRisk Stratification System"
-                    )
-                    send_email(email_addr, "Patient Risk Prediction Report", message_body, 
-                             attachment_bytes=pdf_bytes, attachment_filename=attachment_name)
-                except Exception as mail_err:
-                    print(f"Failed to send email: {mail_err}")
-            
-            return jsonify({
-                'success': True, 
-                'predictions': {
-                    'RISK_30D': data.get('RISK_30D'),
-                    'RISK_60D': data.get('RISK_60D'),
-                    'RISK_90D': data.get('RISK_90D'),
-                    'RISK_LABEL': data.get('RISK_LABEL'),
-                    'TOP_3_FEATURES': data.get('TOP_3_FEATURES'),
-                    'AI_RECOMMENDATIONS': data.get('AI_RECOMMENDATIONS')
-                },
-                'message': f'New patient {data["DESYNPUF_ID"]} added successfully',
-                'model_used': 'ML Model' if ml_model else 'Fallback Formula'
+        with span("predict_request"):
+            model_used = score_patient(data)
+            body, status = store_patient(data, model_used)
+        return jsonify(body), status
+    except Exception as e:
+        logger.exception(f"Prediction error: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/send-bulk-emails', methods=['POST'])
+def api_send_bulk_emails():
+    """Email AI recommendations to every high-risk patient with an address"""
+    body, status = email_high_risk_patients()
+    return jsonify(body), status
+
+@app.route('/api/export-pdf')
+def api_export_pdf():
+    """Bulk export of patient reports as one merged PDF (default) or a streamed ZIP (format=zip)"""
+    options, error = parse_export_args(request.args)
+    if error:
+        return jsonify(error[0]), error[1]
+
+    try:
+        patients = get_export_patients(options['limit'], options['risk_label'])
+        if not patients:
+            return jsonify({'error': 'No patients to export'}), 404
+
+        progress = start_export(len(patients), options['format'], options['export_id'])
+        filename = export_filename(options['format'])
+        if options['format'] == 'zip':
+            return Response(stream_zip(patients, progress), mimetype='application/zip', headers={
+                'Content-Disposition': f'attachment; filename="{filename}"',
+                'X-Export-Id': progress.id
             })
-        else:
-            return jsonify({'error': 'Failed to save patient data'}), 500
-            
+
+        merged = build_merged_pdf(patients, progress)
+        response = send_file(merged, mimetype='application/pdf', as_attachment=True, download_name=filename)
+        response.headers['X-Export-Id'] = progress.id
+        return response
     except Exception as e:
-        print(f"Prediction error: {e}\n{traceback.format_exc()}")
+        logger.exception(f"PDF export error: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/export-progress/<export_id>')
+def api_export_progress(export_id):
+    """Rendered/total reports for a bulk export"""
+    progress = get_export_progress(export_id)
+    if progress is None:
+        return jsonify({'error': 'Export not found'}), 404
+    return jsonify(progress)
+
+@app.route('/api/export-patient-pdf/<patient_id>')
+def api_export_patient_pdf(patient_id):
+    """Download one patient's report"""
+    try:
+        patient = get_report_patient(patient_id)
+        if patient is None:
+            return jsonify({'error': 'Patient not found'}), 404
+
+        from risk.report import create_patient_pdf_bytes
+        pdf_bytes = create_patient_pdf_bytes(patient)
+        return Response(pdf_bytes, mimetype='application/pdf', headers={
+            'Content-Disposition': f'attachment; filename="{report_filename(patient)}"'
+        })
+    except Exception as e:
+        logger.exception(f"Patient PDF export error: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/prediction-cache')
+def api_prediction_cache():
+    """Hit/miss/eviction counters of the /api/predict cache"""
+    return jsonify(prediction_cache_stats())
+
+@app.route('/api/metrics')
+def api_metrics():
+    """Stage latency histograms and event counters in the Prometheus text format"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/data-cache')
+def api_data_cache():
+    """Hit/miss/eviction counters of the /api/data response cache"""
+    return jsonify(data_cache.stats())
+
+@app.route('/api/deliveries')
+def api_deliveries():
+    """Outbox job counts by status"""
+    return jsonify(delivery_queue.stats())
+
+@app.route('/api/deliveries/<job_id>')
+def api_delivery_status(job_id):
+    """Status of one queued email/PDF delivery"""
+    status = delivery_queue.get_status(job_id)
+    if status is None:
+        return jsonify({'error': 'Delivery not found'}), 404
+    return jsonify(status)
+
 # ---------------------------
 # App run
 # ---------------------------
@@ -629,12 +887,22 @@ if __name__ == '__main__':
     
     print("🚀 Starting Risk Stratification Web App (CSV-based)...")
     print("📊 Dashboard: http://localhost:5000")
-    print("📁 Data Source: trainingk.csv")
-    print(f"🤖 ML Model: {'Loaded' if ml_model else 'Not Available (using fallback)'}")
+    print(f"📁 Data Source: {CSV_FILE} ({STORAGE_BACKEND} backend)")
+    print(f"🤖 ML Model: {'Loaded' if get_ml_model() else 'Not Available (using fallback)'}")
     print("API endpoints:")
     print(" - /api/data")
     print(" - /api/summary")
     print(" - /api/health")
     print(" - /api/predict (POST)")
+    print(" - /api/prediction-cache")
+    print(" - /api/data-cache")
+    print(" - /api/deliveries")
+    print(" - /api/send-bulk-emails (POST)")
+    print(" - /api/export-pdf?limit=N[&format=zip]")
+    print(" - /api/export-patient-pdf/<id>")
+
+    # Resume deliveries left in the outbox by a previous run
+    delivery_queue.start()
+    start_warm_up()
 
     app.run(host='0.0.0.0', port=int(os.getenv("PORT", 5000)), debug=True)
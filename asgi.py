@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+ASGI entry point: the /api/* endpoints as async views
+- uvicorn asgi:app --host 0.0.0.0 --port 5000
+- python serve.py --server uvicorn
+
+Requests are held as coroutines on the event loop, so a slow SMTP server, CSV write or
+PDF render no longer pins a server thread per waiting client. Blocking work runs on two
+bounded thread pools: one for CPU-bound scoring and rendering, one for storage and email
+I/O. The views call the same service functions as the Flask views in app.py, so responses
+match field for field. Everything outside /api (dashboard page, static files) is served
+by the Flask app itself.
+"""
+
+import contextlib
+import json
+import os
+
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from starlette.routing import Mount, Route
+
+import app as flask_app
+from risk.executor import BoundedExecutor
+from risk.http_cache import conditional_json
+from risk.logger import current_request, end_request, logger, start_request
+from risk.profiling import PROFILE_TOKEN, wants_profile
+from risk.export import build_merged_pdf, get_export_progress, report_filename, start_export, stream_zip
+
+ASYNC_CPU_WORKERS = int(os.getenv("ASYNC_CPU_WORKERS", os.cpu_count() or 1))
+ASYNC_IO_WORKERS = int(os.getenv("ASYNC_IO_WORKERS", 32))
+ASYNC_MAX_PENDING = int(os.getenv("ASYNC_MAX_PENDING", 256))
+
+cpu_pool = BoundedExecutor(ASYNC_CPU_WORKERS, ASYNC_MAX_PENDING, name="cpu")
+io_pool = BoundedExecutor(ASYNC_IO_WORKERS, ASYNC_MAX_PENDING, name="io")
+
+
+def _dumps(content) -> bytes:
+    return json.dumps(content, default=str).encode("utf-8")
+
+
+class JSON(JSONResponse):
+    """JSON response encoded like Flask's jsonify (NaN allowed, unknown types as strings)"""
+
+    def render(self, content) -> bytes:
+        return _dumps(content)
+
+
+def _versioned(request, produce, cache, cache_key):
+    """Blocking part of a read endpoint: version lookup, then produce/serialize/compress unless 304"""
+    version, last_modified = flask_app.dataset_version()
+    return conditional_json(request.headers, version, last_modified, produce, _dumps, cache, cache_key)
+
+
+async def _versioned_response(request, produce, cache=None, cache_key=None):
+    status, headers, body = await io_pool.run(_versioned, request, produce, cache, cache_key)
+    return Response(body, status_code=status, headers=headers)
+
+
+def _error(message, status=500, **extra):
+    return JSON({'error': message, **extra}, status_code=status)
+
+
+# ---------------------------
+# Async endpoints
+# ---------------------------
+async def api_data(request):
+    filters = flask_app.parse_patient_filters(request.query_params)
+    return await _versioned_response(request, lambda: flask_app.query_patient_list(**filters),
+                                     flask_app.data_cache, flask_app.data_cache_key(filters))
+
+
+async def api_summary(request):
+    return await _versioned_response(request, lambda: (flask_app.summarize_population(), 200))
+
+
+async def api_health(request):
+    body, status = await io_pool.run(flask_app.check_health)
+    return JSON(body, status_code=status)
+
+
+async def api_predict(request):
+    try:
+        try:
+            data = await request.json() or {}
+        except ValueError:
+            return _error('Request body must be JSON', 400)
+        with flask_app.span("predict_request"):
+            model_used = await cpu_pool.run(flask_app.score_patient, data)
+            body, status = await io_pool.run(flask_app.store_patient, data, model_used)
+        return JSON(body, status_code=status)
+    except Exception as e:
+        logger.exception(f"Prediction error: {e}")
+        return _error(str(e))
+
+
+async def api_send_bulk_emails(request):
+    body, status = await io_pool.run(flask_app.email_high_risk_patients)
+    return JSON(body, status_code=status)
+
+
+async def api_export_pdf(request):
+    options, error = flask_app.parse_export_args(request.query_params)
+    if error:
+        return JSON(error[0], status_code=error[1])
+
+    try:
+        patients = await io_pool.run(flask_app.get_export_patients, options['limit'], options['risk_label'])
+        if not patients:
+            return _error('No patients to export', 404)
+
+        progress = start_export(len(patients), options['format'], options['export_id'])
+        filename = flask_app.export_filename(options['format'])
+        headers = {'Content-Disposition': f'attachment; filename="{filename}"', 'X-Export-Id': progress.id}
+        if options['format'] == 'zip':
+            # Starlette iterates sync generators on its own thread pool
+            return StreamingResponse(stream_zip(patients, progress), media_type='application/zip', headers=headers)
+
+        # Rendering happens in the export process pool; this thread only waits and merges
+        merged = await io_pool.run(build_merged_pdf, patients, progress)
+        return StreamingResponse(_iter_spooled(merged), media_type='application/pdf', headers=headers)
+    except Exception as e:
+        logger.exception(f"PDF export error: {e}")
+        return _error(str(e))
+
+
+def _iter_spooled(fileobj, block_size=256 * 1024):
+    with contextlib.closing(fileobj):
+        while block := fileobj.read(block_size):
+            yield block
+
+
+async def api_export_progress(request):
+    progress = get_export_progress(request.path_params['export_id'])
+    if progress is None:
+        return _error('Export not found', 404)
+    return JSON(progress)
+
+
+async def api_export_patient_pdf(request):
+    try:
+        patient = await io_pool.run(flask_app.get_report_patient, request.path_params['patient_id'])
+        if patient is None:
+            return _error('Patient not found', 404)
+
+        from risk.report import create_patient_pdf_bytes
+        pdf_bytes = await cpu_pool.run(create_patient_pdf_bytes, patient)
+        return Response(pdf_bytes, media_type='application/pdf', headers={
+            'Content-Disposition': f'attachment; filename="{report_filename(patient)}"'
+        })
+    except Exception as e:
+        logger.exception(f"Patient PDF export error: {e}")
+        return _error(str(e))
+
+
+async def api_prediction_cache(request):
+    return JSON(flask_app.prediction_cache_stats())
+
+
+async def api_metrics(request):
+    return PlainTextResponse(flask_app.metrics.render(), media_type='text/plain; version=0.0.4')
+
+
+async def api_data_cache(request):
+    return JSON(flask_app.data_cache.stats())
+
+
+async def api_deliveries(request):
+    return JSON(await io_pool.run(flask_app.delivery_queue.stats))
+
+
+async def api_delivery_status(request):
+    status = await io_pool.run(flask_app.delivery_queue.get_status, request.path_params['job_id'])
+    if status is None:
+        return _error('Delivery not found', 404)
+    return JSON(status)
+
+
+@contextlib.asynccontextmanager
+async def lifespan(_app):
+    flask_app.delivery_queue.start()
+    flask_app.start_warm_up()
+    yield
+    flask_app.delivery_queue.stop()
+    cpu_pool.shutdown()
+    io_pool.shutdown()
+
+
+routes = [
+    Route('/api/data', api_data),
+    Route('/api/summary', api_summary),
+    Route('/api/health', api_health),
+    Route('/api/predict', api_predict, methods=['POST']),
+    Route('/api/send-bulk-emails', api_send_bulk_emails, methods=['POST']),
+    Route('/api/export-pdf', api_export_pdf),
+    Route('/api/export-progress/{export_id}', api_export_progress),
+    Route('/api/export-patient-pdf/{patient_id}', api_export_patient_pdf),
+    Route('/api/prediction-cache', api_prediction_cache),
+    Route('/api/data-cache', api_data_cache),
+    Route('/api/metrics', api_metrics),
+    Route('/api/deliveries', api_deliveries),
+    Route('/api/deliveries/{job_id}', api_delivery_status),
+    # Dashboard page and static files
+    Mount('/', app=WSGIMiddleware(flask_app.app)),
+]
+
+app = Starlette(routes=routes, lifespan=lifespan)
+
+
+def _profiled_via_flask(asgi_app):
+    """Send ?profile=1 requests to the Flask views, whose profiler sees the whole request
+
+    The async views here hand their work to thread pools, which a cProfile session on the
+    event loop thread would not see; the Flask app runs a request on one thread.
+    """
+    flask_asgi = WSGIMiddleware(flask_app.app)
+
+    async def dispatch(scope, receive, send):
+        if scope['type'] == 'http':
+            args = dict(p.partition('=')[::2] for p in scope['query_string'].decode('latin-1').split('&') if p)
+            headers = {k.decode('latin-1').title(): v.decode('latin-1') for k, v in scope['headers']}
+            if wants_profile(scope['path'], args, headers):
+                return await flask_asgi(scope, receive, send)
+        return await asgi_app(scope, receive, send)
+    return dispatch
+
+
+def _request_logging(asgi_app):
+    """Request ID (echoed as X-Request-ID), stage timings and a summary log line per request"""
+    async def dispatch(scope, receive, send):
+        if scope['type'] != 'http':
+            return await asgi_app(scope, receive, send)
+        client_id = dict(scope['headers']).get(b'x-request-id')
+        token = start_request(client_id.decode('latin-1') if client_id else None)
+        request_id = current_request().request_id.encode('latin-1')
+        status = 500
+
+        async def send_with_id(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+                if scope['path'].startswith('/api/'):
+                    message = {**message, 'headers': [*message.get('headers', []), (b'x-request-id', request_id)]}
+            await send(message)
+
+        try:
+            await asgi_app(scope, receive, send_with_id)
+        finally:
+            end_request(token, scope['method'], scope['path'], status)
+    return dispatch
+
+
+if PROFILE_TOKEN:
+    app = _profiled_via_flask(app)
+app = _request_logging(app)
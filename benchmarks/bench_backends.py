@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Model backend comparison on trainingk.csv
+Fit time, prediction latency, R² per horizon and artifact size for each backend, using the
+same features and train/test split as train_model.py
+
+Usage:
+    python -m benchmarks.bench_backends
+    python -m benchmarks.bench_backends --backends random_forest hist_gradient_boosting --jobs 4
+"""
+
+import argparse
+import pickle
+import time
+
+import numpy as np
+from sklearn.metrics import r2_score
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+
+import train_model
+from risk.backends import BACKENDS, STEP_NAMES
+
+TARGET_COLS = ["RISK_30D", "RISK_60D", "RISK_90D"]
+
+
+def load_split(csv_path: str):
+    """X_train, X_test, y_train, y_test exactly as quick_train builds them"""
+    df = train_model.preprocess_features(train_model.read_training_csv(csv_path), copy=False)
+    exclude = {"RISK_30D", "RISK_60D", "RISK_90D", "INDEX_DATE", "COMOR_COUNT"}
+    feature_cols = [col for col in df.select_dtypes(include=[np.number]).columns if col not in exclude]
+    valid_rows = np.flatnonzero(df[TARGET_COLS].notna().all(axis=1).to_numpy())
+    X, y, n_test = train_model.build_training_arrays(df, valid_rows, feature_cols, TARGET_COLS)
+    return X[n_test:], X[:n_test], y[n_test:], y[:n_test]
+
+
+def bench_backend(backend, X_train, X_test, y_train, y_test, n_jobs, single_rows=200):
+    scaler = StandardScaler().fit(X_train)
+    start = time.perf_counter()
+    models = train_model.fit_regressors(scaler.transform(X_train), y_train, TARGET_COLS, n_jobs, backend)
+    fit_secs = time.perf_counter() - start
+    regressors = {col: Pipeline([("scaler", scaler), (STEP_NAMES[backend], models[col])]) for col in TARGET_COLS}
+
+    # Batch scoring (predict_batch / rescoring) and one patient at a time (/api/predict)
+    start = time.perf_counter()
+    preds = {col: regressors[col].predict(X_test) for col in TARGET_COLS}
+    batch_secs = time.perf_counter() - start
+
+    single = []
+    for row in X_test[:single_rows]:
+        row = row.reshape(1, -1)
+        start = time.perf_counter()
+        for col in TARGET_COLS:
+            regressors[col].predict(row)
+        single.append((time.perf_counter() - start) * 1000)
+
+    return {
+        "fit_secs": fit_secs,
+        "batch_rows_per_sec": len(X_test) / batch_secs,
+        "single_p50_ms": float(np.percentile(single, 50)),
+        "single_p99_ms": float(np.percentile(single, 99)),
+        "r2": {col: r2_score(y_test[:, i], preds[col]) for i, col in enumerate(TARGET_COLS)},
+        "artifact_kb": len(pickle.dumps(regressors)) / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--csv", default="trainingk.csv")
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=BACKENDS)
+    parser.add_argument("--jobs", type=int, default=train_model.TRAIN_JOBS)
+    args = parser.parse_args()
+
+    X_train, X_test, y_train, y_test = load_split(args.csv)
+    print(f"📊 {len(X_train):,} training rows, {len(X_test):,} test rows, {X_train.shape[1]} features")
+
+    for backend in args.backends:
+        result = bench_backend(backend, X_train, X_test, y_train, y_test, args.jobs)
+        print(f"\n🧠 {backend}")
+        print(f"   fit (3 targets):     {result['fit_secs']:9.2f} s")
+        print(f"   batch predict:       {result['batch_rows_per_sec']:9.0f} rows/s (3 targets)")
+        print(f"   single patient p50:  {result['single_p50_ms']:9.2f} ms")
+        print(f"   single patient p99:  {result['single_p99_ms']:9.2f} ms")
+        for col, r2 in result["r2"].items():
+            print(f"   R² {col}:         {r2:9.3f}")
+        print(f"   artifact size:       {result['artifact_kb']:9.0f} KB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+/api/data latency with and without the response cache
+
+Replays a dashboard-like workload: a handful of popular filter combinations
+(risk label x gender x age range x limit) requested over and over, plus a long tail.
+Runs against the configured storage backend (STORAGE_BACKEND) through the Flask test client.
+
+Usage:
+    python -m benchmarks.bench_data_cache --requests 2000
+    STORAGE_BACKEND=sqlite python -m benchmarks.bench_data_cache
+"""
+
+import argparse
+import itertools
+import time
+
+import numpy as np
+
+import app as web
+
+LABELS = ["All", "Very High Risk", "High Risk", "Moderate Risk", "Low Risk", "Very Low Risk"]
+GENDERS = ["All", "Male", "Female"]
+AGE_RANGES = [(None, None), (65, None), (65, 80), (80, None), (None, 65)]
+LIMITS = [100, 500]
+
+
+def workload(n_requests: int, seed: int):
+    """Query strings drawn from all filter combinations with Zipf-like popularity"""
+    combos = []
+    for label, gender, (min_age, max_age), limit in itertools.product(LABELS, GENDERS, AGE_RANGES, LIMITS):
+        params = {"limit": limit, "risk_label": label, "gender": gender}
+        if min_age is not None:
+            params["min_age"] = min_age
+        if max_age is not None:
+            params["max_age"] = max_age
+        combos.append("&".join(f"{k}={v}" for k, v in params.items()))
+
+    rng = np.random.default_rng(seed)
+    rng.shuffle(combos)
+    weights = 1 / np.arange(1, len(combos) + 1) ** 1.1
+    picks = rng.choice(len(combos), n_requests, p=weights / weights.sum())
+    return [f"/api/data?{combos[i]}" for i in picks]
+
+
+def run(client, urls):
+    timings = []
+    for url in urls:
+        start = time.perf_counter()
+        response = client.get(url, headers={"Accept-Encoding": "gzip"})
+        timings.append((time.perf_counter() - start) * 1000)
+        assert response.status_code == 200, response.status_code
+    return np.array(timings)
+
+
+def report(title, timings, stats=None):
+    print(f"\n⏱️  {title}")
+    print(f"   p50:       {np.percentile(timings, 50):8.2f} ms")
+    print(f"   p99:       {np.percentile(timings, 99):8.2f} ms")
+    print(f"   mean:      {timings.mean():8.2f} ms")
+    if stats:
+        print(f"   hit rate:  {stats['hit_rate'] * 100:8.1f} %  ({stats['hits']} hits, {stats['misses']} misses)")
+        print(f"   cached:    {stats['size']} responses, {stats['bytes'] / 1024:.0f} KB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000, help="requests per run")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    client = web.app.test_client()
+    urls = workload(args.requests, args.seed)
+    print(f"📊 {args.requests} requests over {len(set(urls))} distinct filter combinations "
+          f"({web.STORAGE_BACKEND} backend)")
+
+    # Load the patient table / open the database outside the timed runs
+    client.get("/api/data?limit=1")
+
+    maxsize = web.data_cache.maxsize
+    web.data_cache.maxsize = 0
+    report("Without cache", run(client, urls))
+
+    web.data_cache.maxsize = maxsize
+    web.data_cache.clear()
+    web.data_cache.hits = web.data_cache.misses = 0
+    report("With cache", run(client, urls), web.data_cache.stats())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Per-report PDF render benchmark
+
+Usage:
+    python -m benchmarks.bench_pdf --reports 200
+"""
+
+import argparse
+import statistics
+import time
+
+from risk.report import create_patient_pdf_bytes
+from risk.synthetic import generate_patients
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reports", type=int, default=200, help="number of reports to render")
+    args = parser.parse_args()
+
+    patients = generate_patients(args.reports).to_dict("records")
+
+    # First report pays one-off costs (fonts, styles, pie image per label)
+    start = time.perf_counter()
+    create_patient_pdf_bytes(patients[0])
+    first_ms = (time.perf_counter() - start) * 1000
+
+    timings, sizes = [], []
+    for patient in patients:
+        start = time.perf_counter()
+        pdf = create_patient_pdf_bytes(patient)
+        timings.append((time.perf_counter() - start) * 1000)
+        sizes.append(len(pdf))
+
+    timings.sort()
+    print(f"📄 Rendered {len(timings)} reports")
+    print(f"   first report: {first_ms:8.2f} ms")
+    print(f"   mean:         {statistics.mean(timings):8.2f} ms")
+    print(f"   p50:          {timings[len(timings) // 2]:8.2f} ms")
+    print(f"   p99:          {timings[int(len(timings) * 0.99) - 1]:8.2f} ms")
+    print(f"   reports/sec:  {1000 / statistics.mean(timings):8.1f}")
+    print(f"   avg size:     {statistics.mean(sizes) / 1024:8.1f} KB")
+
+
+if __name__ == "__main__":
+    main()
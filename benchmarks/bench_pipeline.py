@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+End-to-end scoring pipeline benchmark
+Times each stage of scoring a synthetic patient file (trainingk.csv schema) at several sizes:
+load, preprocess, predict, SHAP, recommend, serialize and PDF. Results are written as JSON;
+--compare reads an earlier results file and flags stages whose throughput dropped.
+
+SHAP, recommendations and PDF reports are per-patient work, so they are timed on at most
+--shap-rows / --recommend-rows / --pdf-reports patients and reported as rows per second.
+
+Usage:
+    python -m benchmarks.bench_pipeline                          # 1K, 100K and 1M rows
+    python -m benchmarks.bench_pipeline --rows 1000 100000 --output baseline.json
+    python -m benchmarks.bench_pipeline --rows 1000 100000 --repeat 3 --compare baseline.json  # exit 1 on regressions
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import train_model
+from risk.backends import MODEL_BACKEND, STEP_NAMES
+from benchmarks.bench_training import write_synthetic_csv
+from risk.labels import label_scores
+from risk.model import batch_recommendations, top_features
+from risk.preprocess import feature_cols, preprocess_features, target_cols
+from risk.report import create_patient_pdf_bytes
+from risk.schema import load_patient_table
+from risk.synthetic import generate_patients
+
+SIZES = [1_000, 100_000, 1_000_000]
+MODEL_ROWS = 20_000
+REGRESSION_THRESHOLD = 0.10   # slower than the baseline by more than this is flagged
+
+
+def bench_model():
+    """Regressors with the production training settings, fitted on synthetic patients"""
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import StandardScaler
+
+    df = preprocess_features(generate_patients(MODEL_ROWS, seed=1234))
+    X, y = df[feature_cols].to_numpy(np.float32), df[target_cols].to_numpy()
+    scaler = StandardScaler().fit(X)
+    models = train_model.fit_regressors(scaler.transform(X), y, target_cols)
+    return {col: Pipeline([("scaler", scaler), (STEP_NAMES[MODEL_BACKEND], models[col])]) for col in target_cols}
+
+
+class Stages:
+    """Wall time and rows per stage for one dataset size; the best of `repeat` runs is kept"""
+
+    def __init__(self, repeat=1):
+        self.repeat = repeat
+        self.results = {}
+
+    def time(self, name, rows, fn, *args):
+        secs = float("inf")
+        for _ in range(self.repeat):
+            start = time.perf_counter()
+            value = fn(*args)
+            secs = min(secs, time.perf_counter() - start)
+        self.results[name] = {"rows": int(rows), "secs": secs, "rows_per_sec": rows / secs if secs else None}
+        print(f"   {name:12s} {rows:>10,} rows {secs:9.3f} s {rows / secs if secs else 0:12,.0f} rows/s")
+        return value
+
+
+def predict(regressors, X):
+    return {col: np.clip(np.round(regressors[col].predict(X)), 0, 100).astype(int) for col in target_cols}
+
+
+def serialize(df):
+    """JSON records as the API returns them, NaN as null"""
+    records = df.astype(object).where(df.notna(), None).to_dict("records")
+    return json.dumps(records, default=str).encode("utf-8")
+
+
+def render_reports(patients):
+    return [create_patient_pdf_bytes(patient) for patient in patients]
+
+
+def run_size(n_rows, regressors, args, workdir):
+    print(f"\n📊 {n_rows:,} patients")
+    csv_path = os.path.join(workdir, f"patients_{n_rows}.csv")
+    if not os.path.exists(csv_path):
+        write_synthetic_csv(csv_path, n_rows)
+    stages = Stages(args.repeat)
+
+    df = stages.time("load", n_rows, load_patient_table, csv_path)
+    processed = stages.time("preprocess", n_rows, preprocess_features, df)
+    X = processed[feature_cols].to_numpy(np.float32)
+    scores = stages.time("predict", n_rows, predict, regressors, X)
+
+    # Patient rows with fresh scores, as predict_batch / the rescoring job produce them
+    scored = df.copy()
+    for col in target_cols:
+        scored[col] = scores[col]
+    scored["RISK_LABEL"] = label_scores(scored["RISK_30D"])
+
+    n_shap = min(n_rows, args.shap_rows)
+    stages.time("shap", n_shap, top_features, regressors, X[:n_shap])
+    n_recommend = min(n_rows, args.recommend_rows)
+    stages.time("recommend", n_recommend, batch_recommendations,
+                scored.iloc[:n_recommend], processed.iloc[:n_recommend])
+    stages.time("serialize", n_rows, serialize, scored)
+    n_pdf = min(n_rows, args.pdf_reports)
+    stages.time("pdf", n_pdf, render_reports, scored.iloc[:n_pdf].to_dict("records"))
+    return stages.results
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    import sklearn
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "sklearn": sklearn.__version__,
+    }
+
+
+def compare(results, baseline, threshold=REGRESSION_THRESHOLD):
+    """Print throughput change per stage against a baseline results file; returns the regressions"""
+    regressions = []
+    print(f"\n🔁 Compared with {baseline['environment'].get('commit') or 'baseline'} "
+          f"({baseline['environment']['timestamp']})")
+    for size, stages in results["sizes"].items():
+        old_stages = baseline["sizes"].get(size)
+        if old_stages is None:
+            continue
+        for name, stage in stages.items():
+            old = old_stages.get(name)
+            if not old or not old.get("rows_per_sec") or not stage.get("rows_per_sec"):
+                continue
+            change = stage["rows_per_sec"] / old["rows_per_sec"] - 1
+            flag = "⚠️ " if change < -threshold else "  "
+            print(f" {flag} {int(size):>10,} {name:12s} {change * 100:+7.1f}%")
+            if change < -threshold:
+                regressions.append((size, name, change))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=SIZES, help="dataset sizes to benchmark")
+    parser.add_argument("--shap-rows", type=int, default=2_000, help="patients explained per size")
+    parser.add_argument("--recommend-rows", type=int, default=2_000, help="patients given recommendations")
+    parser.add_argument("--pdf-reports", type=int, default=50, help="PDF reports rendered per size")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per stage; the fastest is recorded")
+    parser.add_argument("--output", help="results file (default: benchmarks/results/pipeline_<timestamp>.json)")
+    parser.add_argument("--compare", help="earlier results file to check for regressions")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="throughput drop flagged as a regression (0.10 = 10%%)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    regressors = bench_model()
+    print(f"🧠 Fitted benchmark model on {MODEL_ROWS:,} synthetic patients in {time.perf_counter() - start:.1f}s")
+
+    results = {"environment": environment(), "settings": vars(args).copy(), "sizes": {}}
+    with tempfile.TemporaryDirectory() as workdir:
+        for n_rows in args.rows:
+            results["sizes"][str(n_rows)] = run_size(n_rows, regressors, args, workdir)
+
+    output = args.output or os.path.join(
+        "benchmarks", "results", f"pipeline_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\n💾 Results written to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        if regressions:
+            print(f"❌ {len(regressions)} stage(s) more than {args.threshold * 100:.0f}% slower")
+            raise SystemExit(1)
+        print("✅ No regressions")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Training benchmark on a synthetic patient CSV
+Writes N synthetic rows (trainingk.csv schema) to a temporary directory and runs the full
+training entry point there, printing wall time and peak RSS per stage
+
+Usage:
+    python -m benchmarks.bench_training --rows 1000000
+    python -m benchmarks.bench_training --rows 5000000 --no-shap --jobs 8
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+import train_model
+from risk.synthetic import generate_patients
+
+CHUNK_ROWS = 500_000
+
+
+def write_synthetic_csv(path: str, n_rows: int):
+    """Write n_rows synthetic patients in chunks so generation itself stays small"""
+    columns = pd.read_csv("trainingk.csv", nrows=0).columns if os.path.exists("trainingk.csv") else None
+    for seed, start in enumerate(range(0, n_rows, CHUNK_ROWS)):
+        chunk = generate_patients(min(CHUNK_ROWS, n_rows - start), seed=seed)
+        if columns is not None:
+            chunk = chunk.reindex(columns=columns)
+        chunk.to_csv(path, mode="a", header=start == 0, index=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000, help="synthetic rows to train on")
+    parser.add_argument("--jobs", type=int, default=train_model.TRAIN_JOBS, help="cores used to fit the forests")
+    parser.add_argument("--no-shap", action="store_true", help="skip the SHAP feature importance step")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        csv_path = os.path.join(workdir, "synthetic.csv")
+        start = time.perf_counter()
+        write_synthetic_csv(csv_path, args.rows)
+        print(f"🧪 Wrote {args.rows:,} synthetic rows ({os.path.getsize(csv_path) / 1024**2:.0f} MB) "
+              f"in {time.perf_counter() - start:.1f}s")
+
+        # Models land in the temporary directory, not in ./models
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        try:
+            start = time.perf_counter()
+            train_model.quick_train(csv_path, args.jobs, explain=not args.no_shap)
+            elapsed = time.perf_counter() - start
+        finally:
+            os.chdir(cwd)
+
+    print(f"\n📊 {args.rows:,} rows trained in {elapsed:.1f}s with {args.jobs} jobs")
+
+
+if __name__ == "__main__":
+    main()
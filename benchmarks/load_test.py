@@ -0,0 +1,446 @@
+#!/usr/bin/env python3
+"""
+HTTP load test for the dashboard API
+Concurrent asyncio clients replay a mix of dashboard reads (/api/data, /api/summary) and
+prediction writes (/api/predict). Report emails go to a local SMTP sink instead of a real
+server. Prints throughput, p50/p95/p99 latency and error rate per endpoint, then checks the
+patient store for writes that were acknowledged but are missing (lost) or stored twice.
+
+With --serve the app is started on a scratch copy of the patient CSV, so the real
+trainingk.csv is never touched. With --url an already running server is tested; point its
+EMAIL_HOST/EMAIL_PORT at the sink (--smtp-port) and pass its CSV with --csv.
+
+Usage:
+    python -m benchmarks.load_test --serve gunicorn --concurrency 32 --duration 60
+    python -m benchmarks.load_test --serve uvicorn --mix data=60,summary=20,predict=20
+    STORAGE_BACKEND=sqlite python -m benchmarks.load_test --serve waitress
+    python -m benchmarks.load_test --url http://localhost:5000 --csv trainingk.csv --smtp-port 2525
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import urlsplit
+
+import numpy as np
+import pandas as pd
+
+from risk.synthetic import generate_patients
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_MIX = "data=70,summary=20,predict=10"
+EMAIL_FRACTION = 0.5   # share of new patients given an address, so reports get queued and mailed
+
+LABELS = ["All", "Very High Risk", "High Risk", "Moderate Risk", "Low Risk", "Very Low Risk"]
+GENDERS = ["All", "Male", "Female"]
+AGE_RANGES = [(None, None), (65, None), (65, 80), (80, None)]
+
+# Inputs /api/predict accepts; scores, labels and recommendations are what it fills in
+INPUT_COLS = [
+    "AGE", "GENDER", "PARTA", "PARTB", "PARTD", "HMO", "ALZHEIMER", "HEARTFAILURE", "CANCER",
+    "PULMONARY", "OSTEOPOROSIS", "RHEUMATOID", "STROKE", "RENAL_DISEASE", "BMI", "BP_S", "GLUCOSE",
+    "HbA1c", "CHOLESTEROL", "RX_ADH", "BP_trend", "HbA1c_trend", "OUTPATIENT_COST", "ED_COST",
+    "TOTAL_CLAIMS_COST", "IN_ADM", "OUT_VISITS", "ED_VISITS",
+]
+
+
+# ---------------------------
+# SMTP sink
+# ---------------------------
+class SMTPSink:
+    """Accepts and discards mail (any AUTH PLAIN/LOGIN succeeds), counting messages"""
+
+    def __init__(self):
+        self.messages = 0
+        self.server = None
+        self.sessions = set()
+
+    async def start(self, host="127.0.0.1", port=0):
+        self.server = await asyncio.start_server(self._session, host, port)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.server.close()
+        # Pooled SMTP sessions from the app may still be open; end them before the loop does
+        for writer in list(self.sessions):
+            writer.close()
+        while self.sessions:
+            await asyncio.sleep(0.01)
+        await self.server.wait_closed()
+
+    async def _session(self, reader, writer):
+        def reply(line):
+            writer.write(line.encode() + b"\r\n")
+
+        self.sessions.add(writer)
+        reply("220 loadtest SMTP sink")
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                command = line.decode(errors="replace").strip().upper()
+                if command.startswith("EHLO"):
+                    reply("250-loadtest\r\n250-AUTH PLAIN LOGIN\r\n250 8BITMIME")
+                elif command.startswith("AUTH LOGIN"):
+                    for prompt in ("334 VXNlcm5hbWU6", "334 UGFzc3dvcmQ6"):
+                        reply(prompt)
+                        await writer.drain()
+                        await reader.readline()
+                    reply("235 Authenticated")
+                elif command.startswith("AUTH"):
+                    reply("235 Authenticated")
+                elif command == "DATA":
+                    reply("354 End data with <CR><LF>.<CR><LF>")
+                    await writer.drain()
+                    while (await reader.readline()) not in (b".\r\n", b""):
+                        pass
+                    self.messages += 1
+                    reply("250 Queued")
+                elif command == "QUIT":
+                    reply("221 Bye")
+                    break
+                else:  # HELO, MAIL, RCPT, RSET, NOOP
+                    reply("250 OK")
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.sessions.discard(writer)
+            writer.close()
+
+
+# ---------------------------
+# HTTP client
+# ---------------------------
+class HTTPConnection:
+    """Minimal keep-alive HTTP/1.1 client on asyncio streams, one request at a time"""
+
+    def __init__(self, host, port):
+        self.host, self.port = host, port
+        self.reader = self.writer = None
+
+    async def request(self, method, path, body=None):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        headers = [f"{method} {path} HTTP/1.1", f"Host: {self.host}:{self.port}",
+                   "Accept-Encoding: gzip", "Connection: keep-alive"]
+        if body is not None:
+            headers += ["Content-Type: application/json", f"Content-Length: {len(body)}"]
+        self.writer.write(("\r\n".join(headers) + "\r\n\r\n").encode() + (body or b""))
+        await self.writer.drain()
+
+        status = int((await self.reader.readline()).split()[1])
+        response_headers = {}
+        while (line := await self.reader.readline()) not in (b"\r\n", b""):
+            name, _, value = line.decode("latin-1").partition(":")
+            response_headers[name.strip().lower()] = value.strip()
+
+        if response_headers.get("transfer-encoding", "").lower() == "chunked":
+            payload = bytearray()
+            while (size := int((await self.reader.readline()).split(b";")[0], 16)):
+                payload += await self.reader.readexactly(size + 2)
+                del payload[-2:]
+            await self.reader.readline()
+        else:
+            payload = await self.reader.readexactly(int(response_headers.get("content-length", 0)))
+
+        if response_headers.get("connection", "").lower() == "close":
+            await self.close()
+        return status, bytes(payload)
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.reader = self.writer = None
+
+
+# ---------------------------
+# Workload
+# ---------------------------
+def parse_mix(mix):
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in ("data", "summary", "predict"):
+            raise SystemExit(f"Unknown endpoint in --mix: {name!r} (use data, summary, predict)")
+        weights[name.strip()] = float(weight)
+    return weights
+
+
+def data_url(rng):
+    """An /api/data query as the dashboard filters issue them"""
+    min_age, max_age = AGE_RANGES[rng.randrange(len(AGE_RANGES))]
+    params = {"limit": rng.choice([100, 500]), "risk_label": rng.choice(LABELS), "gender": rng.choice(GENDERS)}
+    if min_age is not None:
+        params["min_age"] = min_age
+    if max_age is not None:
+        params["max_age"] = max_age
+    return "/api/data?" + "&".join(f"{k}={v}".replace(" ", "%20") for k, v in params.items())
+
+
+class PatientFeed:
+    """New-patient payloads with IDs unique to this run"""
+
+    def __init__(self, run_id, seed):
+        self.prefix = f"LT{run_id}_"
+        self.rng = random.Random(seed)
+        self.pool = generate_patients(2000, seed=seed)[INPUT_COLS].to_dict("records")
+        self.count = 0
+
+    def next(self):
+        self.count += 1
+        patient = dict(self.rng.choice(self.pool), DESYNPUF_ID=f"{self.prefix}{self.count:07d}")
+        if self.rng.random() < EMAIL_FRACTION:
+            patient["EMAIL"] = f"patient{self.count}@loadtest.invalid"
+        return patient
+
+
+async def virtual_user(host, port, weights, feed, rng, deadline, results, accepted):
+    conn = HTTPConnection(host, port)
+    endpoints, cum_weights = list(weights), list(np.cumsum(list(weights.values())))
+    try:
+        while time.perf_counter() < deadline:
+            endpoint = rng.choices(endpoints, cum_weights=cum_weights)[0]
+            body, patient_id = None, None
+            if endpoint == "data":
+                method, path = "GET", data_url(rng)
+            elif endpoint == "summary":
+                method, path = "GET", "/api/summary"
+            else:
+                patient = feed.next()
+                patient_id = patient["DESYNPUF_ID"]
+                method, path, body = "POST", "/api/predict", json.dumps(patient).encode()
+
+            start = time.perf_counter()
+            try:
+                status, payload = await conn.request(method, path, body)
+                ok = status in (200, 304)
+            except (OSError, ValueError, IndexError, asyncio.IncompleteReadError):
+                await conn.close()
+                ok = False
+            results[endpoint].append((time.perf_counter() - start, ok))
+            if ok and patient_id:
+                accepted.append(patient_id)
+    finally:
+        await conn.close()
+
+
+async def run_load(url, weights, concurrency, duration, feed, seed):
+    parts = urlsplit(url)
+    results = {name: [] for name in weights}
+    accepted = []
+    deadline = time.perf_counter() + duration
+    users = [virtual_user(parts.hostname, parts.port or 80, weights, feed, random.Random(seed + i),
+                          deadline, results, accepted)
+             for i in range(concurrency)]
+    start = time.perf_counter()
+    await asyncio.gather(*users)
+    return results, accepted, time.perf_counter() - start
+
+
+# ---------------------------
+# Reporting and write check
+# ---------------------------
+def summarize(results, elapsed):
+    summary = {}
+    for endpoint, samples in results.items():
+        if not samples:
+            continue
+        latencies = np.array([secs for secs, _ in samples]) * 1000
+        errors = sum(1 for _, ok in samples if not ok)
+        summary[endpoint] = {
+            "requests": len(samples),
+            "throughput_rps": len(samples) / elapsed,
+            "p50_ms": float(np.percentile(latencies, 50)),
+            "p95_ms": float(np.percentile(latencies, 95)),
+            "p99_ms": float(np.percentile(latencies, 99)),
+            "error_rate": errors / len(samples),
+        }
+    return summary
+
+
+def stored_ids(prefix, csv_path=None, db_path=None, table="beneficiary"):
+    """IDs with the run's prefix found in the CSV or the SQLite patient table"""
+    if db_path:
+        with sqlite3.connect(db_path) as conn:
+            rows = conn.execute(f"SELECT DESYNPUF_ID FROM {table} WHERE DESYNPUF_ID LIKE ?", (prefix + "%",))
+            return [row[0] for row in rows]
+    ids = pd.read_csv(csv_path, usecols=["DESYNPUF_ID"], dtype=str, on_bad_lines="skip")["DESYNPUF_ID"]
+    return ids[ids.str.startswith(prefix, na=False)].tolist()
+
+
+def check_writes(accepted, stored):
+    counts = pd.Series(stored, dtype=object).value_counts()
+    lost = sorted(set(accepted) - set(counts.index))
+    duplicated = counts[counts > 1]
+    return {
+        "acknowledged": len(accepted),
+        "stored": int(counts.size),
+        "lost": len(lost),
+        "lost_sample": lost[:10],
+        "duplicated": int(duplicated.size),
+    }
+
+
+# ---------------------------
+# Server under test
+# ---------------------------
+def start_server(server, workdir, port, smtp_port, workers, source_csv):
+    """Run serve.py in workdir on a copy of the patient CSV; returns (process, log path)"""
+    shutil.copy(source_csv, os.path.join(workdir, "trainingk.csv"))
+    for name in ("models", "gunicorn.conf.py"):
+        if os.path.exists(os.path.join(REPO_DIR, name)):
+            os.symlink(os.path.join(REPO_DIR, name), os.path.join(workdir, name))
+
+    env = dict(os.environ,
+               PYTHONPATH=REPO_DIR + os.pathsep + os.environ.get("PYTHONPATH", ""),
+               HOST="127.0.0.1", PORT=str(port),
+               EMAIL_HOST="127.0.0.1", EMAIL_PORT=str(smtp_port), EMAIL_USE_TLS="False",
+               EMAIL_HOST_USER="loadtest@loadtest.invalid", EMAIL_HOST_PASSWORD="loadtest",
+               DELIVERY_RETRY_DELAY="1", OUTBOX_DB=os.path.join(workdir, "outbox.db"),
+               DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'risk_data.db')}")
+    log_path = os.path.join(workdir, "server.log")
+    with open(log_path, "w") as log:
+        process = subprocess.Popen(
+            [sys.executable, os.path.join(REPO_DIR, "serve.py"), "--server", server,
+             "--port", str(port), "--host", "127.0.0.1", "--workers", str(workers)],
+            cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+    return process, log_path
+
+
+async def wait_until_healthy(url, process, timeout=120):
+    parts = urlsplit(url)
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if process is not None and process.poll() is not None:
+            return False
+        conn = HTTPConnection(parts.hostname, parts.port or 80)
+        try:
+            status, _ = await conn.request("GET", "/api/health")
+            if status == 200:
+                return True
+        except (OSError, ValueError, IndexError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            await conn.close()
+        await asyncio.sleep(0.5)
+    return False
+
+
+async def warm_up(url):
+    parts = urlsplit(url)
+    conn = HTTPConnection(parts.hostname, parts.port or 80)
+    try:
+        for path in ("/api/data?limit=1", "/api/summary"):
+            await conn.request("GET", path)
+    finally:
+        await conn.close()
+
+
+def stop_server(process):
+    process.terminate()
+    try:
+        process.wait(timeout=30)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+# ---------------------------
+# Main
+# ---------------------------
+async def main_async(args):
+    sink = SMTPSink()
+    smtp_port = await sink.start(port=args.smtp_port)
+    weights = parse_mix(args.mix)
+    feed = PatientFeed(time.strftime("%Y%m%d%H%M%S"), args.seed)
+
+    workdir, process = None, None
+    csv_path, db_path = args.csv, None
+    url = args.url
+    if args.serve:
+        workdir = tempfile.mkdtemp(prefix="loadtest_")
+        url = f"http://127.0.0.1:{args.port}"
+        process, log_path = start_server(args.serve, workdir, args.port, smtp_port, args.workers, args.csv)
+        csv_path = os.path.join(workdir, "trainingk.csv")
+        if os.getenv("STORAGE_BACKEND", "csv").lower() == "sqlite":
+            db_path = os.path.join(workdir, "risk_data.db")
+        print(f"🚀 Started {args.serve} ({args.workers} workers) on {url}, logs in {log_path}")
+    else:
+        print(f"🎯 Testing {url}; SMTP sink on 127.0.0.1:{smtp_port}")
+
+    try:
+        if not await wait_until_healthy(url, process):
+            raise SystemExit(f"❌ {url} did not become healthy" + (f", see {log_path}" if process else ""))
+
+        # Load the patient table (and model) in the server before timing anything
+        await warm_up(url)
+        print(f"🔥 {args.concurrency} clients for {args.duration:.0f}s, mix {args.mix}")
+        results, accepted, elapsed = await run_load(url, weights, args.concurrency, args.duration, feed, args.seed)
+
+        # Give queued report emails a moment to reach the sink
+        await asyncio.sleep(args.drain)
+        summary = summarize(results, elapsed)
+        writes = check_writes(accepted, stored_ids(feed.prefix, csv_path, db_path))
+    finally:
+        if process is not None:
+            stop_server(process)
+        await sink.stop()
+
+    total = sum(s["requests"] for s in summary.values())
+    print(f"\n📊 {total:,} requests in {elapsed:.1f}s ({total / elapsed:,.1f} req/s)")
+    print(f"   {'endpoint':10s} {'requests':>9s} {'req/s':>8s} {'p50 ms':>8s} {'p95 ms':>8s} {'p99 ms':>8s} {'errors':>7s}")
+    for endpoint, s in summary.items():
+        print(f"   {endpoint:10s} {s['requests']:9,d} {s['throughput_rps']:8.1f} {s['p50_ms']:8.1f} "
+              f"{s['p95_ms']:8.1f} {s['p99_ms']:8.1f} {s['error_rate'] * 100:6.1f}%")
+
+    print(f"\n📝 Writes: {writes['acknowledged']} acknowledged, {writes['stored']} stored, "
+          f"{writes['lost']} lost, {writes['duplicated']} duplicated")
+    if writes["lost"]:
+        print(f"   ❌ Lost writes, e.g. {', '.join(writes['lost_sample'])}")
+    print(f"📧 SMTP sink received {sink.messages} emails")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"settings": vars(args), "elapsed_secs": elapsed, "endpoints": summary,
+                       "writes": writes, "emails_received": sink.messages}, f, indent=2)
+        print(f"💾 Results written to {args.output}")
+
+    if workdir and not args.keep:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return 1 if writes["lost"] or writes["duplicated"] else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--serve", choices=["gunicorn", "waitress", "uvicorn"],
+                        help="start the app with serve.py on a scratch copy of --csv")
+    target.add_argument("--url", help="base URL of a running server")
+    parser.add_argument("--csv", default=os.path.join(REPO_DIR, "trainingk.csv"),
+                        help="patient CSV: copied for --serve, checked for lost writes with --url")
+    parser.add_argument("--port", type=int, default=5055, help="port for --serve")
+    parser.add_argument("--workers", type=int, default=2, help="server worker processes for --serve")
+    parser.add_argument("--smtp-port", type=int, default=0, help="SMTP sink port (default: any free port)")
+    parser.add_argument("--concurrency", type=int, default=16, help="concurrent clients")
+    parser.add_argument("--duration", type=float, default=30, help="seconds of load")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="endpoint weights")
+    parser.add_argument("--drain", type=float, default=5, help="seconds to wait for queued emails afterwards")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="write the results as JSON")
+    parser.add_argument("--keep", action="store_true", help="keep the --serve scratch directory")
+    args = parser.parse_args()
+    raise SystemExit(asyncio.run(main_async(args)))
+
+
+if __name__ == "__main__":
+    main()
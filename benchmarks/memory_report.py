@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Memory report for the in-memory patient table
+Compares the legacy read_csv(low_memory=False) frame with the compact schema
+
+Usage:
+    python -m benchmarks.memory_report                  # trainingk.csv + 1M synthetic rows
+    python -m benchmarks.memory_report --rows 5000000   # bigger synthetic table
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+from risk.schema import load_patient_table, memory_by_column, memory_usage_mb
+from risk.synthetic import generate_patients
+
+
+def report(path: str, title: str):
+    start = time.perf_counter()
+    legacy = pd.read_csv(path, low_memory=False)
+    legacy_secs = time.perf_counter() - start
+
+    start = time.perf_counter()
+    compact = load_patient_table(path)
+    compact_secs = time.perf_counter() - start
+
+    before, after = memory_usage_mb(legacy), memory_usage_mb(compact)
+    print(f"\n📊 {title}: {len(compact):,} rows")
+    print(f"   Before: {before:8.1f} MB  (load {legacy_secs:.2f}s)")
+    print(f"   After:  {after:8.1f} MB  (load {compact_secs:.2f}s)")
+    print(f"   Saved:  {before - after:8.1f} MB  ({(1 - after / before) * 100:.0f}%)")
+    print("   Largest columns after:")
+    for col, dtype, mb in memory_by_column(compact)[:6]:
+        print(f"     {col:20s} {dtype:10s} {mb:8.2f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--csv", default="trainingk.csv", help="patient CSV to measure")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="synthetic table size")
+    args = parser.parse_args()
+
+    if os.path.exists(args.csv):
+        report(args.csv, args.csv)
+    else:
+        print(f"⚠️  {args.csv} not found, skipping")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "synthetic.csv")
+        generate_patients(args.rows).to_csv(path, index=False)
+        report(path, "Synthetic table")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+"""
+Gunicorn configuration for the Risk Stratification Web App
+Usage: gunicorn -c gunicorn.conf.py wsgi:app
+"""
+
+import gc
+import os
+
+bind = f"{os.getenv('HOST', '0.0.0.0')}:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv("WEB_WORKERS", 2))
+threads = int(os.getenv("WEB_THREADS", 4))
+worker_class = "gthread" if threads > 1 else "sync"
+timeout = int(os.getenv("WEB_TIMEOUT", 120))  # bulk PDF exports can run long
+graceful_timeout = 30
+keepalive = 5
+
+# Import the app (model, patient table, reportlab) once in the master and fork workers
+# from it, so those pages are shared copy-on-write
+preload_app = True
+
+accesslog = os.getenv("WEB_ACCESS_LOG", "-")
+errorlog = "-"
+loglevel = os.getenv("WEB_LOG_LEVEL", "info")
+
+
+def when_ready(server):
+    # Move everything loaded so far out of the collector's generations; otherwise the
+    # first GC pass in each worker touches every object header and un-shares the pages
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    from app import delivery_queue
+    from risk.db import dispose_engine
+
+    # Connections opened by the master (SQLite store init) must not be shared across processes
+    dispose_engine()
+    # Threads don't survive fork, so each worker runs its own delivery workers; they
+    # claim jobs from the shared outbox atomically
+    delivery_queue.start()
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Population rescoring job
+Rescores the patient store (trainingk.csv, or the SQLite patient table with STORAGE_BACKEND=sqlite)
+with the current model, but only the rows whose preprocessed feature vector or the model changed
+since the last run. Per-patient fingerprints are kept in a small SQLite state file; scores that
+actually changed are written back in one bulk update. Run it nightly, and after shipping a model.
+
+Usage:
+    python rescore.py                                     # rescore what changed since the last run
+    python rescore.py --model models/risk_model.pkl --chunk-rows 20000
+    python rescore.py --dry-run                           # report what would be rescored and written
+    python rescore.py --full                              # ignore fingerprints and rescore everyone
+"""
+
+import argparse
+import hashlib
+import os
+import sqlite3
+import sys
+import time
+from contextlib import closing
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from risk.labels import label_scores
+from risk.model import load_model, top_features
+from risk.preprocess import feature_cols, preprocess_features, target_cols
+from risk.schema import load_patient_table
+
+CSV_FILE = "trainingk.csv"
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "csv").lower()
+# Same model file the web app loads
+MODEL_PATH = os.getenv("MODEL_PATH", "models/risk_model_20250902_010322.pkl")
+RESCORE_STATE = os.getenv("RESCORE_STATE", "rescore_state.db")
+CHUNK_ROWS = int(os.getenv("RESCORE_CHUNK_ROWS", 50_000))
+
+RESULT_COLS = target_cols + ["RISK_LABEL", "TOP_3_FEATURES"]
+
+
+# -------------------------------
+# Fingerprints
+# -------------------------------
+def model_version(path: str) -> str:
+    """Digest of the model file's bytes: a re-copied file keeps its version, a retrained one does not"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def feature_fingerprints(processed: pd.DataFrame) -> np.ndarray:
+    """64-bit hash per row of the feature_cols values, normalized to float64 (vectorized)"""
+    features = processed[feature_cols].apply(pd.to_numeric, errors="coerce").astype(np.float64)
+    return pd.util.hash_pandas_object(features, index=False).to_numpy().view(np.int64)
+
+
+def patient_keys(df: pd.DataFrame) -> pd.DataFrame:
+    """(patient_id, occurrence) per row; occurrence tells apart rows that repeat a patient ID"""
+    ids = df["DESYNPUF_ID"].astype(str)
+    return pd.DataFrame({"patient_id": ids.to_numpy(),
+                         "occurrence": ids.groupby(ids).cumcount().to_numpy()})
+
+
+class FingerprintStore:
+    """Fingerprint and model version each row was last scored with, plus a log of runs"""
+
+    def __init__(self, db_path: str = RESCORE_STATE):
+        self.db_path = db_path
+        with closing(self._connect()) as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS patient_fingerprints (
+                    patient_id TEXT NOT NULL,
+                    occurrence INTEGER NOT NULL,
+                    fingerprint INTEGER NOT NULL,
+                    model_version TEXT NOT NULL,
+                    PRIMARY KEY (patient_id, occurrence)
+                );
+                CREATE TABLE IF NOT EXISTS rescore_runs (
+                    started_at TEXT NOT NULL,
+                    source TEXT NOT NULL,
+                    model_version TEXT NOT NULL,
+                    rows INTEGER NOT NULL,
+                    skipped INTEGER NOT NULL,
+                    rescored INTEGER NOT NULL,
+                    written INTEGER NOT NULL,
+                    seconds REAL NOT NULL
+                );
+            """)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def load(self) -> pd.DataFrame:
+        with closing(self._connect()) as conn:
+            return pd.read_sql_query(
+                "SELECT patient_id, occurrence, fingerprint, model_version FROM patient_fingerprints", conn)
+
+    def replace(self, keys: pd.DataFrame, fingerprints: np.ndarray, version: str):
+        """Store the fingerprints of the current rows and forget rows no longer in the source"""
+        rows = zip(keys["patient_id"], keys["occurrence"].tolist(), fingerprints.tolist())
+        with closing(self._connect()) as conn, conn:
+            conn.execute("DELETE FROM patient_fingerprints")
+            conn.executemany("INSERT INTO patient_fingerprints VALUES (?, ?, ?, ?)",
+                             ((pid, occ, fp, version) for pid, occ, fp in rows))
+
+    def log_run(self, **run):
+        with closing(self._connect()) as conn, conn:
+            conn.execute("INSERT INTO rescore_runs VALUES (:started_at, :source, :model_version, :rows, "
+                         ":skipped, :rescored, :written, :seconds)", run)
+
+
+def rows_to_rescore(keys, fingerprints, version, stored: pd.DataFrame) -> np.ndarray:
+    """Boolean mask of rows that are new, whose features changed or that an older model scored"""
+    current = keys.assign(fingerprint=fingerprints)
+    merged = current.merge(stored, on=["patient_id", "occurrence"], how="left", suffixes=("", "_stored"))
+    return (merged["fingerprint_stored"].isna()
+            | (merged["fingerprint"] != merged["fingerprint_stored"])
+            | (merged["model_version"] != version)).to_numpy()
+
+
+# -------------------------------
+# Scoring
+# -------------------------------
+def score(regressors, X, explain=True):
+    """Risk scores, label and (optionally) TOP_3_FEATURES for a block of feature rows"""
+    scores = {col: np.clip(np.round(regressors[col].predict(X)), 0, 100).astype(int) for col in target_cols}
+    scores["RISK_LABEL"] = np.asarray(label_scores(scores["RISK_30D"]).astype(str))
+    if explain:
+        scores["TOP_3_FEATURES"] = top_features(regressors, X)
+    return pd.DataFrame(scores)
+
+
+def changed_results(old: pd.DataFrame, new: pd.DataFrame) -> np.ndarray:
+    """Rows where any result column differs from what is stored (missing old values count as changed)"""
+    changed = np.zeros(len(new), dtype=bool)
+    for col in new.columns:
+        if col not in old:
+            changed[:] = True
+            break
+        before = old[col].to_numpy()
+        after = new[col].to_numpy()
+        if col in target_cols:
+            before = pd.to_numeric(pd.Series(before), errors="coerce").to_numpy()
+            changed |= ~(before == after)
+        else:
+            changed |= pd.Series(before).astype(object).where(pd.notna(before), None).to_numpy() != after
+    return changed
+
+
+# -------------------------------
+# Storage
+# -------------------------------
+def load_source(backend: str, csv_path: str):
+    if backend == "sqlite":
+        from risk.db import PATIENT_TABLE, init_patient_store, load_data_from_db
+        init_patient_store(csv_path)
+        return load_data_from_db(PATIENT_TABLE), f"sqlite:{PATIENT_TABLE}"
+    return load_patient_table(csv_path), csv_path
+
+
+def write_back(backend: str, csv_path: str, df: pd.DataFrame, positions: np.ndarray, results: pd.DataFrame):
+    """Write the changed results: one bulk UPDATE for SQLite, one atomic rewrite for the CSV"""
+    if backend == "sqlite":
+        from risk.db import PATIENT_TABLE, update_predictions_in_db_bulk
+        update = results.copy()
+        update.insert(0, "DESYNPUF_ID", df["DESYNPUF_ID"].to_numpy()[positions])
+        if "TOP_3_FEATURES" not in update:
+            update["TOP_3_FEATURES"] = df["TOP_3_FEATURES"].to_numpy()[positions]
+        update_predictions_in_db_bulk(update, PATIENT_TABLE)
+        return
+
+    for col in results.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype(object)
+        elif col in target_cols:
+            df[col] = df[col].astype(np.float64)
+        df.iloc[positions, df.columns.get_loc(col)] = results[col].to_numpy()
+    tmp_path = f"{csv_path}.rescore.tmp"
+    df.to_csv(tmp_path, index=False)
+    # Readers (the web app reloads on mtime change) only ever see a complete file
+    os.replace(tmp_path, csv_path)
+
+
+def rescore(backend=STORAGE_BACKEND, csv_path=CSV_FILE, model_path=MODEL_PATH, state_path=RESCORE_STATE,
+            chunk_rows=CHUNK_ROWS, explain=True, full=False, dry_run=False):
+    started_at = datetime.now().isoformat(timespec="seconds")
+    start = time.perf_counter()
+
+    regressors = load_model(model_path)
+    version = model_version(model_path)
+    store = FingerprintStore(state_path)
+
+    df, source = load_source(backend, csv_path)
+    processed = preprocess_features(df)
+    keys = patient_keys(df)
+    fingerprints = feature_fingerprints(processed)
+    stored = store.load()
+    mask = np.ones(len(df), dtype=bool) if full else rows_to_rescore(keys, fingerprints, version, stored)
+    positions = np.flatnonzero(mask)
+    print(f"📊 {len(df):,} patients from {source}; {len(positions):,} to rescore "
+          f"(model {version[:12]}, {len(stored):,} fingerprints on record)")
+
+    X = processed[feature_cols].to_numpy(np.float64)
+    score_start = time.perf_counter()
+    results = []
+    for chunk_start in range(0, len(positions), chunk_rows):
+        chunk = positions[chunk_start:chunk_start + chunk_rows]
+        results.append(score(regressors, X[chunk], explain))
+        print(f"   scored {min(chunk_start + chunk_rows, len(positions)):,}/{len(positions):,}")
+    results = pd.concat(results, ignore_index=True) if results else pd.DataFrame(columns=RESULT_COLS)
+    score_seconds = time.perf_counter() - score_start
+
+    old = df.iloc[positions].reset_index(drop=True)
+    written = changed_results(old, results) if len(positions) else np.zeros(0, dtype=bool)
+    n_written = int(written.sum())
+
+    if not dry_run:
+        if n_written:
+            write_back(backend, csv_path, df, positions[written], results[written].reset_index(drop=True))
+        # Fingerprints are only recorded once the scores they stand for are stored
+        store.replace(keys, fingerprints, version)
+
+    seconds = time.perf_counter() - start
+    report = {
+        "started_at": started_at,
+        "source": source,
+        "model_version": version,
+        "rows": len(df),
+        "skipped": len(df) - len(positions),
+        "rescored": len(positions),
+        "written": n_written,
+        "seconds": round(seconds, 3),
+    }
+    run = dict(report)
+    report["score_seconds"] = round(score_seconds, 3)
+    if not dry_run:
+        store.log_run(**run)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=["csv", "sqlite"], default=STORAGE_BACKEND,
+                        help="patient store to rescore (default: STORAGE_BACKEND)")
+    parser.add_argument("--csv", default=CSV_FILE, help="patient CSV (also the import source for SQLite)")
+    parser.add_argument("--model", default=MODEL_PATH, help="model file to score with")
+    parser.add_argument("--state", default=RESCORE_STATE, help="fingerprint state database")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS, help="rows scored per model call")
+    parser.add_argument("--no-explain", action="store_true",
+                        help="keep the stored TOP_3_FEATURES instead of recomputing them with SHAP")
+    parser.add_argument("--full", action="store_true", help="rescore every row regardless of fingerprints")
+    parser.add_argument("--dry-run", action="store_true", help="score and report, but write nothing")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.model):
+        print(f"❌ Model not found: {args.model}")
+        sys.exit(1)
+
+    report = rescore(args.backend, args.csv, args.model, args.state, args.chunk_rows,
+                     explain=not args.no_explain, full=args.full, dry_run=args.dry_run)
+    rate = report["rows"] / report["seconds"] if report["seconds"] else 0
+    rescore_rate = report["rescored"] / report["score_seconds"] if report["score_seconds"] else 0
+    print(f"\n{'🔎 Dry run' if args.dry_run else '✅ Rescoring finished'} in {report['seconds']:.1f}s")
+    print(f"   rows:     {report['rows']:,} ({rate:,.0f} rows/s)")
+    print(f"   skipped:  {report['skipped']:,} (features and model unchanged)")
+    print(f"   rescored: {report['rescored']:,} ({rescore_rate:,.0f} rows/s scoring)")
+    print(f"   {'would write:' if args.dry_run else 'written: '} {report['written']:,} (results that changed)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Model Backends
+Regressor factories for the risk models: random forest (default) or histogram gradient boosting
+"""
+
+import os
+
+DEFAULT_BACKEND = "random_forest"
+MODEL_BACKEND = os.getenv("MODEL_BACKEND", DEFAULT_BACKEND)
+
+# Pipeline step name of the regressor per backend; "rf" is what existing artifacts use
+STEP_NAMES = {
+    "random_forest": "rf",
+    "hist_gradient_boosting": "hgb",
+}
+BACKENDS = list(STEP_NAMES)
+
+# Boosting stops once 10 rounds bring no improvement on a 10% validation split
+HGB_PARAMS = {
+    "max_iter": 300,
+    "learning_rate": 0.1,
+    "max_leaf_nodes": 31,
+    "min_samples_leaf": 20,
+    "early_stopping": True,
+    "validation_fraction": 0.1,
+    "n_iter_no_change": 10,
+}
+
+_ESTIMATOR_BACKENDS = {
+    "RandomForestRegressor": "random_forest",
+    "HistGradientBoostingRegressor": "hist_gradient_boosting",
+}
+
+
+def make_regressor(backend: str = None, random_state: int = 42, n_jobs: int = None,
+                   rf_params: dict = None, hgb_params: dict = None):
+    """Unfitted regressor for a backend
+
+    rf_params configure the random forest; hgb_params override HGB_PARAMS. sklearn is
+    imported here rather than at module level so that loading a model in the web app does
+    not pay for it.
+    """
+    backend = backend or MODEL_BACKEND
+    if backend == "random_forest":
+        from sklearn.ensemble import RandomForestRegressor
+        return RandomForestRegressor(random_state=random_state, n_jobs=n_jobs, **(rf_params or {}))
+    if backend == "hist_gradient_boosting":
+        # Threads come from OpenMP, not n_jobs
+        from sklearn.ensemble import HistGradientBoostingRegressor
+        return HistGradientBoostingRegressor(random_state=random_state, **{**HGB_PARAMS, **(hgb_params or {})})
+    raise ValueError(f"Unknown model backend {backend!r}; choose from {', '.join(BACKENDS)}")
+
+
+def final_estimator(model):
+    """The regressor at the end of a Pipeline (or the model itself)"""
+    return model.steps[-1][1] if hasattr(model, "steps") else model
+
+
+def backend_of(model) -> str:
+    """Backend name of a fitted pipeline/regressor, e.g. for artifacts saved before backends were recorded"""
+    name = type(final_estimator(model)).__name__
+    return _ESTIMATOR_BACKENDS.get(name, name)
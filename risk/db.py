@@ -1,12 +1,50 @@
+import os
+import time
 import pandas as pd
-from sqlalchemy import create_engine, text
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import sessionmaker
-from risk.logger import logger
-DATABASE_URL = "sqlite:///risk_data.db"
+from risk.logger import hot, logger
+from risk.search import fts_match_query
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///risk_data.db")
+
+# Table the web app serves patients from when STORAGE_BACKEND=sqlite
+PATIENT_TABLE = os.getenv("PATIENT_TABLE", "beneficiary")
+
+# Columns returned to the dashboard by /api/data
+PATIENT_LIST_COLUMNS = [
+    "DESYNPUF_ID", "AGE", "GENDER", "TOTAL_CLAIMS_COST", "RISK_30D", "RISK_60D",
+    "RISK_90D", "RISK_LABEL", "TOP_3_FEATURES", "AI_RECOMMENDATIONS", "EMAIL", "INDEX_DATE"
+]
+
+# One row per patient table: a counter bumped in the same transaction as every write,
+# so all workers agree on which version of the data a response was built from
+DATASET_VERSION_TABLE = "dataset_version"
+
+_engine = None
+
+
+def _configure_sqlite(dbapi_conn, connection_record):
+    """WAL lets several web workers read while one of them writes"""
+    cursor = dbapi_conn.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.close()
 
 
 def get_engine():
-    return create_engine(DATABASE_URL)
+    global _engine
+    if _engine is None:
+        _engine = create_engine(DATABASE_URL)
+        if _engine.dialect.name == "sqlite":
+            event.listen(_engine, "connect", _configure_sqlite)
+    return _engine
+
+def dispose_engine():
+    """Drop pooled connections inherited from a parent process; call in each worker after fork"""
+    if _engine is not None:
+        _engine.dispose(close=False)
 
 def load_data_from_db(table_name: str) -> pd.DataFrame:
     logger.info(f"Loading data from {table_name}")
@@ -86,41 +124,39 @@ def update_predictions_in_db(df: pd.DataFrame, table_name: str):
                     "pid": row["DESYNPUF_ID"]
                 }
             )
+        bump_dataset_version(conn, table_name)
     logger.success("Predictions updated successfully in DB")
 
 def update_predictions_in_db_bulk(df: pd.DataFrame, table_name: str):
-    """Bulk update predictions in the database"""
+    """Bulk update predictions in the database: one executemany in one transaction"""
     logger.info(f"Bulk updating predictions for {len(df)} records in {table_name}")
     engine = get_engine()
     
     # Ensure prediction columns exist
     ensure_prediction_columns(table_name)
     
+    params = [
+        {"r30": int(r30), "r60": int(r60), "r90": int(r90), "rlabel": str(label),
+         "features": None if pd.isna(features) else str(features), "pid": pid}
+        for pid, r30, r60, r90, label, features in zip(
+            df["DESYNPUF_ID"], df["RISK_30D"], df["RISK_60D"], df["RISK_90D"],
+            df["RISK_LABEL"], df["TOP_3_FEATURES"])
+    ]
     with engine.begin() as conn:
-        for _, row in df.iterrows():
-            try:
-                conn.execute(
-                    text(f"""
-                        UPDATE {table_name}
-                        SET RISK_30D = :r30,
-                            RISK_60D = :r60,
-                            RISK_90D = :r90,
-                            RISK_LABEL = :rlabel,
-                            TOP_3_FEATURES = :features
-                        WHERE DESYNPUF_ID = :pid
-                    """),
-                    {
-                        "r30": int(row["RISK_30D"]),
-                        "r60": int(row["RISK_60D"]),
-                        "r90": int(row["RISK_90D"]),
-                        "rlabel": row["RISK_LABEL"],
-                        "features": row["TOP_3_FEATURES"],
-                        "pid": row["DESYNPUF_ID"]
-                    }
-                )
-            except Exception as e:
-                logger.warning(f"Failed to update row {row['DESYNPUF_ID']}: {e}")
-                continue
+        if params:
+            conn.execute(
+                text(f"""
+                    UPDATE {table_name}
+                    SET RISK_30D = :r30,
+                        RISK_60D = :r60,
+                        RISK_90D = :r90,
+                        RISK_LABEL = :rlabel,
+                        TOP_3_FEATURES = :features
+                    WHERE DESYNPUF_ID = :pid
+                """),
+                params
+            )
+        bump_dataset_version(conn, table_name)
     
     logger.success(f"Bulk update completed for {len(df)} records")
 
@@ -132,6 +168,8 @@ def create_table_from_csv(csv_path: str, table_name: str):
     try:
         df = pd.read_csv(csv_path)
         df.to_sql(table_name, engine, if_exists='replace', index=False)
+        with engine.begin() as conn:
+            bump_dataset_version(conn, table_name)
         logger.success(f"Table {table_name} created with {len(df)} rows")
         return True
     except Exception as e:
@@ -185,3 +223,207 @@ def get_patient_by_id(patient_id):
     except Exception as e:
         logger.error(f"Error getting patient {patient_id}: {e}")
         return None
+
+def ensure_patient_indexes(table_name: str = PATIENT_TABLE):
+    """Create the indexes used by the dashboard filters and risk ordering"""
+    statements = [
+        f"CREATE INDEX IF NOT EXISTS ix_{table_name}_risk_30d ON {table_name} (RISK_30D DESC)",
+        f"CREATE INDEX IF NOT EXISTS ix_{table_name}_label_risk_30d ON {table_name} (RISK_LABEL, RISK_30D DESC)",
+        f"CREATE INDEX IF NOT EXISTS ix_{table_name}_gender_age ON {table_name} (GENDER, AGE)",
+        f"CREATE INDEX IF NOT EXISTS ix_{table_name}_age ON {table_name} (AGE)",
+        f"CREATE INDEX IF NOT EXISTS ix_{table_name}_patient_id ON {table_name} (DESYNPUF_ID)",
+    ]
+    engine = get_engine()
+    with engine.begin() as conn:
+        for statement in statements:
+            conn.execute(text(statement))
+    logger.info(f"Indexes ensured on {table_name}")
+
+def init_patient_store(csv_path: str, table_name: str = PATIENT_TABLE):
+    """Create the patient table from CSV on first use and make sure it is indexed"""
+    engine = get_engine()
+    if not inspect(engine).has_table(table_name):
+        logger.info(f"Table {table_name} not found, importing {csv_path}")
+        if not create_table_from_csv(csv_path, table_name):
+            raise RuntimeError(f"Could not create {table_name} from {csv_path}")
+    ensure_prediction_columns(table_name)
+    ensure_patient_indexes(table_name)
+    ensure_search_index(table_name)
+    if get_dataset_version(table_name)[0] == 0:
+        # Tables created before versioning start at version 1 from now
+        with engine.begin() as conn:
+            bump_dataset_version(conn, table_name)
+
+def ensure_search_index(table_name: str = PATIENT_TABLE):
+    """Create the FTS5 index over ID, top features and recommendations, kept in sync by triggers"""
+    fts = f"{table_name}_fts"
+    cols = "DESYNPUF_ID, TOP_3_FEATURES, AI_RECOMMENDATIONS"
+    new_cols = "new.DESYNPUF_ID, new.TOP_3_FEATURES, new.AI_RECOMMENDATIONS"
+    old_cols = "old.DESYNPUF_ID, old.TOP_3_FEATURES, old.AI_RECOMMENDATIONS"
+    engine = get_engine()
+    created = not inspect(engine).has_table(fts)
+
+    with engine.begin() as conn:
+        conn.execute(text(f"""
+            CREATE VIRTUAL TABLE IF NOT EXISTS {fts}
+            USING fts5({cols}, content='{table_name}', content_rowid='rowid')
+        """))
+        conn.execute(text(f"""
+            CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table_name} BEGIN
+                INSERT INTO {fts}(rowid, {cols}) VALUES (new.rowid, {new_cols});
+            END
+        """))
+        conn.execute(text(f"""
+            CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table_name} BEGIN
+                INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.rowid, {old_cols});
+            END
+        """))
+        conn.execute(text(f"""
+            CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {cols} ON {table_name} BEGIN
+                INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.rowid, {old_cols});
+                INSERT INTO {fts}(rowid, {cols}) VALUES (new.rowid, {new_cols});
+            END
+        """))
+        if created:
+            conn.execute(text(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"))
+            logger.info(f"Built search index {fts}")
+
+def rebuild_search_index(table_name: str = PATIENT_TABLE):
+    """Re-populate the FTS5 index, e.g. after the patient table was replaced"""
+    fts = f"{table_name}_fts"
+    with get_engine().begin() as conn:
+        conn.execute(text(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"))
+    logger.info(f"Rebuilt search index {fts}")
+
+def get_table_columns(table_name: str = PATIENT_TABLE):
+    """Return the column names of a table"""
+    return [col["name"] for col in inspect(get_engine()).get_columns(table_name)]
+
+def query_patients(risk_label=None, gender=None, min_age=None, max_age=None,
+                   search=None, limit=100, table_name: str = PATIENT_TABLE) -> pd.DataFrame:
+    """Filter, order and limit patients inside SQLite instead of in pandas"""
+    clauses = []
+    params = {"limit": int(limit)}
+
+    if risk_label is not None:
+        clauses.append("RISK_LABEL = :risk_label")
+        params["risk_label"] = risk_label
+    if gender is not None:
+        clauses.append("GENDER = :gender")
+        params["gender"] = int(gender)
+    if min_age is not None:
+        clauses.append("AGE >= :min_age")
+        params["min_age"] = min_age
+    if max_age is not None:
+        clauses.append("AGE <= :max_age")
+        params["max_age"] = max_age
+    match = fts_match_query(search) if search else None
+    if match:
+        clauses.append(f"rowid IN (SELECT rowid FROM {table_name}_fts WHERE {table_name}_fts MATCH :search)")
+        params["search"] = match
+
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    query = text(f"""
+        SELECT {', '.join(PATIENT_LIST_COLUMNS)}
+        FROM {table_name}
+        {where}
+        ORDER BY RISK_30D DESC
+        LIMIT :limit
+    """)
+    with get_engine().connect() as conn:
+        return pd.read_sql(query, conn, params=params)
+
+def summarize_patients(table_name: str = PATIENT_TABLE) -> dict:
+    """Population totals, average risks and label counts computed with SQL aggregates"""
+    with get_engine().connect() as conn:
+        totals = conn.execute(text(f"""
+            SELECT COUNT(*), AVG(RISK_30D), AVG(RISK_60D), AVG(RISK_90D)
+            FROM {table_name}
+        """)).fetchone()
+        label_rows = conn.execute(text(f"""
+            SELECT RISK_LABEL, COUNT(*)
+            FROM {table_name}
+            GROUP BY RISK_LABEL
+        """)).fetchall()
+
+    return {
+        "total_patients": int(totals[0]),
+        "avg_risk_30d": float(totals[1]) if totals[1] is not None else 0,
+        "avg_risk_60d": float(totals[2]) if totals[2] is not None else 0,
+        "avg_risk_90d": float(totals[3]) if totals[3] is not None else 0,
+        "label_counts": {label: int(count) for label, count in label_rows},
+    }
+
+def query_patients_by_label(labels, table_name: str = PATIENT_TABLE) -> pd.DataFrame:
+    """All patients whose RISK_LABEL is one of `labels` (uses the label index)"""
+    params = {f"l{i}": label for i, label in enumerate(labels)}
+    placeholders = ", ".join(f":{key}" for key in params)
+    query = text(f"""
+        SELECT {', '.join(PATIENT_LIST_COLUMNS)}
+        FROM {table_name}
+        WHERE RISK_LABEL IN ({placeholders})
+    """)
+    with get_engine().connect() as conn:
+        return pd.read_sql(query, conn, params=params)
+
+def get_patient_record(patient_id, table_name: str = PATIENT_TABLE):
+    """One patient's report columns as a dict, or None"""
+    query = text(f"""
+        SELECT {', '.join(PATIENT_LIST_COLUMNS)}
+        FROM {table_name}
+        WHERE DESYNPUF_ID = :patient_id
+    """)
+    with get_engine().connect() as conn:
+        row = conn.execute(query, {"patient_id": patient_id}).mappings().fetchone()
+    return dict(row) if row else None
+
+def count_patients(table_name: str = PATIENT_TABLE) -> int:
+    """Number of rows in the patient table"""
+    with get_engine().connect() as conn:
+        return int(conn.execute(text(f"SELECT COUNT(*) FROM {table_name}")).scalar())
+
+def insert_patient(record: dict, table_name: str = PATIENT_TABLE):
+    """Insert one scored patient, keeping only the columns the table knows about"""
+    columns = [col for col in get_table_columns(table_name) if col in record]
+    dropped = set(record) - set(columns)
+    if dropped:
+        logger.debug(f"Ignoring fields not present in {table_name}: {sorted(dropped)}")
+
+    params = {}
+    for i, col in enumerate(columns):
+        value = record[col]
+        params[f"p{i}"] = value.item() if hasattr(value, "item") else value
+
+    placeholders = ", ".join(f":p{i}" for i in range(len(columns)))
+    query = text(f"INSERT INTO {table_name} ({', '.join(columns)}) VALUES ({placeholders})")
+    with get_engine().begin() as conn:
+        conn.execute(query, params)
+        bump_dataset_version(conn, table_name)
+    hot("patient_insert", "Inserted patient", patient_id=record.get('DESYNPUF_ID'), table=table_name)
+
+def bump_dataset_version(conn, table_name: str = PATIENT_TABLE):
+    """Increment a table's version; call inside the transaction that changed its rows"""
+    conn.execute(text(f"""
+        CREATE TABLE IF NOT EXISTS {DATASET_VERSION_TABLE} (
+            table_name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL,
+            updated_at REAL NOT NULL
+        )
+    """))
+    conn.execute(text(f"""
+        INSERT INTO {DATASET_VERSION_TABLE} (table_name, version, updated_at)
+        VALUES (:table_name, 1, :now)
+        ON CONFLICT (table_name) DO UPDATE SET version = version + 1, updated_at = :now
+    """), {"table_name": table_name, "now": time.time()})
+
+def get_dataset_version(table_name: str = PATIENT_TABLE):
+    """(version, updated_at unix time) of a table, (0, None) before its first write"""
+    try:
+        with get_engine().connect() as conn:
+            row = conn.execute(text(f"""
+                SELECT version, updated_at FROM {DATASET_VERSION_TABLE} WHERE table_name = :table_name
+            """), {"table_name": table_name}).fetchone()
+    except OperationalError:
+        # Version table not created yet
+        return 0, None
+    return (int(row[0]), float(row[1])) if row else (0, None)
@@ -5,10 +5,15 @@ Handles sending AI recommendations to high-risk patients
 """
 
 import os
+import smtplib
+import threading
+import time
 from datetime import datetime
 from flask import current_app
 from flask_mail import Mail, Message
-from risk.logger import logger
+from risk.logger import hot, logger
+from risk.metrics import metrics, span
+from risk.smtp_pool import RateLimiter
 
 # Initialize Flask-Mail
 mail = Mail()
@@ -33,13 +38,14 @@ def init_email_service(app):
         
     except ImportError:
         # Fallback to environment variables if config file not found
-        app.config['MAIL_SERVER'] = os.getenv('MAIL_SERVER', 'smtp.gmail.com')
-        app.config['MAIL_PORT'] = int(os.getenv('MAIL_PORT', 587))
-        app.config['MAIL_USE_TLS'] = os.getenv('MAIL_USE_TLS', 'True').lower() == 'true'
+        # (MAIL_* first, then the EMAIL_* settings app.py uses)
+        app.config['MAIL_SERVER'] = os.getenv('MAIL_SERVER', os.getenv('EMAIL_HOST', 'smtp.gmail.com'))
+        app.config['MAIL_PORT'] = int(os.getenv('MAIL_PORT', os.getenv('EMAIL_PORT', 587)))
+        app.config['MAIL_USE_TLS'] = os.getenv('MAIL_USE_TLS', os.getenv('EMAIL_USE_TLS', 'True')).lower() == 'true'
         app.config['MAIL_USE_SSL'] = os.getenv('MAIL_USE_SSL', 'False').lower() == 'true'
-        app.config['MAIL_USERNAME'] = os.getenv('MAIL_USERNAME', 'your-email@gmail.com')
-        app.config['MAIL_PASSWORD'] = os.getenv('MAIL_PASSWORD', 'your-app-password')
-        app.config['MAIL_DEFAULT_SENDER'] = os.getenv('MAIL_DEFAULT_SENDER', 'your-email@gmail.com')
+        app.config['MAIL_USERNAME'] = os.getenv('MAIL_USERNAME', os.getenv('EMAIL_HOST_USER', 'your-email@gmail.com'))
+        app.config['MAIL_PASSWORD'] = os.getenv('MAIL_PASSWORD', os.getenv('EMAIL_HOST_PASSWORD', 'your-app-password'))
+        app.config['MAIL_DEFAULT_SENDER'] = os.getenv('MAIL_DEFAULT_SENDER', app.config['MAIL_USERNAME'])
         
         mail.init_app(app)
         logger.warning("Email service initialized with default settings. Please configure email_config.py")
@@ -49,22 +55,13 @@ def is_high_risk(risk_label):
     high_risk_labels = ['Very High Risk', 'High Risk']
     return risk_label in high_risk_labels
 
-def send_recommendations_email(patient_data, recommendations, pdf_attachment=None):
-    """Send AI recommendations email to patient with optional PDF attachment"""
-    try:
-        if not patient_data.get('EMAIL'):
-            logger.warning(f"No email address for patient {patient_data.get('DESYNPUF_ID')}")
-            return False
-            
-        if not is_high_risk(patient_data.get('RISK_LABEL', '')):
-            logger.info(f"Patient {patient_data.get('DESYNPUF_ID')} is not high risk, skipping email")
-            return False
-        
-        # Create email message
-        subject = f"Your Health Risk Assessment Report - Patient ID: {patient_data.get('DESYNPUF_ID')}"
-        
-        # Format email body
-        body = f"""
+def build_recommendations_message(patient_data, recommendations, pdf_attachment=None):
+    """Build the recommendations email for one patient"""
+    # Create email message
+    subject = f"Your Health Risk Assessment Report - Patient ID: {patient_data.get('DESYNPUF_ID')}"
+    
+    # Format email body
+    body = f"""
 Dear Patient,
 
 We are sending you your personalized Health Risk Assessment Report based on your recent medical evaluation.
@@ -96,42 +93,120 @@ Your Healthcare Team
 ---
 This is an automated message. Please do not reply to this email.
 For medical emergencies, call 911 or your local emergency number.
-        """
-        
-        # Create message
-        msg = Message(
-            subject=subject,
-            recipients=[patient_data['EMAIL']],
-            body=body
+    """
+    
+    # Create message
+    msg = Message(
+        subject=subject,
+        recipients=[patient_data['EMAIL']],
+        body=body
+    )
+    
+    # Attach PDF if provided
+    if pdf_attachment:
+        msg.attach(
+            filename=f"patient_report_{patient_data.get('DESYNPUF_ID')}_{datetime.now().strftime('%Y%m%d')}.pdf",
+            content_type="application/pdf",
+            data=pdf_attachment
         )
+    
+    return msg
+
+def send_recommendations_email(patient_data, recommendations, pdf_attachment=None):
+    """Send AI recommendations email to patient with optional PDF attachment"""
+    try:
+        if not patient_data.get('EMAIL'):
+            logger.warning(f"No email address for patient {patient_data.get('DESYNPUF_ID')}")
+            return False
+            
+        if not is_high_risk(patient_data.get('RISK_LABEL', '')):
+            hot("email_skipped", "Patient is not high risk, skipping email", patient_id=patient_data.get('DESYNPUF_ID'))
+            return False
         
-        # Attach PDF if provided
-        if pdf_attachment:
-            msg.attach(
-                filename=f"patient_report_{patient_data.get('DESYNPUF_ID')}_{datetime.now().strftime('%Y%m%d')}.pdf",
-                content_type="application/pdf",
-                data=pdf_attachment
-            )
-        
+        msg = build_recommendations_message(patient_data, recommendations, pdf_attachment)
         mail.send(msg)
-        logger.info(f"Recommendations email with PDF sent to {patient_data['EMAIL']} for patient {patient_data.get('DESYNPUF_ID')}")
+        hot("email_sent", "Recommendations email with PDF sent", to=patient_data['EMAIL'],
+            patient_id=patient_data.get('DESYNPUF_ID'))
         return True
         
     except Exception as e:
         logger.error(f"Error sending email to {patient_data.get('EMAIL', 'unknown')}: {e}")
         return False
 
-def send_bulk_recommendations_emails(patients_data):
-    """Send recommendations emails to multiple high-risk patients"""
-    success_count = 0
-    total_high_risk = 0
-    
-    for patient_data in patients_data:
-        if is_high_risk(patient_data.get('RISK_LABEL', '')):
-            total_high_risk += 1
-            if patient_data.get('EMAIL') and patient_data.get('AI_RECOMMENDATIONS'):
-                if send_recommendations_email(patient_data, patient_data['AI_RECOMMENDATIONS']):
-                    success_count += 1
-    
-    logger.info(f"Bulk email sending completed: {success_count}/{total_high_risk} high-risk patients")
-    return success_count, total_high_risk
+def _send_batch(app, patients, limiter, stats, lock):
+    """Send one worker's share of a bulk run over a single authenticated connection"""
+    def record_failure(patient_data, error):
+        metrics.inc("risk_email_failures_total", kind="bulk")
+        with lock:
+            stats['failed'].append({'patient_id': patient_data.get('DESYNPUF_ID'), 'error': str(error)})
+
+    with app.app_context():
+        next_index = 0
+        while next_index < len(patients):
+            try:
+                with mail.connect() as conn:
+                    while next_index < len(patients):
+                        patient_data = patients[next_index]
+                        limiter.acquire()
+                        try:
+                            message = build_recommendations_message(patient_data, patient_data['AI_RECOMMENDATIONS'])
+                            with span("smtp_send"):
+                                conn.send(message)
+                            with lock:
+                                stats['sent'] += 1
+                        except (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused,
+                                smtplib.SMTPDataError) as e:
+                            # Message-level rejection: the session is still usable
+                            record_failure(patient_data, e)
+                        next_index += 1
+            except Exception as e:
+                # Connection-level failure: count the current message as failed and reconnect for the rest
+                if next_index < len(patients):
+                    record_failure(patients[next_index], e)
+                    next_index += 1
+                logger.warning(f"SMTP session dropped during bulk send, reconnecting: {e}")
+
+def send_bulk_recommendations_emails(patients_data, workers=None, rate_limit=None):
+    """Send recommendations emails to multiple high-risk patients
+
+    Recipients are split across `workers` threads that each keep one authenticated SMTP
+    connection open for their whole share. `rate_limit` caps messages per second across
+    all workers (provider limit). Returns counts, throughput and per-patient failures.
+    """
+    workers = workers or int(os.getenv('BULK_EMAIL_WORKERS', 4))
+    if rate_limit is None and os.getenv('BULK_EMAIL_RATE_LIMIT'):
+        rate_limit = float(os.getenv('BULK_EMAIL_RATE_LIMIT'))
+
+    high_risk = [p for p in patients_data if is_high_risk(p.get('RISK_LABEL', ''))]
+    targets = [p for p in high_risk if p.get('EMAIL') and p.get('AI_RECOMMENDATIONS')]
+
+    stats = {'sent': 0, 'failed': []}
+    lock = threading.Lock()
+    limiter = RateLimiter(rate_limit)
+    app = current_app._get_current_object()
+
+    start = time.perf_counter()
+    shares = [targets[i::workers] for i in range(workers)]
+    threads = [
+        threading.Thread(target=_send_batch, args=(app, share, limiter, stats, lock), name=f"bulk-email-{i}")
+        for i, share in enumerate(shares) if share
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    report = {
+        'total_high_risk': len(high_risk),
+        'attempted': len(targets),
+        'sent': stats['sent'],
+        'failed': len(stats['failed']),
+        'skipped_no_email': len(high_risk) - len(targets),
+        'elapsed_seconds': round(elapsed, 3),
+        'emails_per_second': round(stats['sent'] / elapsed, 2) if elapsed > 0 else 0.0,
+        'failures': stats['failed'],
+    }
+    logger.info(f"Bulk email sending completed: {report['sent']}/{report['total_high_risk']} high-risk patients, "
+                f"{report['failed']} failed, {report['emails_per_second']}/s over {len(threads)} connections")
+    return report
@@ -46,16 +46,42 @@ def evaluate_30d_scores(y_true_scores, y_pred_scores):
 """
 
 
-from sklearn.metrics import confusion_matrix, classification_report
-from risk.model import assign_label
+import numpy as np
+import pandas as pd
+from risk.labels import RISK_LABELS, label_codes
+
+def confusion_matrix(y_true, y_pred) -> np.ndarray:
+    """Label confusion matrix for two arrays of risk scores (rows: true, columns: predicted)
+
+    Counted with one bincount over the paired band codes; pairs with a missing score are skipped.
+    """
+    true_codes, pred_codes = label_codes(y_true), label_codes(y_pred)
+    keep = (true_codes >= 0) & (pred_codes >= 0)
+    n = len(RISK_LABELS)
+    pairs = true_codes * n + pred_codes  # at most 24, still fits the int8 codes
+    if not keep.all():
+        pairs = pairs[keep]
+    return np.bincount(pairs, minlength=n * n).reshape(n, n)
+
+def classification_summary(cm: np.ndarray) -> pd.DataFrame:
+    """Per-label precision, recall, F1 and support from a confusion matrix"""
+    hits = np.diag(cm).astype(float)
+    support = cm.sum(axis=1)
+    predicted = cm.sum(axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        precision = np.where(predicted > 0, hits / predicted, 0.0)
+        recall = np.where(support > 0, hits / support, 0.0)
+        f1 = np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), 0.0)
+    return pd.DataFrame({"precision": precision, "recall": recall, "f1-score": f1, "support": support},
+                        index=RISK_LABELS)
 
 def evaluate_risk(y_true, y_pred):
-    y_true_labels = y_true.apply(assign_label)
-    y_pred_labels = y_pred.apply(assign_label)
+    cm = confusion_matrix(y_true, y_pred)
+    summary = classification_summary(cm)
+    accuracy = np.trace(cm) / max(cm.sum(), 1)
 
-    labels = ["Very Low Risk", "Low Risk", "Moderate Risk", "High Risk", "Very High Risk"]
-    cm = confusion_matrix(y_true_labels, y_pred_labels, labels=labels)
     print("Confusion Matrix:\n", cm)
     print("\nClassification Report:\n")
-    print(classification_report(y_true_labels, y_pred_labels, target_names=labels))
-
+    print(summary.round(2).to_string())
+    print(f"\naccuracy: {accuracy:.2f} ({cm.sum()} scores)")
+    return cm, summary
@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+"""
+Bounded Executor for Async Views
+Runs blocking work (model scoring, storage, SMTP) in a thread pool without unbounded queueing
+"""
+
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+
+class BoundedExecutor:
+    """Thread pool whose callers wait for a slot instead of piling tasks onto its queue
+
+    At most `workers` calls run at once and at most `max_pending` are admitted in total,
+    so a burst of thousands of connections holds cheap coroutines on the event loop
+    rather than thousands of queued closures and their request payloads.
+    """
+
+    def __init__(self, workers: int, max_pending: int = None, name: str = "worker"):
+        self.workers = workers
+        self.max_pending = max_pending or workers * 4
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=name)
+        self._slots = asyncio.Semaphore(self.max_pending)
+
+    async def run(self, fn, *args, **kwargs):
+        """Await fn(*args, **kwargs) on a pool thread, in the caller's context (request ID, stage timings)"""
+        async with self._slots:
+            loop = asyncio.get_running_loop()
+            context = contextvars.copy_context()
+            return await loop.run_in_executor(self._executor, functools.partial(context.run, fn, *args, **kwargs))
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
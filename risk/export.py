@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Bulk Patient PDF Export
+Renders per-patient reports in a process pool and streams them as a ZIP or one merged PDF
+"""
+
+import io
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from risk.logger import logger
+
+EXPORT_WORKERS = int(os.getenv("EXPORT_WORKERS", os.cpu_count() or 1))
+EXPORT_MAX_PATIENTS = int(os.getenv("EXPORT_MAX_PATIENTS", 10000))
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", 16))
+
+# Finished exports kept for /api/export-progress
+_MAX_TRACKED_EXPORTS = 50
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    """Shared worker pool, started on first export
+
+    Workers are spawned rather than forked so they never inherit the web server's
+    threads (delivery workers, SMTP sessions) or open database handles.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=EXPORT_WORKERS,
+                                        mp_context=multiprocessing.get_context("spawn"))
+            logger.info(f"Started PDF export pool with {EXPORT_WORKERS} workers")
+        return _pool
+
+
+def _reset_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def _render_chunk(patients: List[Dict]) -> List[bytes]:
+    """Worker side: render a chunk of reports (one IPC round trip per chunk, not per report)"""
+    # Imported here so the web process never loads reportlab for bulk exports
+    from risk.report import create_patient_pdf_bytes
+    return [create_patient_pdf_bytes(patient) for patient in patients]
+
+
+# ---------------------------
+# Progress tracking
+# ---------------------------
+class ExportProgress:
+    """Counters for one running or finished export"""
+
+    def __init__(self, total: int, fmt: str, export_id: Optional[str] = None):
+        self.id = export_id or uuid.uuid4().hex
+        self.total = total
+        self.format = fmt
+        self.done = 0
+        self.status = "running"
+        self.error = None
+        self.started_at = time.time()
+        self.finished_at = None
+
+    def finish(self, error: Optional[str] = None):
+        self.status = "failed" if error else "done"
+        self.error = error
+        self.finished_at = time.time()
+
+    def to_dict(self) -> Dict:
+        elapsed = (self.finished_at or time.time()) - self.started_at
+        return {
+            "id": self.id,
+            "format": self.format,
+            "status": self.status,
+            "total": self.total,
+            "done": self.done,
+            "percent": round(100 * self.done / self.total, 1) if self.total else 100.0,
+            "elapsed_seconds": round(elapsed, 2),
+            "reports_per_second": round(self.done / elapsed, 1) if elapsed > 0 else 0,
+            "error": self.error,
+        }
+
+
+_exports: Dict[str, ExportProgress] = {}
+_exports_lock = threading.Lock()
+
+
+def start_export(total: int, fmt: str, export_id: Optional[str] = None) -> ExportProgress:
+    """Register a new export so its progress can be polled
+
+    Clients that wait for a merged PDF pass their own export_id so they can poll
+    before the response headers arrive.
+    """
+    progress = ExportProgress(total, fmt, export_id)
+    with _exports_lock:
+        _exports[progress.id] = progress
+        finished = sorted((p for p in _exports.values() if p.status != "running"), key=lambda p: p.started_at)
+        while len(_exports) > _MAX_TRACKED_EXPORTS and finished:
+            del _exports[finished.pop(0).id]
+    return progress
+
+
+def get_export_progress(export_id: str) -> Optional[Dict]:
+    """Progress of one export, or None if unknown"""
+    with _exports_lock:
+        progress = _exports.get(export_id)
+    return progress.to_dict() if progress else None
+
+
+# ---------------------------
+# Rendering
+# ---------------------------
+def render_reports(patients: List[Dict], progress: Optional[ExportProgress] = None,
+                   chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[Tuple[Dict, bytes]]:
+    """Yield (patient, pdf_bytes) in input order, rendered in the process pool
+
+    At most two chunks per worker are in flight, so memory holds a bounded window of
+    reports no matter how many patients are exported.
+    """
+    pool = _get_pool()
+    chunks = (patients[i:i + chunk_size] for i in range(0, len(patients), chunk_size))
+    max_in_flight = 2 * EXPORT_WORKERS
+    in_flight = deque()
+
+    try:
+        for chunk in chunks:
+            in_flight.append((chunk, pool.submit(_render_chunk, chunk)))
+            if len(in_flight) < max_in_flight:
+                continue
+            yield from _drain_one(in_flight, progress)
+        while in_flight:
+            yield from _drain_one(in_flight, progress)
+    except BrokenProcessPool:
+        # A worker died (e.g. killed by the OOM killer); start a fresh pool next time
+        _reset_pool()
+        raise
+    finally:
+        for _, future in in_flight:
+            future.cancel()
+
+
+def _drain_one(in_flight, progress):
+    chunk, future = in_flight.popleft()
+    for patient, pdf in zip(chunk, future.result()):
+        yield patient, pdf
+    if progress is not None:
+        progress.done += len(chunk)
+        if progress.done % 1000 < len(chunk):
+            logger.info(f"Export {progress.id}: {progress.done}/{progress.total} reports")
+
+
+def report_filename(patient: Dict) -> str:
+    return f"patient_report_{patient.get('DESYNPUF_ID', 'unknown')}.pdf"
+
+
+class _StreamBuffer:
+    """Write-only file object that zipfile writes into and the response generator drains"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def stream_zip(patients: List[Dict], progress: Optional[ExportProgress] = None) -> Iterator[bytes]:
+    """ZIP archive of per-patient reports, yielded entry by entry as they are rendered"""
+    buffer = _StreamBuffer()
+    error = "export cancelled"
+    try:
+        # PDF streams are already compressed, so entries are stored as-is
+        with zipfile.ZipFile(buffer, mode="w", compression=zipfile.ZIP_STORED) as archive:
+            for patient, pdf in render_reports(patients, progress):
+                archive.writestr(report_filename(patient), pdf)
+                yield buffer.drain()
+        yield buffer.drain()
+        error = None
+    except Exception as e:
+        error = str(e)
+        raise
+    finally:
+        # Also runs when the client disconnects and the server closes the generator
+        if progress is not None:
+            progress.finish(error)
+
+
+def build_merged_pdf(patients: List[Dict], progress: Optional[ExportProgress] = None):
+    """Merge all reports into one PDF spooled to a temporary file; returns the open file
+
+    Each report is appended to the writer as soon as it arrives and then dropped, and
+    the output is spooled to disk past 16 MB.
+    """
+    from pypdf import PdfReader, PdfWriter
+
+    writer = PdfWriter()
+    output = tempfile.SpooledTemporaryFile(max_size=16 * 1024 * 1024)
+    try:
+        for _, pdf in render_reports(patients, progress):
+            writer.append(PdfReader(io.BytesIO(pdf)))
+        writer.write(output)
+    except Exception as e:
+        output.close()
+        if progress is not None:
+            progress.finish(str(e))
+        raise
+    if progress is not None:
+        progress.finish()
+    output.seek(0)
+    return output
+
+
+def iter_file(fileobj, block_size: int = 256 * 1024) -> Iterator[bytes]:
+    """Yield a file in blocks and close it afterwards"""
+    try:
+        while True:
+            block = fileobj.read(block_size)
+            if not block:
+                return
+            yield block
+    finally:
+        fileobj.close()
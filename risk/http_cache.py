@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+HTTP Caching for the Read Endpoints
+ETag / Last-Modified validators derived from the dataset version, 304 handling and
+response compression, shared by the Flask views and the async views
+"""
+
+import gzip
+import os
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Callable, Dict, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:  # optional: without it clients get gzip
+    brotli = None
+
+# Bodies smaller than this are sent uncompressed
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", 1024))
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", 6))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", 5))
+
+
+def _accepted_codings(accept_encoding: Optional[str]) -> Dict[str, float]:
+    codings = {}
+    for part in (accept_encoding or "").split(","):
+        name, _, params = part.strip().partition(";")
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        codings[name.strip().lower()] = q
+    return codings
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """'br', 'gzip' or None (identity) for an Accept-Encoding header"""
+    codings = _accepted_codings(accept_encoding)
+    if brotli is not None and codings.get("br", 0) > 0:
+        return "br"
+    if codings.get("gzip", codings.get("*", 0)) > 0:
+        return "gzip"
+    return None
+
+
+def make_etag(version: str, encoding: Optional[str] = None) -> str:
+    """Strong ETag for one dataset version, distinct per content coding"""
+    return f'"{version}-{encoding}"' if encoding else f'"{version}"'
+
+
+def http_date(timestamp: float) -> str:
+    return formatdate(timestamp, usegmt=True)
+
+
+def is_not_modified(headers, etag: str, last_modified: Optional[float]) -> bool:
+    """True when the client's copy matches: If-None-Match first, else If-Modified-Since"""
+    if_none_match = headers.get("If-None-Match")
+    if if_none_match is not None:
+        # Weak comparison, as RFC 9110 requires for If-None-Match
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+
+    if_modified_since = headers.get("If-Modified-Since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        # Last-Modified has whole-second resolution
+        return int(last_modified) <= since
+    return False
+
+
+def compress(body: bytes, encoding: Optional[str]) -> Tuple[bytes, Optional[str]]:
+    """(body, content coding actually applied)"""
+    if encoding is None or len(body) < COMPRESS_MIN_BYTES:
+        return body, None
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY), "br"
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0), "gzip"
+
+
+def conditional_json(headers, version: Optional[str], last_modified: Optional[float],
+                     produce: Callable, dumps: Callable,
+                     cache=None, cache_key=None) -> Tuple[int, Dict[str, str], bytes]:
+    """(status, headers, body) for a JSON read endpoint
+
+    produce() -> (body, status) only runs when the client has no current copy, so a
+    revalidation costs the version lookup and nothing else. Only 200s carry validators.
+    With a ResponseCache, encoded 200s are kept per (cache_key, content coding) for the
+    current version and served without calling produce() again.
+    """
+    encoding = negotiate_encoding(headers.get("Accept-Encoding"))
+    validators = {"Vary": "Accept-Encoding"}
+    if version is not None:
+        etag = make_etag(version, encoding)
+        # Browsers may keep the response but must revalidate before reusing it
+        validators.update({"ETag": etag, "Cache-Control": "no-cache"})
+        if last_modified is not None:
+            validators["Last-Modified"] = http_date(last_modified)
+        if is_not_modified(headers, etag, last_modified):
+            return 304, validators, b""
+
+    use_cache = cache is not None and version is not None
+    if use_cache:
+        cached = cache.get(version, (cache_key, encoding))
+        if cached is not None:
+            return 200, cached[0], cached[1]
+
+    body, status = produce()
+    payload, applied = compress(dumps(body), encoding)
+    response_headers = dict(validators) if status == 200 else {"Vary": "Accept-Encoding"}
+    response_headers["Content-Type"] = "application/json"
+    if applied:
+        response_headers["Content-Encoding"] = applied
+    if use_cache and status == 200:
+        cache.put(version, (cache_key, encoding), response_headers, payload)
+    return status, response_headers, payload
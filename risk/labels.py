@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+"""
+Risk Labels
+The one definition of the 30-day risk bands, with a vectorized labeler for arrays of scores
+and a scalar one for single patients
+"""
+
+from bisect import bisect_right
+
+import numpy as np
+import pandas as pd
+
+# A score belongs to the band whose lower edge it reaches: 20 is "Low Risk", 85 "Very High Risk"
+RISK_BINS = [20, 40, 60, 85]
+RISK_LABELS = ["Very Low Risk", "Low Risk", "Moderate Risk", "High Risk", "Very High Risk"]
+
+
+def label_codes(scores) -> np.ndarray:
+    """Band index (0 = Very Low Risk ... 4 = Very High Risk) per score; -1 for missing scores"""
+    scores = np.asarray(scores, dtype=np.float64)
+    # Same result as np.digitize(scores, RISK_BINS); with only four edges, one pass of
+    # comparisons per edge is several times faster than its binary search
+    codes = np.zeros(scores.shape, dtype=np.int8)
+    for edge in RISK_BINS:
+        codes += scores >= edge
+    codes[np.isnan(scores)] = -1
+    return codes
+
+
+def label_scores(scores) -> pd.Categorical:
+    """Risk labels for an array of scores, as a categorical ordered from lowest to highest risk"""
+    return pd.Categorical.from_codes(label_codes(scores), categories=RISK_LABELS, ordered=True)
+
+
+def assign_label(score) -> str:
+    """Risk label for one score"""
+    return RISK_LABELS[bisect_right(RISK_BINS, score)]
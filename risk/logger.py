@@ -1,9 +1,193 @@
-from loguru import logger
+#!/usr/bin/env python3
+"""
+Logging
+One loguru logger for app.py and the risk/ modules. Both sinks are enqueued: a log call formats
+its line and returns, and loguru's writer thread does the terminal and file I/O. The log file
+holds one JSON object per line, tagged with the ID of the request that wrote it, and every
+/api request ends with a summary line carrying its status, duration and stage timings.
+"""
+
+import json
+import os
+import re
 import sys
+import threading
+import time
+import traceback
+import uuid
+from contextvars import ContextVar
+
+from loguru import logger
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FILE = os.getenv("LOG_FILE", "logs/risk_model.log")
+LOG_FILE_LEVEL = os.getenv("LOG_FILE_LEVEL", "INFO")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")   # terminal output: "text" or "json"
+# Lines per second and key let through by hot(); 0 disables sampling
+LOG_SAMPLE_PER_SEC = float(os.getenv("LOG_SAMPLE_PER_SEC", 20))
+
+_REQUEST_ID = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+
+# ---------------------------
+# Request context
+# ---------------------------
+class RequestLog:
+    """ID and stage timings of the request being served"""
+    __slots__ = ("request_id", "start", "stages")
+
+    def __init__(self, request_id=None):
+        self.request_id = request_id if request_id and _REQUEST_ID.match(request_id) else uuid.uuid4().hex[:16]
+        self.start = time.perf_counter()
+        self.stages = {}
+
+
+_current_request: ContextVar = ContextVar("current_request", default=None)
+
+
+def start_request(request_id=None):
+    """Open a request context (reusing a well-formed client X-Request-ID); returns the reset token"""
+    return _current_request.set(RequestLog(request_id))
+
+
+def current_request():
+    return _current_request.get()
+
+
+def record_stage(stage: str, seconds: float):
+    """Add a stage's time to the current request, if there is one"""
+    request_log = _current_request.get()
+    if request_log is not None:
+        request_log.stages[stage] = request_log.stages.get(stage, 0.0) + seconds
+
+
+def end_request(token, method: str, path: str, status: int):
+    """Close the request context and write its summary line (sampled unless the request failed)"""
+    request_log = _current_request.get()
+    _current_request.reset(token)
+    if request_log is None or not path.startswith("/api/"):
+        return
+    fields = {
+        "request_id": request_log.request_id,
+        "method": method,
+        "path": path,
+        "status": status,
+        "duration_ms": round((time.perf_counter() - request_log.start) * 1000, 2),
+        "stages_ms": {stage: round(secs * 1000, 2) for stage, secs in request_log.stages.items()},
+    }
+    if status >= 500:
+        logger.bind(**fields).warning(f"{method} {path} -> {status}")
+    else:
+        hot("request", f"{method} {path} -> {status}", **fields)
+
+
+def install_flask_request_logging(app):
+    """Request IDs, stage timings and summary lines for a Flask app"""
+    from flask import g, request
+
+    @app.before_request
+    def _start_request_log():
+        g.request_log_token = start_request(request.headers.get("X-Request-ID"))
+
+    @app.after_request
+    def _end_request_log(response):
+        token = g.pop("request_log_token", None)
+        if token is not None and request.path.startswith("/api/"):
+            response.headers["X-Request-ID"] = current_request().request_id
+            end_request(token, request.method, request.path, response.status_code)
+        elif token is not None:
+            _current_request.reset(token)
+        return response
+
+
+# ---------------------------
+# Sampling
+# ---------------------------
+class _Sampler:
+    """Lets up to `per_sec` lines per key through each second and counts the rest"""
+
+    def __init__(self, per_sec: float):
+        self.per_sec = per_sec
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def allow(self, key: str):
+        """None to drop the line, else the number of lines dropped since the last one let through"""
+        if not self.per_sec:
+            return 0
+        second = int(time.monotonic())
+        with self._lock:
+            window, sent, dropped = self._windows.get(key, (second, 0, 0))
+            if window != second:
+                window, sent = second, 0
+            if sent >= self.per_sec:
+                self._windows[key] = (window, sent, dropped + 1)
+                return None
+            self._windows[key] = (window, sent + 1, 0)
+            return dropped
+
+
+_sampler = _Sampler(LOG_SAMPLE_PER_SEC)
+
+
+def hot(key: str, message: str, level: str = "INFO", **fields):
+    """Log a line written once per request or patient, sampled per key under load
+
+    Pass values as fields rather than formatting them into the message, so dropped lines
+    cost little. The next line let through reports how many were dropped.
+    """
+    dropped = _sampler.allow(key)
+    if dropped is None:
+        return
+    if dropped:
+        fields["dropped"] = dropped
+    logger.opt(depth=1).bind(**fields).log(level, message)
+
+
+# ---------------------------
+# Sinks
+# ---------------------------
+def _add_request_id(record):
+    request_log = _current_request.get()
+    if request_log is not None:
+        record["extra"].setdefault("request_id", request_log.request_id)
+
+
+_TEXT_FORMAT = ("<green>{time:YYYY-MM-DD HH:mm:ss.SSS}</green> | <level>{level: <8}</level> | "
+                "<cyan>{name}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> - <level>{message}</level>")
+
+
+def _text_format(record):
+    """loguru's default line, followed by the structured fields as key=value"""
+    fields = " ".join(f"{key}={value}" for key, value in record["extra"].items() if key not in ("json", "fields"))
+    if not fields:
+        return _TEXT_FORMAT + "\n{exception}"
+    record["extra"]["fields"] = fields
+    return _TEXT_FORMAT + " | {extra[fields]}\n{exception}"
+
+
+def _json_format(record):
+    line = {
+        "ts": record["time"].isoformat(timespec="milliseconds"),
+        "level": record["level"].name,
+        "module": record["name"],
+        "msg": record["message"],
+    }
+    line.update((key, value) for key, value in record["extra"].items() if key not in ("json", "fields"))
+    if record["exception"] is not None:
+        line["exception"] = "".join(traceback.format_exception(*record["exception"])).rstrip()
+    # Stashed in extra so loguru does not try to format the braces of the JSON itself
+    record["extra"]["json"] = json.dumps(line, default=str)
+    return "{extra[json]}\n"
 
-logger.remove()  
-logger.add(sys.stderr, level="INFO")
-logger.add("logs/risk_model.log", rotation="10 MB", level="DEBUG")
 
-__all__ = ["logger"]
+logger.remove()
+logger.configure(patcher=_add_request_id)
+if LOG_FORMAT == "json":
+    logger.add(sys.stderr, level=LOG_LEVEL, format=_json_format, enqueue=True)
+else:
+    logger.add(sys.stderr, level=LOG_LEVEL, format=_text_format, enqueue=True)
+logger.add(LOG_FILE, rotation="10 MB", level=LOG_FILE_LEVEL, format=_json_format, enqueue=True)
 
+__all__ = ["logger", "hot", "start_request", "end_request", "current_request", "record_stage",
+           "install_flask_request_logging"]
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Request Stage Metrics
+Timing spans aggregated into fixed-bucket histograms, plus event counters, rendered in the
+Prometheus text exposition format for /api/metrics
+"""
+
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+from typing import Dict, Tuple
+
+from risk.logger import record_stage
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+
+# Seconds; from sub-millisecond cache hits to multi-second CSV reloads and SMTP timeouts
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+STAGE_METRIC = "risk_stage_duration_seconds"
+_HELP = {
+    STAGE_METRIC: "Time spent per request stage",
+    "risk_model_fallbacks_total": "Predictions served by the fallback formula instead of the model",
+    "risk_email_failures_total": "Failed email send attempts (queued reports are retried)",
+}
+
+_LabelKey = Tuple[Tuple[str, str], ...]
+
+
+class _Histogram:
+    __slots__ = ("buckets", "sum", "count")
+
+    def __init__(self, n_buckets):
+        self.buckets = [0] * n_buckets
+        self.sum = 0.0
+        self.count = 0
+
+
+class MetricsRegistry:
+    """Thread-safe histograms and counters for one process
+
+    Each gunicorn worker keeps its own; Prometheus scrapes them through the worker that
+    answers, so run one worker (or scrape each) when exact totals matter.
+    """
+
+    def __init__(self, buckets=STAGE_BUCKETS, enabled: bool = METRICS_ENABLED):
+        self.bucket_bounds = tuple(buckets)
+        self.enabled = enabled
+        self._histograms: Dict[Tuple[str, _LabelKey], _Histogram] = {}
+        self._counters: Dict[Tuple[str, _LabelKey], float] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name: str, seconds: float, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        # Index of the first bucket whose upper bound holds the value; len() means +Inf only
+        index = bisect_left(self.bucket_bounds, seconds)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram(len(self.bucket_bounds) + 1)
+            histogram.buckets[index] += 1
+            histogram.sum += seconds
+            histogram.count += 1
+
+    def inc(self, name: str, amount: float = 1, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    @contextmanager
+    def _timed(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.observe(STAGE_METRIC, elapsed, stage=stage)
+            record_stage(stage, elapsed)
+
+    def span(self, stage: str):
+        """Context manager timing one stage into the stage histogram and the request's log line"""
+        return self._timed(stage) if self.enabled else nullcontext()
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text format (version 0.0.4)"""
+        with self._lock:
+            histograms = {key: (list(h.buckets), h.sum, h.count) for key, h in self._histograms.items()}
+            counters = dict(self._counters)
+
+        lines = []
+        for name in sorted({name for name, _ in histograms}):
+            lines += [f"# HELP {name} {_HELP.get(name, name)}", f"# TYPE {name} histogram"]
+            for (metric, labels), (buckets, total, count) in sorted(histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, n in zip(self.bucket_bounds + (float("inf"),), buckets):
+                    cumulative += n
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f"{name}_bucket{_labels(labels + (('le', le),))} {cumulative}")
+                lines.append(f"{name}_sum{_labels(labels)} {total:.6f}")
+                lines.append(f"{name}_count{_labels(labels)} {count}")
+
+        for name in sorted({name for name, _ in counters}):
+            lines += [f"# HELP {name} {_HELP.get(name, name)}", f"# TYPE {name} counter"]
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f"{name}{_labels(labels)} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels: _LabelKey) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+# Process-wide registry used by the app and risk/ modules
+metrics = MetricsRegistry()
+span = metrics.span
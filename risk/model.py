@@ -85,16 +85,18 @@ def load_model(path="models/risk_model.pkl"):
 """
 import numpy as np
 import pandas as pd
-import shap
 import pickle
-from sklearn.pipeline import Pipeline
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.preprocessing import StandardScaler
 from risk.preprocess import preprocess_features, feature_cols, target_cols
+from risk.backends import MODEL_BACKEND, STEP_NAMES, final_estimator, make_regressor
+from risk.labels import assign_label, label_scores
 
 regressors = {}
 
-def train_models(df: pd.DataFrame):
+def train_models(df: pd.DataFrame, backend: str = None):
+    # sklearn and shap are imported where they are used: they take seconds to import
+    # and the web app only needs them once it trains or explains a prediction
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import StandardScaler
     from sklearn.model_selection import train_test_split
     from sklearn.metrics import mean_absolute_error, r2_score
 
@@ -108,13 +110,14 @@ def train_models(df: pd.DataFrame):
 
     X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.3, random_state=42)
 
+    backend = backend or MODEL_BACKEND
     for i, col in enumerate(target_cols):
         reg = Pipeline([
             ("scaler", StandardScaler()),
-            ("rf", RandomForestRegressor(
+            (STEP_NAMES[backend], make_regressor(backend, rf_params=dict(
                 n_estimators=50, max_depth=4, min_samples_leaf=50,
-                min_samples_split=20, max_features="log2", random_state=42
-            ))
+                min_samples_split=20, max_features="log2"
+            )))
         ])
         reg.fit(X_train, y_train[:, i])
         regressors[col] = reg
@@ -134,46 +137,24 @@ def load_model(path="models/risk_model.pkl"):
     with open(path, "rb") as f:
         return pickle.load(f)
 
-def assign_label(score):
-    if score >= 85:
-        return "Very High Risk"
-    elif score >= 60:
-        return "High Risk"
-    elif score >= 40:
-        return "Moderate Risk"
-    elif score >= 20:
-        return "Low Risk"
-    else:
-        return "Very Low Risk"
-
-def predict_batch(df_in, regressors):
-    df_proc = preprocess_features(df_in.copy())
-    preds = pd.DataFrame({"DESYNPUF_ID": df_proc["DESYNPUF_ID"]})
-
-    # Convert feature columns to numpy array to avoid column name issues
-    X = df_proc[feature_cols].values
-
-    for col in target_cols:
-        p = regressors[col].predict(X)
-        preds[col] = np.clip(np.round(p), 0, 100).astype(int)
-
-    # For SHAP analysis, we need to use the feature names
-    model_30d = regressors["RISK_30D"].named_steps["rf"]
+def top_features(regressors, X):
+    """TOP_3_FEATURES string per row: the three largest |SHAP| contributions to the 30-day risk"""
+    import shap
+    model_30d = final_estimator(regressors["RISK_30D"])
     X_transformed = regressors["RISK_30D"].named_steps["scaler"].transform(X)
     explainer = shap.TreeExplainer(model_30d)
     shap_values = explainer.shap_values(X_transformed)
 
     top_features = []
-    for i in range(len(df_proc)):
+    for i in range(len(X)):
         contribs = dict(zip(feature_cols, shap_values[i]))
         sorted_feats = sorted(contribs.items(), key=lambda x: abs(x[1]), reverse=True)[:3]
         formatted = ", ".join([f for f, _ in sorted_feats])
         top_features.append(formatted)
+    return top_features
 
-    preds["RISK_LABEL"] = preds["RISK_30D"].apply(assign_label)
-    preds["TOP_3_FEATURES"] = top_features
-
-    # Add AI recommendations
+def batch_recommendations(preds, df_proc):
+    """AI recommendation text per row of preds (risks and TOP_3_FEATURES) and its patient data"""
     from risk.recommendations import get_ai_recommendations
     
     ai_recommendations = []
@@ -193,7 +174,21 @@ def predict_batch(df_in, regressors):
         
         recommendations = get_ai_recommendations(patient_data, row['TOP_3_FEATURES'])
         ai_recommendations.append(recommendations)
-    
-    preds["AI_RECOMMENDATIONS"] = ai_recommendations
+    return ai_recommendations
+
+def predict_batch(df_in, regressors):
+    df_proc = preprocess_features(df_in.copy())
+    preds = pd.DataFrame({"DESYNPUF_ID": df_proc["DESYNPUF_ID"]})
+
+    # Convert feature columns to numpy array to avoid column name issues
+    X = df_proc[feature_cols].values
+
+    for col in target_cols:
+        p = regressors[col].predict(X)
+        preds[col] = np.clip(np.round(p), 0, 100).astype(int)
+
+    preds["RISK_LABEL"] = label_scores(preds["RISK_30D"])
+    preds["TOP_3_FEATURES"] = top_features(regressors, X)
+    preds["AI_RECOMMENDATIONS"] = batch_recommendations(preds, df_proc)
 
     return preds
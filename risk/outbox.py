@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Delivery Queue for Reports and Emails
+Persists delivery jobs in a local SQLite outbox and runs them on background workers
+"""
+
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import closing
+from typing import Callable, Dict, Optional
+
+from risk.logger import hot, logger
+
+OUTBOX_DB = os.getenv("OUTBOX_DB", "outbox.db")
+
+PENDING, SENDING, SENT, FAILED = "pending", "sending", "sent", "failed"
+
+
+class DeliveryQueue:
+    """Background delivery queue with a persistent SQLite outbox
+
+    Jobs are stored before enqueue() returns, so they survive restarts. Workers claim
+    jobs atomically, which lets several app processes share one outbox file. A failed
+    job is retried with exponential backoff until max_attempts is reached; a job stuck
+    in "sending" longer than lease_timeout (its worker died) is picked up again.
+    """
+
+    def __init__(self, handler: Callable[[str, Dict], None], db_path: str = OUTBOX_DB,
+                 workers: int = 2, max_attempts: int = 5, base_delay: float = 30.0,
+                 max_delay: float = 3600.0, poll_interval: float = 5.0, lease_timeout: float = 600.0):
+        self.handler = handler
+        self.db_path = db_path
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self.lease_timeout = lease_timeout
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._threads = []
+        self._init_db()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _init_db(self):
+        with closing(self._connect()) as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS delivery_jobs (
+                    id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    last_error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL,
+                    next_attempt_at REAL NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE INDEX IF NOT EXISTS ix_delivery_jobs_due
+                ON delivery_jobs (status, next_attempt_at)
+            """)
+
+    # ---------------------------
+    # Producer side
+    # ---------------------------
+    def enqueue(self, kind: str, payload: Dict) -> str:
+        """Store a job in the outbox and wake a worker; returns the job id"""
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "INSERT INTO delivery_jobs (id, kind, payload, status, created_at, updated_at, next_attempt_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, json.dumps(payload, default=str), PENDING, now, now, now)
+            )
+        self._wakeup.set()
+        hot("delivery_queued", "Queued delivery", kind=kind, job_id=job_id)
+        return job_id
+
+    def get_status(self, job_id: str) -> Optional[Dict]:
+        """Status, attempt count and last error of one job"""
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT id, kind, status, attempts, last_error, created_at, updated_at, next_attempt_at "
+                "FROM delivery_jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def stats(self) -> Dict[str, int]:
+        """Number of jobs per status"""
+        with closing(self._connect()) as conn:
+            rows = conn.execute("SELECT status, COUNT(*) FROM delivery_jobs GROUP BY status").fetchall()
+        counts = {PENDING: 0, SENDING: 0, SENT: 0, FAILED: 0}
+        counts.update({status: count for status, count in rows})
+        return counts
+
+    # ---------------------------
+    # Worker side
+    # ---------------------------
+    def start(self):
+        """Start the worker threads (idempotent)"""
+        if self._threads:
+            return
+        self._stopping.clear()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"delivery-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"Delivery queue started with {self.workers} workers ({self.db_path})")
+
+    def stop(self, timeout: float = 5.0):
+        """Ask workers to finish their current job and exit"""
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _claim_next(self, conn) -> Optional[sqlite3.Row]:
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT * FROM delivery_jobs "
+                "WHERE (status = ? AND next_attempt_at <= ?) OR (status = ? AND updated_at <= ?) "
+                "ORDER BY next_attempt_at LIMIT 1",
+                (PENDING, now, SENDING, now - self.lease_timeout)
+            ).fetchone()
+            if row is not None:
+                conn.execute(
+                    "UPDATE delivery_jobs SET status = ?, updated_at = ? WHERE id = ?",
+                    (SENDING, now, row["id"])
+                )
+            conn.execute("COMMIT")
+            return row
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _backoff(self, attempts: int) -> float:
+        delay = min(self.max_delay, self.base_delay * (2 ** (attempts - 1)))
+        return delay * random.uniform(0.8, 1.2)
+
+    def _run(self):
+        conn = self._connect()
+        while not self._stopping.is_set():
+            # Cleared before claiming so an enqueue() racing with an empty claim still wakes us
+            self._wakeup.clear()
+            try:
+                job = self._claim_next(conn)
+            except sqlite3.OperationalError as e:
+                logger.warning(f"Outbox busy: {e}")
+                job = None
+
+            if job is None:
+                self._wakeup.wait(self.poll_interval)
+                continue
+
+            attempts = job["attempts"] + 1
+            try:
+                self.handler(job["kind"], json.loads(job["payload"]))
+                conn.execute(
+                    "UPDATE delivery_jobs SET status = ?, attempts = ?, last_error = NULL, updated_at = ? WHERE id = ?",
+                    (SENT, attempts, time.time(), job["id"])
+                )
+                hot("delivery_sent", "Delivered", kind=job['kind'], job_id=job['id'], attempt=attempts)
+            except Exception as e:
+                now = time.time()
+                if attempts >= self.max_attempts:
+                    status, next_attempt = FAILED, now
+                    logger.error(f"Delivery {job['id']} failed permanently after {attempts} attempts: {e}")
+                else:
+                    status, next_attempt = PENDING, now + self._backoff(attempts)
+                    logger.warning(f"Delivery {job['id']} attempt {attempts} failed, retrying in "
+                                   f"{next_attempt - now:.1f}s: {e}")
+                conn.execute(
+                    "UPDATE delivery_jobs SET status = ?, attempts = ?, last_error = ?, updated_at = ?, "
+                    "next_attempt_at = ? WHERE id = ?",
+                    (status, attempts, str(e), now, next_attempt, job["id"])
+                )
+        conn.close()
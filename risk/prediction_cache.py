@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Prediction Cache
+Bounded LRU/TTL cache of single-patient scoring results, keyed on the model input
+"""
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import numpy as np
+
+PREDICTION_CACHE_SIZE = int(os.getenv("PREDICTION_CACHE_SIZE", 4096))
+PREDICTION_CACHE_TTL = float(os.getenv("PREDICTION_CACHE_TTL", 3600))
+
+
+def feature_key(features, model_version: str) -> str:
+    """Hash of the preprocessed feature vector and the model that scores it
+
+    Values are normalized to float64 first, so 70, 70.0 and "70" (after preprocessing)
+    hit the same entry.
+    """
+    vector = np.ascontiguousarray(np.asarray(features, dtype=np.float64).ravel())
+    digest = hashlib.blake2b(vector.tobytes(), digest_size=16)
+    digest.update(model_version.encode())
+    return digest.hexdigest()
+
+
+class PredictionCache:
+    """Thread-safe LRU cache whose entries also expire `ttl` seconds after insertion"""
+
+    def __init__(self, maxsize: int = PREDICTION_CACHE_SIZE, ttl: float = PREDICTION_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def get(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(value)
+
+    def put(self, key: str, value: Dict):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (dict(value), time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
@@ -42,6 +42,19 @@ feature_cols = [
 # Targets
 target_cols = ["RISK_30D", "RISK_60D", "RISK_90D"]
 
+# Disease weightage system (instead of simple count)
+# Each disease gets a specific weight based on severity/risk impact
+disease_weights = {
+    'HEARTFAILURE': 3.0,    # Highest risk - heart failure
+    'STROKE': 2.8,          # Very high risk - stroke
+    'CANCER': 2.5,          # High risk - cancer
+    'RENAL_DISEASE': 2.3,   # High risk - kidney disease
+    'PULMONARY': 2.0,       # Moderate-high risk - lung disease
+    'ALZHEIMER': 1.8,       # Moderate risk - dementia
+    'RHEUMATOID': 1.5,      # Moderate risk - arthritis
+    'OSTEOPOROSIS': 1.2     # Lower risk - bone disease
+}
+
 def preprocess_features(df: pd.DataFrame) -> pd.DataFrame:
     df = df.copy()
     
@@ -72,19 +85,6 @@ def preprocess_features(df: pd.DataFrame) -> pd.DataFrame:
     df["TOTAL_CLAIMS_COST"] = pd.to_numeric(df["TOTAL_CLAIMS_COST"], errors="coerce").fillna(0)
     df["CLAIMS_FLAG"] = (df["TOTAL_CLAIMS_COST"] > 0).astype(int)
 
-    # Disease weightage system (instead of simple count)
-    # Each disease gets a specific weight based on severity/risk impact
-    disease_weights = {
-        'HEARTFAILURE': 3.0,    # Highest risk - heart failure
-        'STROKE': 2.8,          # Very high risk - stroke
-        'CANCER': 2.5,          # High risk - cancer
-        'RENAL_DISEASE': 2.3,   # High risk - kidney disease
-        'PULMONARY': 2.0,       # Moderate-high risk - lung disease
-        'ALZHEIMER': 1.8,       # Moderate risk - dementia
-        'RHEUMATOID': 1.5,      # Moderate risk - arthritis
-        'OSTEOPOROSIS': 1.2     # Lower risk - bone disease
-    }
-    
     # Calculate weighted comorbidity score instead of simple count
     df["COMOR_WEIGHTED_SCORE"] = 0
     for disease, weight in disease_weights.items():
@@ -96,3 +96,24 @@ def preprocess_features(df: pd.DataFrame) -> pd.DataFrame:
 
     return df
 
+def preprocess_record(record: dict) -> list:
+    """feature_cols values for one patient dict, as preprocess_features computes them
+
+    Scoring a single patient this way skips building a one-row DataFrame.
+    """
+    def number(key):
+        value = record.get(key, 0)
+        return float("nan") if value is None else float(value)
+
+    values = {c: number(c) for c in feature_cols if c not in ("TOTAL_CLAIMS_COST", "CLAIMS_FLAG", "COMOR_WEIGHTED_SCORE")}
+
+    total = pd.to_numeric(record.get("TOTAL_CLAIMS_COST", 0), errors="coerce")
+    values["TOTAL_CLAIMS_COST"] = 0.0 if pd.isna(total) else float(total)
+    values["CLAIMS_FLAG"] = 1.0 if values["TOTAL_CLAIMS_COST"] > 0 else 0.0
+
+    score = 0
+    for disease, weight in disease_weights.items():
+        score += values[disease] * weight
+    values["COMOR_WEIGHTED_SCORE"] = float(score)
+
+    return [values[c] for c in feature_cols]
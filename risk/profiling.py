@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Per-Request Profiling
+cProfile one /api/* request on demand (?profile=1 or X-Profile: 1, plus the admin token in
+X-Profile-Token) and return the report instead of the normal response. The raw profile is
+saved under logs/ for snakeviz or pstats. Without PROFILE_TOKEN no hook is installed at all.
+"""
+
+import cProfile
+import hmac
+import io
+import os
+import pstats
+import re
+import time
+from datetime import datetime
+
+from risk.logger import logger
+
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN")
+PROFILE_DIR = os.getenv("PROFILE_DIR", "logs")
+PROFILE_SORT = os.getenv("PROFILE_SORT", "cumulative")
+PROFILE_LINES = int(os.getenv("PROFILE_LINES", 40))
+
+
+def wants_profile(path: str, args, headers) -> bool:
+    """True for an /api/ request that asks for a profile and carries the admin token"""
+    if not PROFILE_TOKEN or not path.startswith("/api/"):
+        return False
+    if args.get("profile") != "1" and headers.get("X-Profile") != "1":
+        return False
+    token = headers.get("X-Profile-Token") or ""
+    if not hmac.compare_digest(token.encode(), PROFILE_TOKEN.encode()):
+        logger.warning(f"Profile requested for {path} without a valid token, serving normally")
+        return False
+    return True
+
+
+class RequestProfile:
+    """cProfile session for one request"""
+
+    def __init__(self, method: str, path: str):
+        self.method, self.path = method, path
+        self.profiler = cProfile.Profile()
+        self.start = time.perf_counter()
+        self.profiler.enable()
+
+    def finish(self, status: int):
+        """Stop profiling; returns (text report, path of the saved .prof file)"""
+        self.profiler.disable()
+        elapsed = time.perf_counter() - self.start
+
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", self.path).strip("_")[:60]
+        dump_path = os.path.join(PROFILE_DIR, f"profile_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}_{slug}.prof")
+        self.profiler.dump_stats(dump_path)
+
+        out = io.StringIO()
+        out.write(f"{self.method} {self.path} -> {status} in {elapsed * 1000:.1f} ms\n")
+        out.write(f"Saved to {dump_path} (python -m pstats {dump_path}, or snakeviz)\n\n")
+        pstats.Stats(self.profiler, stream=out).sort_stats(PROFILE_SORT).print_stats(PROFILE_LINES)
+        logger.info(f"Profiled {self.method} {self.path} ({elapsed * 1000:.1f} ms) -> {dump_path}")
+        return out.getvalue(), dump_path
+
+
+def install_flask_profiler(app):
+    """Register the profiling hooks on a Flask app when PROFILE_TOKEN is set"""
+    if not PROFILE_TOKEN:
+        return
+    from flask import Response, g, request
+
+    @app.before_request
+    def _start_profile():
+        if wants_profile(request.path, request.args, request.headers):
+            g.request_profile = RequestProfile(request.method, request.full_path.rstrip("?"))
+
+    @app.after_request
+    def _finish_profile(response):
+        profile = g.pop("request_profile", None)
+        if profile is None:
+            return response
+        report, dump_path = profile.finish(response.status_code)
+        return Response(report, mimetype="text/plain", headers={
+            "X-Profile-File": dump_path,
+            "X-Profiled-Status": str(response.status_code),
+        })
+
+    logger.info(f"Request profiling enabled (?profile=1 with X-Profile-Token), profiles in {PROFILE_DIR}/")
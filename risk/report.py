@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Patient PDF Report Renderer
+Builds the per-patient risk report with cached styles and chart assets
+"""
+
+import io
+from datetime import datetime
+from functools import lru_cache
+
+from reportlab import rl_config
+
+# Per-report speedups: binary (not ASCII85) stream encoding - the pure-Python encoder
+# dominated image embedding - and no attribute validation on chart shapes, which is
+# a development aid. Set before the graphics modules read them.
+rl_config.useA85 = 0
+rl_config.shapeChecking = 0
+
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER, TA_LEFT
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.graphics.charts.barcharts import VerticalBarChart
+from reportlab.graphics.shapes import Drawing, Group, String
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image, Table, TableStyle
+
+from risk.metrics import span
+
+_SUMMARY_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor("#d3d3d3")),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 10),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
+    ('GRID', (0, 0), (-1, -1), 0.25, colors.HexColor("#cccccc"))
+])
+
+
+@lru_cache(maxsize=1)
+def _styles():
+    """Paragraph styles, built once per process"""
+    styles = getSampleStyleSheet()
+    return {
+        'title': ParagraphStyle('Title', parent=styles['Heading1'], fontSize=18, alignment=TA_CENTER, spaceAfter=14),
+        'h2': ParagraphStyle('H2', parent=styles['Heading2'], fontSize=12, alignment=TA_LEFT, spaceAfter=8),
+        'normal': styles['Normal'],
+        'italic': styles['Italic'],
+    }
+
+
+def _to_float(value):
+    """Risk value as float; non-numeric values (e.g. 'N/A') chart as 0"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    return float(value) if str(value).replace('.', '', 1).isdigit() else 0
+
+
+def risk_bar_chart(risk30, risk60, risk90, width=6 * inch, height=3 * inch):
+    """Vector bar chart of the 30/60/90-day risks, drawn natively by ReportLab"""
+    values = [risk30 or 0, risk60 or 0, risk90 or 0]
+    drawing = Drawing(width, height)
+    drawing.add(String(width / 2, height - 14, 'Predicted Risk over Time',
+                       fontName='Helvetica', fontSize=11, textAnchor='middle'))
+
+    chart = VerticalBarChart()
+    chart.x, chart.y = 50, 30
+    chart.width, chart.height = width - 70, height - 60
+    chart.data = [values]
+    chart.categoryAxis.categoryNames = ['30-day', '60-day', '90-day']
+    chart.valueAxis.valueMin = 0
+    chart.valueAxis.valueMax = max(100, max(values) * 1.1)
+    chart.valueAxis.valueStep = 20
+    chart.bars[0].fillColor = colors.HexColor("#1f77b4")
+    chart.barSpacing = 6
+    drawing.add(chart)
+
+    # Y-axis title, rotated 90 degrees
+    axis_title = String(0, 0, 'Risk (%)', fontName='Helvetica', fontSize=9, textAnchor='middle')
+    drawing.add(Group(axis_title, transform=(0, 1, -1, 0, 16, 30 + chart.height / 2)))
+    return drawing
+
+
+@lru_cache(maxsize=16)
+def label_pie_chart_png(risk_label):
+    """PNG bytes for the risk label pie chart; identical per label, so rendered once each"""
+    import matplotlib
+    matplotlib.use('Agg')  # non-interactive backend
+    import matplotlib.pyplot as plt
+
+    labels = [risk_label if risk_label else 'Unknown']
+    fig, ax = plt.subplots(figsize=(4, 2.5))
+    ax.pie([1], labels=labels, startangle=90, wedgeprops=dict(width=0.5))
+    ax.set_title('Risk Level')
+    plt.tight_layout()
+
+    buf = io.BytesIO()
+    fig.savefig(buf, format='png')
+    plt.close(fig)
+    return buf.getvalue()
+
+
+def create_patient_pdf_bytes(patient: dict, include_large_table: bool = True):
+    """Build a PDF report for a single patient and return bytes"""
+    with span("pdf_render"):
+        return _render_patient_pdf(patient, include_large_table)
+
+
+def _render_patient_pdf(patient: dict, include_large_table: bool):
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=30, leftMargin=30, topMargin=30, bottomMargin=18)
+    elements = []
+    styles = _styles()
+    normal = styles['normal']
+
+    # Title
+    elements.append(Paragraph("Patient Risk Assessment Report", styles['title']))
+
+    # Patient Info block
+    gender_str = 'Male' if patient.get('GENDER') == 1 else 'Female'
+    info_html = f"""
+    <b>Patient Information</b><br/>
+    <b>Patient ID:</b> {patient.get('DESYNPUF_ID', 'N/A')}<br/>
+    <b>Age:</b> {patient.get('AGE', 'N/A')}<br/>
+    <b>Gender:</b> {gender_str}<br/>
+    <b>Email:</b> {patient.get('EMAIL', 'Not Provided')}<br/>
+    <b>Total Claims Cost:</b> {patient.get('TOTAL_CLAIMS_COST', 'N/A')}<br/>
+    <b>Index Date:</b> {patient.get('INDEX_DATE', 'N/A')}<br/>
+    <b>Report Generated:</b> {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+    """
+    elements.append(Paragraph(info_html, normal))
+    elements.append(Spacer(1, 12))
+
+    # Risk summary table
+    risk_30 = patient.get('RISK_30D', 'N/A')
+    risk_60 = patient.get('RISK_60D', 'N/A')
+    risk_90 = patient.get('RISK_90D', 'N/A')
+    label = patient.get('RISK_LABEL', 'N/A')
+    top_feats = patient.get('TOP_3_FEATURES', 'N/A')
+
+    table_data = [
+        ['Metric', 'Value'],
+        ['30-Day Risk (%)', f"{risk_30}"],
+        ['60-Day Risk (%)', f"{risk_60}"],
+        ['90-Day Risk (%)', f"{risk_90}"],
+        ['Risk Label', str(label)],
+        ['Top Features', str(top_feats)]
+    ]
+    table = Table(table_data, colWidths=[2.5 * inch, 3.5 * inch])
+    table.setStyle(_SUMMARY_TABLE_STYLE)
+    elements.append(table)
+    elements.append(Spacer(1, 14))
+
+    # Charts
+    try:
+        elements.append(risk_bar_chart(_to_float(risk_30), _to_float(risk_60), _to_float(risk_90)))
+        elements.append(Spacer(1, 8))
+        pie_img = Image(io.BytesIO(label_pie_chart_png(str(label) if label else None)),
+                        width=3.5 * inch, height=2.5 * inch)
+        elements.append(pie_img)
+        elements.append(Spacer(1, 12))
+    except Exception as chart_err:
+        print(f"Chart generation error: {chart_err}")
+        elements.append(Paragraph("Charts unavailable due to rendering error.", normal))
+        elements.append(Spacer(1, 8))
+
+    # AI Recommendations section
+    recommendations = patient.get('AI_RECOMMENDATIONS', 'No recommendations available')
+    elements.append(Paragraph("<b>AI-Generated Recommendations:</b>", styles['h2']))
+    elements.append(Paragraph(str(recommendations), normal))
+    elements.append(Spacer(1, 12))
+
+    # Footer
+    elements.append(Spacer(1, 16))
+    elements.append(Paragraph("Generated by Risk Stratification System", styles['italic']))
+
+    # Build PDF
+    try:
+        doc.build(elements)
+    except Exception as build_err:
+        print(f"PDF build failed: {build_err}")
+        raise
+
+    buffer.seek(0)
+    return buffer.getvalue()
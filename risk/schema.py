@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Patient Table Schema
+Compact in-memory dtypes for trainingk.csv
+"""
+
+from typing import Dict, List
+
+import pandas as pd
+
+# Repeated text: a handful of labels, feature triples and recommendation strings
+CATEGORY_COLS = ["RISK_LABEL", "TOP_3_FEATURES", "AI_RECOMMENDATIONS", "EMAIL", "INDEX_DATE"]
+
+# 0/1 flags and 0-12 insurance months
+INT8_COLS = [
+    "GENDER", "ALZHEIMER", "HEARTFAILURE", "CANCER", "PULMONARY", "OSTEOPOROSIS",
+    "RHEUMATOID", "STROKE", "RENAL_DISEASE", "CLAIMS_FLAG",
+    "PARTA", "PARTB", "HMO", "PARTD",
+]
+
+# Small counts
+INT16_COLS = ["AGE", "IN_ADM", "OUT_VISITS", "ED_VISITS", "COMOR_COUNT"]
+
+# Vitals, trends and scores; costs and risk scores stay float64 because the API returns them
+FLOAT32_COLS = [
+    "BMI", "BP_S", "GLUCOSE", "HbA1c", "CHOLESTEROL", "RX_ADH",
+    "BP_trend", "HbA1c_trend", "COMOR_WEIGHTED_SCORE",
+]
+
+
+def patient_dtypes() -> Dict[str, str]:
+    """Target dtype per column of the patient table"""
+    dtypes = {col: "category" for col in CATEGORY_COLS}
+    dtypes.update({col: "int8" for col in INT8_COLS})
+    dtypes.update({col: "int16" for col in INT16_COLS})
+    dtypes.update({col: "float32" for col in FLOAT32_COLS})
+    return dtypes
+
+
+def apply_patient_schema(df: pd.DataFrame) -> pd.DataFrame:
+    """Downcast a patient DataFrame in place to the compact schema
+
+    Integer columns holding missing values are stored as float32 instead, so the
+    schema never fails on a partially filled row.
+    """
+    for col, dtype in patient_dtypes().items():
+        if col not in df.columns:
+            continue
+        series = df[col]
+        if dtype == "category":
+            df[col] = series.astype("category")
+        elif dtype.startswith("int"):
+            numeric = pd.to_numeric(series, errors="coerce")
+            df[col] = numeric.astype("float32") if numeric.isna().any() else numeric.astype(dtype)
+        else:
+            df[col] = pd.to_numeric(series, errors="coerce").astype(dtype)
+    return df
+
+
+def load_patient_table(path: str) -> pd.DataFrame:
+    """Read trainingk.csv straight into the compact schema"""
+    # Categories are parsed by read_csv directly; numeric downcasting happens afterwards
+    # because a stray blank in a flag column would make a strict int8 read fail
+    read_dtypes = {col: "category" for col in CATEGORY_COLS}
+    df = pd.read_csv(path, dtype=read_dtypes, low_memory=False)
+    return apply_patient_schema(df)
+
+
+def append_patient_rows(df: pd.DataFrame, new_rows: pd.DataFrame) -> pd.DataFrame:
+    """Concatenate new rows without losing the categorical / downcast dtypes"""
+    df = df.copy(deep=False)
+    new_rows = new_rows.copy()
+    for col in df.columns:
+        if col not in new_rows.columns:
+            continue
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            raw = new_rows[col]
+            values = raw.astype(str).where(raw.notna())
+            missing = [v for v in values.dropna().unique() if v not in df[col].cat.categories]
+            if missing:
+                df[col] = df[col].cat.add_categories(missing)
+            new_rows[col] = pd.Categorical(values, categories=df[col].cat.categories)
+        elif df[col].dtype != object and pd.api.types.is_numeric_dtype(df[col]):
+            numeric = pd.to_numeric(new_rows[col], errors="coerce")
+            if not numeric.isna().any() or df[col].dtype.kind == "f":
+                new_rows[col] = numeric.astype(df[col].dtype)
+    return pd.concat([df, new_rows], ignore_index=True)
+
+
+def memory_usage_mb(df: pd.DataFrame) -> float:
+    """Deep memory footprint of a DataFrame in MB"""
+    return df.memory_usage(deep=True).sum() / (1024 * 1024)
+
+
+def memory_by_column(df: pd.DataFrame) -> List[tuple]:
+    """(column, dtype, MB) sorted by size, largest first"""
+    usage = df.memory_usage(deep=True, index=False)
+    rows = [(col, str(df[col].dtype), usage[col] / (1024 * 1024)) for col in df.columns]
+    return sorted(rows, key=lambda r: r[2], reverse=True)
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Search Index for the Patient Dashboard
+Prefix search on patient IDs and token search on top features / recommendations
+"""
+
+import re
+from array import array
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# Same token rules as SQLite's FTS5 unicode61 tokenizer: runs of letters/digits
+_TOKEN_RE = re.compile(r"[^\W_]+")
+
+# Number of inserted IDs kept in the unsorted tail before re-sorting the ID array
+_PENDING_MERGE_SIZE = 1024
+
+
+def tokenize(text) -> List[str]:
+    """Split text into lowercase alphanumeric tokens"""
+    if text is None or pd.isna(text):
+        return []
+    return _TOKEN_RE.findall(str(text).lower())
+
+
+def fts_match_query(search: str) -> Optional[str]:
+    """Build an FTS5 MATCH expression: the search tokens as a phrase, last token as prefix"""
+    tokens = tokenize(search)
+    if not tokens:
+        return None
+    return '"' + " ".join(tokens) + '"*'
+
+
+class _TextColumnIndex:
+    """Token index over a low-cardinality text column (feature triples, recommendations)
+
+    Each distinct value is tokenized once and rows only store the value's code, so a
+    query scans the few distinct values and then does one vectorized lookup over codes.
+    """
+
+    def __init__(self, values):
+        values = pd.Series(values)
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            # Already dictionary-encoded by the patient schema
+            codes, uniques = values.cat.codes.to_numpy(), values.cat.categories
+        else:
+            codes, uniques = pd.factorize(values.astype(object), use_na_sentinel=True)
+        self._codes = array("i", codes.astype(np.int32))
+        self._value_codes: Dict[str, int] = {}
+        self._token_strings: List[str] = []
+        for value in uniques:
+            self._add_value(value)
+
+    def _add_value(self, value) -> int:
+        code = len(self._token_strings)
+        self._value_codes[value] = code
+        # A leading space makes " q1 q2" match from a token start, with a prefix on the last token
+        self._token_strings.append(" " + " ".join(tokenize(value)))
+        return code
+
+    def append(self, value):
+        if value is None or pd.isna(value):
+            self._codes.append(-1)
+            return
+        code = self._value_codes.get(value)
+        if code is None:
+            code = self._add_value(value)
+        self._codes.append(code)
+
+    def match(self, phrase: str) -> np.ndarray:
+        matching = [code for code, tokens in enumerate(self._token_strings) if phrase in tokens]
+        codes = np.frombuffer(self._codes, dtype=np.int32)
+        if not matching:
+            return np.zeros(len(codes), dtype=bool)
+        lookup = np.zeros(len(self._token_strings) + 1, dtype=bool)
+        lookup[matching] = True
+        # code -1 (missing) maps to the trailing False slot
+        return lookup[codes]
+
+
+class PatientSearchIndex:
+    """In-memory search index over the patient table
+
+    - DESYNPUF_ID: case-insensitive prefix search through a sorted ID array
+    - TOP_3_FEATURES / AI_RECOMMENDATIONS: phrase search on tokens, last token as prefix
+    Row positions returned by search() refer to the frame the index was built from,
+    extended by every add().
+    """
+
+    def __init__(self, patient_ids, top_features, recommendations):
+        ids = np.asarray(pd.Series(patient_ids, dtype=object).fillna("").astype(str).str.lower(), dtype=str)
+        self._id_order = np.argsort(ids, kind="stable")
+        self._sorted_ids = ids[self._id_order]
+        # Recent inserts are scanned linearly and merged into the sorted arrays in batches
+        self._pending_ids: List[str] = []
+        self._pending_rows: List[int] = []
+        self._features = _TextColumnIndex(top_features)
+        self._recommendations = _TextColumnIndex(recommendations)
+        self._size = len(ids)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "PatientSearchIndex":
+        """Build the index from a patient DataFrame"""
+        def column(name):
+            return df[name] if name in df.columns else pd.Series([None] * len(df), dtype=object)
+        return cls(column("DESYNPUF_ID"), column("TOP_3_FEATURES"), column("AI_RECOMMENDATIONS"))
+
+    def __len__(self):
+        return self._size
+
+    def add(self, patient_id, top_features, recommendations):
+        """Index one appended row (its position is the current index length)"""
+        key = str(patient_id if patient_id is not None else "").lower()
+        self._pending_ids.append(key)
+        self._pending_rows.append(self._size)
+        self._features.append(top_features)
+        self._recommendations.append(recommendations)
+        self._size += 1
+        if len(self._pending_ids) >= _PENDING_MERGE_SIZE:
+            self._merge_pending()
+
+    def _merge_pending(self):
+        ids = np.concatenate([self._sorted_ids, np.asarray(self._pending_ids, dtype=str)])
+        rows = np.concatenate([self._id_order, np.asarray(self._pending_rows, dtype=self._id_order.dtype)])
+        order = np.argsort(ids, kind="stable")
+        self._sorted_ids = ids[order]
+        self._id_order = rows[order]
+        self._pending_ids = []
+        self._pending_rows = []
+
+    def search(self, query: str) -> Optional[np.ndarray]:
+        """Return sorted row positions matching the query, or None for an empty query"""
+        raw = str(query).strip().lower()
+        if not raw:
+            return None
+
+        mask = np.zeros(self._size, dtype=bool)
+        tokens = tokenize(raw)
+        if tokens:
+            phrase = " " + " ".join(tokens)
+            mask |= self._features.match(phrase)
+            mask |= self._recommendations.match(phrase)
+
+        # A query longer than the widest ID cannot be an ID prefix; skipping it also avoids
+        # numpy widening (copying) the whole ID array to compare against it
+        width = self._sorted_ids.dtype.itemsize // 4
+        if len(raw) <= width:
+            lo = np.searchsorted(self._sorted_ids, raw, side="left")
+            if len(raw) < width:
+                hi = np.searchsorted(self._sorted_ids, raw + "\uffff", side="left")
+            else:
+                hi = np.searchsorted(self._sorted_ids, raw, side="right")
+            mask[self._id_order[lo:hi]] = True
+        for key, row in zip(self._pending_ids, self._pending_rows):
+            if key.startswith(raw):
+                mask[row] = True
+
+        return np.flatnonzero(mask)
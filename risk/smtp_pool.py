@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+SMTP Connection Pool and Send Rate Limiter
+Reuses authenticated SMTP sessions instead of connecting, STARTTLS-ing and logging in per message
+"""
+
+import queue
+import smtplib
+import threading
+import time
+from contextlib import contextmanager
+
+from risk.logger import logger
+
+
+class SMTPConnectionPool:
+    """Small pool of authenticated smtplib connections
+
+    A connection is health-checked with NOOP when it has been idle for a while and is
+    discarded instead of returned when a send fails, so callers never see a dead session
+    twice.
+    """
+
+    def __init__(self, host, port, username, password, use_tls=True, size=4,
+                 timeout=30, idle_check_after=60):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.size = size
+        self.timeout = timeout
+        self.idle_check_after = idle_check_after
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._slots = threading.BoundedSemaphore(size)
+
+    def _open(self):
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.use_tls:
+            server.starttls()
+        server.login(self.username, self.password)
+        logger.debug(f"Opened SMTP connection to {self.host}:{self.port}")
+        return server
+
+    @staticmethod
+    def _close(server):
+        try:
+            server.quit()
+        except Exception:
+            try:
+                server.close()
+            except Exception:
+                pass
+
+    def _checkout(self):
+        while True:
+            try:
+                server, last_used = self._idle.get_nowait()
+            except queue.Empty:
+                return self._open()
+            if time.monotonic() - last_used < self.idle_check_after:
+                return server
+            try:
+                if server.noop()[0] == 250:
+                    return server
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._close(server)
+
+    @contextmanager
+    def connection(self):
+        """Borrow an authenticated connection; blocks while all `size` connections are in use"""
+        self._slots.acquire()
+        server = None
+        try:
+            server = self._checkout()
+            yield server
+        except Exception:
+            if server is not None:
+                self._close(server)
+                server = None
+            raise
+        finally:
+            if server is not None:
+                try:
+                    self._idle.put_nowait((server, time.monotonic()))
+                except queue.Full:
+                    self._close(server)
+            self._slots.release()
+
+    def send_message(self, msg):
+        """Send a message on a pooled connection, reconnecting once if the session went stale"""
+        try:
+            with self.connection() as server:
+                server.send_message(msg)
+        except (smtplib.SMTPServerDisconnected, ConnectionError):
+            with self.connection() as server:
+                server.send_message(msg)
+
+    def close_all(self):
+        """Close every idle connection"""
+        while True:
+            try:
+                server, _ = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._close(server)
+
+
+class RateLimiter:
+    """Thread-safe token bucket limiting sends to `rate` per second (None = unlimited)"""
+
+    def __init__(self, rate=None, burst=1):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if not self.rate:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Synthetic Patient Generator
+Produces DataFrames with the trainingk.csv schema for benchmarks and scale tests
+"""
+
+import numpy as np
+import pandas as pd
+
+from risk.labels import label_scores
+from risk.preprocess import chronic_cols
+from risk.recommendations import get_ai_recommendations
+
+
+_FEATURE_TRIPLES = [
+    "AGE, TOTAL_CLAIMS_COST, COMOR_WEIGHTED_SCORE",
+    "HEARTFAILURE, AGE, IN_ADM",
+    "GLUCOSE, HbA1c, BMI",
+    "STROKE, BP_S, AGE",
+    "RX_ADH, ED_VISITS, CANCER",
+    "RENAL_DISEASE, CHOLESTEROL, OUT_VISITS",
+    "PULMONARY, ALZHEIMER, TOTAL_CLAIMS_COST",
+]
+
+_DISEASE_WEIGHTS = {
+    'HEARTFAILURE': 3.0, 'STROKE': 2.8, 'CANCER': 2.5, 'RENAL_DISEASE': 2.3,
+    'PULMONARY': 2.0, 'ALZHEIMER': 1.8, 'RHEUMATOID': 1.5, 'OSTEOPOROSIS': 1.2
+}
+
+
+def generate_patients(n_rows: int, seed: int = 42) -> pd.DataFrame:
+    """Generate n_rows synthetic patients with trainingk.csv columns"""
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({"DESYNPUF_ID": [f"{x:016X}" for x in rng.integers(0, 2**63, n_rows)]})
+
+    df["AGE"] = rng.integers(26, 100, n_rows)
+    df["GENDER"] = rng.integers(0, 2, n_rows)
+    for col in ["PARTA", "PARTB", "PARTD"]:
+        df[col] = rng.choice([0, 12], n_rows, p=[0.1, 0.9])
+    df["HMO"] = rng.choice([0, 12], n_rows)
+    for col in chronic_cols:
+        df[col] = (rng.random(n_rows) < 0.2).astype(int)
+
+    df["BMI"] = rng.normal(28, 5, n_rows).round(1)
+    df["BP_S"] = rng.normal(130, 15, n_rows).round(1)
+    df["GLUCOSE"] = rng.normal(110, 25, n_rows).round(1)
+    df["HbA1c"] = rng.normal(6, 1, n_rows).round(2)
+    df["CHOLESTEROL"] = rng.normal(200, 30, n_rows).round(1)
+    df["RX_ADH"] = rng.random(n_rows).round(2)
+    df["BP_trend"] = rng.normal(0, 1, n_rows).round(2)
+    df["HbA1c_trend"] = rng.normal(0, 0.3, n_rows).round(2)
+
+    df["OUTPATIENT_COST"] = rng.exponential(2000, n_rows).round(2)
+    df["ED_COST"] = rng.exponential(500, n_rows).round(2)
+    df["TOTAL_CLAIMS_COST"] = (df["OUTPATIENT_COST"] + df["ED_COST"] + rng.exponential(5000, n_rows)).round(2)
+    df["IN_ADM"] = rng.poisson(0.5, n_rows)
+    df["OUT_VISITS"] = rng.poisson(5, n_rows)
+    df["ED_VISITS"] = rng.poisson(0.7, n_rows)
+
+    df["COMOR_COUNT"] = df[chronic_cols].sum(axis=1)
+    df["COMOR_WEIGHTED_SCORE"] = sum(df[d] * w for d, w in _DISEASE_WEIGHTS.items())
+    df["CLAIMS_FLAG"] = (df["TOTAL_CLAIMS_COST"] > 0).astype(int)
+
+    base = ((df["AGE"] - 30) * 0.5 + df["COMOR_WEIGHTED_SCORE"] * 4 + df["IN_ADM"] * 5
+            + (df["GLUCOSE"] - 100) * 0.05 + rng.normal(0, 5, n_rows))
+    df["RISK_30D"] = base.clip(0, 100).round(2)
+    df["RISK_60D"] = (base * 1.1).clip(0, 100).round(2)
+    df["RISK_90D"] = (base * 1.2).clip(0, 100).round(2)
+    df["RISK_LABEL"] = label_scores(df["RISK_30D"]).astype(str)
+
+    df["TOP_3_FEATURES"] = rng.choice(_FEATURE_TRIPLES, n_rows)
+    # Recommendations depend on the feature triple and the risk band; render each combination once
+    band = (df["RISK_30D"] // 20 * 20).astype(int)
+    combos = pd.DataFrame({"TOP_3_FEATURES": df["TOP_3_FEATURES"], "band": band}).drop_duplicates()
+    text = {
+        (row.TOP_3_FEATURES, row.band): get_ai_recommendations(
+            {"RISK_30D": row.band, "AGE": 80, "BMI": 31, "BP_S": 150, "GLUCOSE": 150,
+             "HbA1c": 7, "CHOLESTEROL": 240, "RX_ADH": 0.5, "IN_ADM": 3, "ED_VISITS": 3},
+            row.TOP_3_FEATURES)
+        for row in combos.itertuples()
+    }
+    df["AI_RECOMMENDATIONS"] = [text[key] for key in zip(df["TOP_3_FEATURES"], band)]
+
+    has_email = rng.random(n_rows) < 0.3
+    df["EMAIL"] = np.where(has_email, "patient" + df.index.astype(str) + "@example.com", "")
+    df["INDEX_DATE"] = (pd.Timestamp("2008-01-01")
+                        + pd.to_timedelta(rng.integers(0, 1000, n_rows), unit="D")).strftime("%Y-%m-%d")
+    return df
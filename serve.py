@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Production server launcher
+- gunicorn (default on Linux/macOS): preforked workers sharing the preloaded app
+- waitress (default on Windows, or --server waitress): single process, thread pool
+- uvicorn (--server uvicorn): the async API in asgi.py; --workers processes
+
+Usage:
+    python serve.py
+    python serve.py --server waitress --threads 8
+    python serve.py --server uvicorn --workers 2
+Configuration: PORT, HOST, WEB_WORKERS, WEB_THREADS (see gunicorn.conf.py)
+"""
+
+import argparse
+import os
+import sys
+
+
+def run_gunicorn(args):
+    os.environ["WEB_WORKERS"] = str(args.workers)
+    os.environ["WEB_THREADS"] = str(args.threads)
+    os.environ["PORT"] = str(args.port)
+    os.environ["HOST"] = args.host
+    os.execvp(sys.executable, [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "wsgi:app"])
+
+
+def run_waitress(args):
+    from waitress import serve
+    from wsgi import app
+
+    from app import delivery_queue
+    delivery_queue.start()
+    print(f"🚀 Serving on http://{args.host}:{args.port} with waitress ({args.threads} threads)")
+    serve(app, host=args.host, port=args.port, threads=args.threads)
+
+
+def run_uvicorn(args):
+    import uvicorn
+
+    uvicorn.run("asgi:app", host=args.host, port=args.port, workers=args.workers,
+                log_level="warning", access_log=False)
+
+
+def main():
+    default_server = "waitress" if os.name == "nt" else "gunicorn"
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--server", choices=["gunicorn", "waitress", "uvicorn"], default=default_server)
+    parser.add_argument("--host", default=os.getenv("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", 5000)))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_WORKERS", 2)),
+                        help="worker processes (gunicorn, uvicorn)")
+    parser.add_argument("--threads", type=int, default=int(os.getenv("WEB_THREADS", 4)),
+                        help="threads per worker")
+    args = parser.parse_args()
+
+    if args.server == "gunicorn":
+        run_gunicorn(args)
+    elif args.server == "uvicorn":
+        run_uvicorn(args)
+    else:
+        run_waitress(args)
+
+
+if __name__ == "__main__":
+    main()
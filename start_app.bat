@@ -47,7 +47,7 @@ echo 📊 Dashboard: http://localhost:5000
 echo 🛑 Press Ctrl+C to stop
 echo.
 
-REM Start the application
-python app.py
+REM Start the application (waitress on Windows)
+python serve.py
 
 pause
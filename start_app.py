@@ -61,14 +61,15 @@ def check_model():
     return True
 
 def start_app():
-    """Start the Flask application"""
+    """Start the application under the production server (--dev for the Flask dev server)"""
     print("\n🚀 Starting Risk Stratification Web Application...")
     print("📊 Dashboard will be available at: http://localhost:5000")
     print("🛑 Press Ctrl+C to stop the application")
     print("-" * 50)
     
+    command = [sys.executable, 'app.py'] if '--dev' in sys.argv else [sys.executable, 'serve.py']
     try:
-        subprocess.run([sys.executable, 'app.py'])
+        subprocess.run(command)
     except KeyboardInterrupt:
         print("\n👋 Application stopped by user")
     except Exception as e:
@@ -1,17 +1,24 @@
 import pandas as pd
 import numpy as np
-from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler
-from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score, confusion_matrix, classification_report
+from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
 from sklearn.pipeline import Pipeline
-from sklearn.ensemble import RandomForestRegressor
 import shap
 import joblib
+import json
 import os
 import pickle
+import sys
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
 import warnings
 
+from risk.backends import BACKENDS, MODEL_BACKEND, STEP_NAMES, final_estimator, make_regressor
+from risk.evaluate import evaluate_risk
+
 warnings.filterwarnings('ignore')
 
 # -------------------------------
@@ -22,8 +29,9 @@ chronic_cols = [
     "OSTEOPOROSIS", "RHEUMATOID", "STROKE", "RENAL_DISEASE"
 ]
 
-def preprocess_features(df):
-    df = df.copy()
+def preprocess_features(df, copy=True):
+    if copy:
+        df = df.copy()
     # Claims flag
     df["CLAIMS_FLAG"] = (df["TOTAL_CLAIMS_COST"].fillna(0) > 0).astype(int)
     
@@ -52,34 +60,199 @@ def preprocess_features(df):
     return df
 
 
+# -------------------------------
+# 1b. Loading, arrays and parallel fitting
+# -------------------------------
+# Text columns are never features; skipping them at read time is most of the memory saving
+TEXT_COLS = ["DESYNPUF_ID", "RISK_LABEL", "EMAIL", "TOP_3_FEATURES", "AI_RECOMMENDATIONS"]
+
+# Cores used to fit the models (targets in parallel, trees in parallel within each)
+TRAIN_JOBS = int(os.getenv("TRAIN_JOBS", os.cpu_count() or 1))
+
+
+def read_training_csv(csv_path):
+    """Numeric columns as float32 plus INDEX_DATE (categorical, for the watermark)"""
+    header = pd.read_csv(csv_path, nrows=0).columns
+    usecols = [col for col in header if col not in TEXT_COLS]
+    dtypes = {col: np.float32 for col in usecols if col != "INDEX_DATE"}
+    if "INDEX_DATE" in usecols:
+        dtypes["INDEX_DATE"] = "category"
+    return pd.read_csv(csv_path, usecols=usecols, dtype=dtypes)
+
+
+def build_training_arrays(df, valid_rows, feature_cols, target_cols, test_size=0.3, random_state=42):
+    """X (C-contiguous float32) and y (float64, one contiguous column per target), shuffled as [test | train]
+
+    Uses the same permutation as train_test_split(test_size, random_state), so the split is
+    identical; rows are gathered straight into place, one column at a time, instead of
+    materializing X, y and four split copies.
+    """
+    n = len(valid_rows)
+    n_test = int(np.ceil(test_size * n))
+    order = valid_rows[np.random.RandomState(random_state).permutation(n)]
+
+    X = np.empty((n, len(feature_cols)), dtype=np.float32)
+    for j, col in enumerate(feature_cols):
+        values = df[col].to_numpy(dtype=np.float32)[order]
+        values[np.isnan(values)] = 0  # Fill missing values with 0
+        X[:, j] = values
+
+    y = np.empty((n, len(target_cols)), dtype=np.float64, order="F")
+    for i, col in enumerate(target_cols):
+        y[:, i] = df[col].to_numpy(dtype=np.float64)[order]
+    return X, y, n_test
+
+
+# Random forest settings (the default backend)
+RF_PARAMS = dict(
+    n_estimators=100,  # Increased for better performance with more features
+    max_depth=8,       # Increased depth for more complex patterns
+    min_samples_leaf=20,  # Reduced for more sensitivity
+    min_samples_split=10, # Reduced for more sensitivity
+    max_features="sqrt",  # Better for larger feature sets
+)
+
+
+def backend_params(backend, overrides=None):
+    """make_regressor() keyword arguments for a backend, with tuned overrides applied"""
+    overrides = overrides or {}
+    if backend == "random_forest":
+        return {"rf_params": {**RF_PARAMS, **overrides}}
+    return {"hgb_params": overrides}
+
+
+def _fit_regressor(X, y, n_jobs, backend, params):
+    model = make_regressor(backend, n_jobs=n_jobs, **backend_params(backend, params)).fit(X, y)
+    if backend == "random_forest":
+        # The app scores one patient at a time, where fanning the trees out over threads costs
+        # more than it saves
+        model.set_params(n_jobs=None)
+    return model
+
+
+def fit_regressors(X, y, target_cols, n_jobs=TRAIN_JOBS, backend=MODEL_BACKEND, params=None):
+    """One regressor per target column of y, fitted concurrently on a shared X
+
+    Tree building releases the GIL, so threads (targets) x joblib threads (trees) use
+    all cores without copying X into worker processes.
+    """
+    jobs_per_target = max(1, -(-n_jobs // len(target_cols)))
+    with ThreadPoolExecutor(max_workers=min(n_jobs, len(target_cols))) as pool:
+        futures = {col: pool.submit(_fit_regressor, X, y[:, i], jobs_per_target, backend, params)
+                   for i, col in enumerate(target_cols)}
+        return {col: future.result() for col, future in futures.items()}
+
+
+def _memory_mb():
+    """(current RSS, peak RSS) in MB; peak is since the last reset where the OS supports it"""
+    try:
+        with open("/proc/self/status") as f:
+            status = dict(line.split(":", 1) for line in f if ":" in line)
+        return int(status["VmRSS"].split()[0]) / 1024, int(status["VmHWM"].split()[0]) / 1024
+    except (OSError, KeyError, ValueError):
+        pass
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None, None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return None, peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+class StageTimer:
+    """Wall time, RSS and peak RSS per training stage"""
+
+    def __init__(self):
+        self.stages = []
+
+    @contextmanager
+    def __call__(self, name):
+        try:
+            # Linux: reset the peak (VmHWM) so each stage reports its own
+            with open("/proc/self/clear_refs", "w") as f:
+                f.write("5")
+        except OSError:
+            pass
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            rss, peak = _memory_mb()
+            self.stages.append((name, time.perf_counter() - start, rss, peak))
+
+    def report(self):
+        def mb(value):
+            return f"{value:9.0f}" if value is not None else f"{'n/a':>9s}"
+
+        print("\n⏱️  STAGES")
+        print(f"   {'stage':12s} {'wall (s)':>9s} {'RSS (MB)':>9s} {'peak (MB)':>9s}")
+        for name, secs, rss, peak in self.stages:
+            print(f"   {name:12s} {secs:9.2f} {mb(rss)} {mb(peak)}")
+        print(f"   {'total':12s} {sum(stage[1] for stage in self.stages):9.2f}")
+
+
+
+# SHAP importance is computed chunk by chunk on at most SHAP_MAX_ROWS test rows (0: all of them)
+SHAP_CHUNK_ROWS = int(os.getenv("SHAP_CHUNK_ROWS", 2000))
+SHAP_MAX_ROWS = int(os.getenv("SHAP_MAX_ROWS", 5000))
+
+
+def shap_importance(regressors, X, feature_cols, target_cols, max_rows=SHAP_MAX_ROWS, chunk_rows=SHAP_CHUNK_ROWS):
+    """Mean |SHAP| per feature for every target, accumulated over chunks of X
+
+    Only one chunk of SHAP values exists at a time, so memory does not grow with X. The
+    test rows come out of build_training_arrays already shuffled, so the first max_rows
+    of them are a uniform sample. Sorted by the first target's importance, which is
+    also the "importance" column.
+    """
+    n_rows = min(len(X), max_rows) if max_rows else len(X)
+    explainers = {col: shap.TreeExplainer(final_estimator(regressors[col])) for col in target_cols}
+    sums = {col: np.zeros(len(feature_cols)) for col in target_cols}
+
+    for start in range(0, n_rows, chunk_rows):
+        chunk = X[start:min(start + chunk_rows, n_rows)]
+        for col in target_cols:
+            X_scaled = regressors[col].named_steps["scaler"].transform(chunk)
+            sums[col] += np.abs(explainers[col].shap_values(X_scaled)).sum(axis=0)
+
+    importance = pd.DataFrame({"feature": feature_cols})
+    for col in target_cols:
+        importance[col] = sums[col] / max(n_rows, 1)
+    importance.insert(1, "importance", importance[target_cols[0]])
+    print(f"🔍 SHAP importance from {n_rows:,} of {len(X):,} test rows, {len(target_cols)} targets")
+    return importance.sort_values("importance", ascending=False)
+
 # -------------------------------
 # 2. Training pipeline
 # -------------------------------
-def quick_train():
+def quick_train(csv_path="trainingk.csv", n_jobs=TRAIN_JOBS, explain=True, backend=MODEL_BACKEND, params=None,
+                shap_rows=SHAP_MAX_ROWS):
     print("🚀 Starting Risk Model Training...")
     print("="*50)
+    print(f"🧠 Model backend: {backend}" + (f" with {params}" if params else ""))
+    stages = StageTimer()
 
-    # Load data
-    df = pd.read_csv("trainingk.csv")
-    df = preprocess_features(df)
-    print(f"📊 Dataset loaded: {df.shape}")
-    
-    # Clean data - remove rows with missing target values
     target_cols = ["RISK_30D", "RISK_60D", "RISK_90D"]
-    initial_rows = len(df)
-    df = df.dropna(subset=target_cols)
-    print(f"🧹 Data cleaning: Removed {initial_rows - len(df)} rows with missing target values")
-    print(f"📊 Clean dataset: {df.shape}")
 
-    # Features + targets
-    target_cols = ["RISK_30D", "RISK_60D", "RISK_90D"]
-    
     # Use ALL available features from the CSV (excluding ID, targets, and non-numeric columns)
     exclude_cols = [
         "DESYNPUF_ID", "RISK_30D", "RISK_60D", "RISK_90D", "RISK_LABEL", 
         "EMAIL", "TOP_3_FEATURES", "AI_RECOMMENDATIONS", "INDEX_DATE"
     ]
+
+    # Load data
+    with stages("load"):
+        df = read_training_csv(csv_path)
+        watermark = training_watermark(df)
+    with stages("preprocess"):
+        df = preprocess_features(df, copy=False)
+    print(f"📊 Dataset loaded: {df.shape}")
     
+    # Clean data - rows with missing target values are skipped when X is built
+    valid_rows = np.flatnonzero(df[target_cols].notna().all(axis=1).to_numpy())
+    print(f"🧹 Data cleaning: Removed {len(df) - len(valid_rows)} rows with missing target values")
+    print(f"📊 Clean dataset: ({len(valid_rows)}, {df.shape[1]})")
+
     # Get all numeric columns that are not in exclude list
     numeric_cols = df.select_dtypes(include=[np.number]).columns.tolist()
     feature_cols = [col for col in numeric_cols if col not in exclude_cols]
@@ -99,53 +272,33 @@ def quick_train():
     print(f"✅ Using ALL {len(feature_cols)} available features for training")
     print("🎯 Model will be trained with complete feature set for maximum accuracy")
 
-    # Handle missing values in features
-    X = df[feature_cols].fillna(0)  # Fill missing values with 0
-    y = df[target_cols]
+    # Build X once, already shuffled into [test | train] order, so both splits are views
+    with stages("build X"):
+        X, y, n_test = build_training_arrays(df, valid_rows, feature_cols, target_cols)
+        del df
+    X_test, X_train = X[:n_test], X[n_test:]
+    y_test, y_train = y[:n_test], y[n_test:]
     
-    print(f"🔍 Feature matrix shape: {X.shape}")
+    print(f"🔍 Feature matrix shape: {X.shape} ({X.dtype}, {X.nbytes / 1024**2:.0f} MB)")
     print(f"🔍 Target matrix shape: {y.shape}")
-    
-    # Check for any remaining NaN values
-    if X.isnull().any().any():
-        print("⚠️  Warning: Still have NaN values in features, filling with 0")
-        X = X.fillna(0)
-    
-    if y.isnull().any().any():
-        print("⚠️  Warning: Still have NaN values in targets, removing those rows")
-        valid_mask = ~y.isnull().any(axis=1)
-        X = X[valid_mask]
-        y = y[valid_mask]
-        print(f"🔍 Final clean dataset: {X.shape[0]} rows")
-
-    X_train, X_test, y_train, y_test = train_test_split(
-        X, y, test_size=0.3, random_state=42
-    )
 
-    # Train one regressor per target
-    regressors = {}
+    # Train one regressor per target. The scaler is the same for all three (same X_train),
+    # so it is fitted once and X_train is scaled in place; the pipelines share it.
+    with stages("fit"):
+        scaler = StandardScaler().fit(X_train)
+        X_train_scaled = scaler.transform(X_train, copy=False)
+        models = fit_regressors(X_train_scaled, y_train, target_cols, n_jobs, backend, params)
+        regressors = {col: Pipeline([("scaler", scaler), (STEP_NAMES[backend], models[col])]) for col in target_cols}
+        del X_train, X_train_scaled
+
     metrics = {}
-    for col in target_cols:
-        reg = Pipeline([
-            ("scaler", StandardScaler()),
-            ("rf", RandomForestRegressor(
-                n_estimators=100,  # Increased for better performance with more features
-                max_depth=8,       # Increased depth for more complex patterns
-                min_samples_leaf=20,  # Reduced for more sensitivity
-                min_samples_split=10, # Reduced for more sensitivity
-                max_features="sqrt",  # Better for larger feature sets
-                random_state=42
-            ))
-        ])
-        reg.fit(X_train, y_train[col])
-        regressors[col] = reg
-
-        # Eval
-        preds = reg.predict(X_test)
-        mae = mean_absolute_error(y_test[col], preds)
-        mse = mean_squared_error(y_test[col], preds)
-        r2 = r2_score(y_test[col], preds)
-        metrics[col] = {"MAE": mae, "MSE": mse, "R2": r2}
+    with stages("evaluate"):
+        for i, col in enumerate(target_cols):
+            preds = regressors[col].predict(X_test)
+            mae = mean_absolute_error(y_test[:, i], preds)
+            mse = mean_squared_error(y_test[:, i], preds)
+            r2 = r2_score(y_test[:, i], preds)
+            metrics[col] = {"MAE": mae, "MSE": mse, "R2": r2}
 
     avg_r2 = np.mean([m["R2"] for m in metrics.values()])
 
@@ -159,44 +312,49 @@ def quick_train():
     # -------------------------------
     # 3. SHAP feature importance
     # -------------------------------
-    model_30d = regressors["RISK_30D"].named_steps["rf"]
-    X_transformed = regressors["RISK_30D"].named_steps["scaler"].transform(X_test)
-
-    explainer = shap.TreeExplainer(model_30d)
-    shap_values = explainer.shap_values(X_transformed)
+    feature_importance = None
+    if explain:
+        with stages("explain"):
+            feature_importance = shap_importance(regressors, X_test, feature_cols, target_cols, shap_rows)
 
-    feature_importance = pd.DataFrame({
-        "feature": feature_cols,
-        "importance": np.abs(shap_values).mean(axis=0)
-    }).sort_values("importance", ascending=False)
-
-    print("\n🔍 TOP 10 FEATURES (SHAP):")
-    for i, row in feature_importance.head(10).iterrows():
-        print(f"{row['feature']:20s}: {row['importance']:.4f}")
+        print("\n🔍 TOP 10 FEATURES (SHAP, 30D / 60D / 90D):")
+        for i, row in feature_importance.head(10).iterrows():
+            print(f"{row['feature']:20s}: {row['RISK_30D']:.4f} / {row['RISK_60D']:.4f} / {row['RISK_90D']:.4f}")
 
     # -------------------------------
     # 4. Classification Report (30D label)
     # -------------------------------
-    def assign_label(score):
-        if score < 20: return "Very Low"
-        elif score < 40: return "Low"
-        elif score < 60: return "Medium"
-        elif score < 85: return "High"
-        else: return "Very High"
-
-    y_true_labels = y_test["RISK_30D"].apply(assign_label)
-    y_pred_labels = pd.Series(regressors["RISK_30D"].predict(X_test)).apply(assign_label)
-
-    labels = ["Very Low", "Low", "Medium", "High", "Very High"]
-    cm = confusion_matrix(y_true_labels, y_pred_labels, labels=labels)
-
-    print("\nConfusion Matrix:\n", cm)
-    print("\nClassification Report:\n")
-    print(classification_report(y_true_labels, y_pred_labels, target_names=labels))
+    with stages("classify"):
+        evaluate_risk(y_test[:, 0], regressors["RISK_30D"].predict(X_test))
 
     # -------------------------------
     # 5. Save model
     # -------------------------------
+    with stages("save"):
+        comprehensive_model = save_model_artifacts(regressors, feature_cols, target_cols, watermark, feature_importance,
+                                                   backend=backend, params=params or {})
+    stages.report()
+
+    return comprehensive_model, avg_r2, metrics, feature_importance
+
+
+# -------------------------------
+# 6. Saving and watermarks
+# -------------------------------
+def training_watermark(raw_df, rows=None):
+    """How far into the CSV a model has been trained: row count (the CSV is append-only) and last INDEX_DATE"""
+    rows = len(raw_df) if rows is None else rows
+    dates = pd.Series(dtype="datetime64[ns]")
+    if "INDEX_DATE" in raw_df:
+        dates = pd.to_datetime(raw_df["INDEX_DATE"].iloc[:rows], errors="coerce")
+    return {
+        "rows": int(rows),
+        "index_date": dates.max().strftime("%Y-%m-%d") if dates.notna().any() else None,
+    }
+
+
+def save_model_artifacts(regressors, feature_cols, target_cols, watermark, feature_importance=None, **extra):
+    """Write the app-compatible and comprehensive models (and feature importance) under a new timestamp"""
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     os.makedirs("models", exist_ok=True)
 
@@ -212,22 +370,288 @@ def quick_train():
         "regressors": regressors,
         "feature_cols": feature_cols,
         "target_cols": target_cols,
-        "preprocess": preprocess_features
+        "preprocess": preprocess_features,
+        "watermark": watermark,
+        **extra
     }
     
     comprehensive_path = f"models/risk_model_comprehensive_{timestamp}.pkl"
     with open(comprehensive_path, "wb") as f:
         pickle.dump(comprehensive_model, f)
-    feature_importance.to_csv(importance_path, index=False)
+    if feature_importance is not None:
+        feature_importance.to_csv(importance_path, index=False)
 
     print(f"\n💾 Models saved:")
     print(f"   App-compatible: {model_path}")
     print(f"   Comprehensive: {comprehensive_path}")
-    print(f"   Features: {importance_path}")
+    if feature_importance is not None:
+        print(f"   Features: {importance_path}")
+    print(f"   Watermark: {watermark['rows']} rows (INDEX_DATE up to {watermark['index_date']})")
     print("="*50)
 
-    return comprehensive_model, avg_r2, metrics, feature_importance
+    return comprehensive_model
+
+
+def latest_comprehensive_model(models_dir="models"):
+    """Path of the newest risk_model_comprehensive_*.pkl, or None"""
+    if not os.path.isdir(models_dir):
+        return None
+    names = sorted(n for n in os.listdir(models_dir)
+                   if n.startswith("risk_model_comprehensive_") and n.endswith(".pkl"))
+    return os.path.join(models_dir, names[-1]) if names else None
+
+
+# -------------------------------
+# 7. Incremental (warm-start) training
+# -------------------------------
+NEW_TREES = 20           # trees added per target on each incremental run
+MAX_TREES = 300          # beyond this the oldest trees are dropped, so the forest tracks recent data
+MIN_NEW_ROWS = 50        # fewer new rows than this: nothing worth training on
+MIN_WINDOW = 5000        # new trees see at least this many of the most recent rows
+HOLDOUT_FRACTION = 0.2   # newest share of the new rows, held out to score the update
+
+
+def _holdout_metrics(regressors, X, y, target_cols):
+    metrics = {}
+    for col in target_cols:
+        preds = regressors[col].predict(X)
+        metrics[col] = {"MAE": mean_absolute_error(y[col], preds), "R2": r2_score(y[col], preds)}
+    return metrics
+
 
+def incremental_train(csv_path="trainingk.csv", base_path=None, new_trees=NEW_TREES, max_trees=MAX_TREES):
+    """Add warm-started trees fitted on the rows appended since the base model's watermark
+
+    The newest HOLDOUT_FRACTION of those rows is held out: the base and updated models are
+    both scored on it, and the watermark stops before it so the next run trains on it.
+    """
+    print("🚀 Starting Incremental Risk Model Training...")
+    print("="*50)
+    start = time.perf_counter()
+
+    base_path = base_path or latest_comprehensive_model()
+    if base_path is None:
+        print("❌ No comprehensive model found in models/. Run a full training first: python train_model.py")
+        return None
+    with open(base_path, "rb") as f:
+        base = pickle.load(f)
+    watermark = base.get("watermark")
+    if not watermark:
+        print(f"❌ {base_path} has no training watermark. Run a full training first: python train_model.py")
+        return None
+
+    raw = read_training_csv(csv_path)
+    if len(raw) < watermark["rows"]:
+        print(f"❌ {csv_path} has {len(raw)} rows, fewer than the {watermark['rows']} the model was trained on. "
+              "The file was replaced; run a full training.")
+        return None
+
+    n_new = len(raw) - watermark["rows"]
+    print(f"📦 Base model: {base_path}")
+    print(f"📊 {n_new} new rows since watermark ({watermark['rows']} rows, INDEX_DATE up to {watermark['index_date']})")
+    if n_new < MIN_NEW_ROWS:
+        print(f"✅ Fewer than {MIN_NEW_ROWS} new rows, model is up to date")
+        return None
+
+    if base.get("backend", "random_forest") != "random_forest":
+        print(f"❌ Incremental training adds trees to a random forest; {base_path} uses {base['backend']}. "
+              "Run a full training.")
+        return None
+
+    feature_cols, target_cols, regressors = base["feature_cols"], base["target_cols"], base["regressors"]
+
+    # Rolling holdout: the newest rows. The new trees train on the other new rows plus
+    # enough of the rows just before them to fill MIN_WINDOW.
+    n_holdout = max(1, int(n_new * HOLDOUT_FRACTION))
+    holdout_start = len(raw) - n_holdout
+    window_start = max(0, min(watermark["rows"], holdout_start - MIN_WINDOW))
+
+    def frame(rows):
+        df = preprocess_features(rows).dropna(subset=target_cols)
+        return df[feature_cols].fillna(0), df[target_cols]
+
+    X_fit, y_fit = frame(raw.iloc[window_start:holdout_start])
+    X_hold, y_hold = frame(raw.iloc[holdout_start:])
+    print(f"🧩 Fitting {new_trees} new trees per target on {len(X_fit)} rows, holdout {len(X_hold)} rows")
+
+    before = _holdout_metrics(regressors, X_hold, y_hold, target_cols)
+    for col in target_cols:
+        scaler = regressors[col].named_steps["scaler"]
+        rf = regressors[col].named_steps["rf"]
+        # Keep the fitted scaler: existing trees split on its scaled values
+        rf.set_params(warm_start=True, n_estimators=len(rf.estimators_) + new_trees)
+        rf.fit(scaler.transform(X_fit), y_fit[col])
+        if len(rf.estimators_) > max_trees:
+            rf.estimators_ = rf.estimators_[-max_trees:]
+        rf.set_params(warm_start=False, n_estimators=len(rf.estimators_))
+    after = _holdout_metrics(regressors, X_hold, y_hold, target_cols)
+
+    print("\n📊 ROLLING HOLDOUT (newest rows)")
+    print("="*50)
+    for col in target_cols:
+        print(f"{col} → R²: {before[col]['R2']:.3f} → {after[col]['R2']:.3f}, "
+              f"MAE: {before[col]['MAE']:.3f} → {after[col]['MAE']:.3f} "
+              f"({len(regressors[col].named_steps['rf'].estimators_)} trees)")
+    print(f"⏱️  Incremental training took {time.perf_counter() - start:.1f}s")
+
+    return save_model_artifacts(regressors, feature_cols, target_cols, training_watermark(raw, holdout_start),
+                                backend="random_forest", base_model=base_path, holdout_metrics=after)
+
+
+
+# -------------------------------
+# 8. Hyperparameter search
+# -------------------------------
+# The app scores one patient (three predictions) per request; candidates slower than this are
+# heavily penalised, so the search cannot buy R² with latency the server cannot afford
+LATENCY_BUDGET_MS = float(os.getenv("SERVING_LATENCY_BUDGET_MS", 25))
+LATENCY_WEIGHT = 0.02        # R² traded per budget's worth of latency, within the budget
+OVER_BUDGET_PENALTY = 1.0
+LATENCY_SAMPLE_ROWS = 20
+
+SEARCH_SPACES = {
+    "random_forest": {
+        "n_estimators": [50, 100, 200, 300],
+        "max_depth": [4, 6, 8, 10, 12, None],
+        "min_samples_leaf": [5, 10, 20, 50],
+        "max_features": ["sqrt", "log2", 0.5],
+    },
+    "hist_gradient_boosting": {
+        "learning_rate": [0.05, 0.1, 0.2],
+        "max_leaf_nodes": [15, 31, 63],
+        "max_depth": [None, 4, 8],
+        "min_samples_leaf": [10, 20, 50],
+        "l2_regularization": [0.0, 0.1, 1.0],
+    },
+}
+
+
+def patient_latency_ms(model, X, n_rows=LATENCY_SAMPLE_ROWS, n_targets=3):
+    """Median time to score one patient, one row at a time as /api/predict does"""
+    timings = []
+    for row in X[:n_rows]:
+        row = row.reshape(1, -1)
+        start = time.perf_counter()
+        model.predict(row)
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings)) * 1000 * n_targets
+
+
+class LatencyAwareScorer:
+    """Search objective: R² minus a latency cost, with a flat penalty beyond the budget"""
+
+    def __init__(self, budget_ms=LATENCY_BUDGET_MS):
+        self.budget_ms = budget_ms
+
+    def __call__(self, estimator, X, y):
+        score = r2_score(y, estimator.predict(X))
+        latency = patient_latency_ms(estimator, X)
+        score -= LATENCY_WEIGHT * latency / self.budget_ms
+        if latency > self.budget_ms:
+            score -= OVER_BUDGET_PENALTY
+        return score
+
+
+def load_params(path):
+    """Regressor overrides from a tuning result (its best_params) or a plain JSON object"""
+    with open(path) as f:
+        params = json.load(f)
+    return params.get("best_params", params)
+
+
+def tune(csv_path="trainingk.csv", backend=MODEL_BACKEND, n_candidates=24, n_jobs=TRAIN_JOBS,
+         budget_ms=LATENCY_BUDGET_MS):
+    """Successive-halving random search over the backend's SEARCH_SPACES on RISK_30D
+
+    Every candidate starts on a small sample of the training rows; only the best third go on
+    to three times as many rows, until the survivors see all of them. Trees are
+    scale-invariant, so candidates are fitted without the scaler.
+    """
+    # Imported here: only the search needs the experimental halving estimators
+    from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+    from sklearn.model_selection import HalvingRandomSearchCV
+
+    print(f"🔎 Tuning {backend} on {csv_path}: {n_candidates} candidates, "
+          f"latency budget {budget_ms:.0f} ms per patient")
+    print("="*50)
+    start = time.perf_counter()
+
+    df = preprocess_features(read_training_csv(csv_path), copy=False)
+    target_cols = ["RISK_30D", "RISK_60D", "RISK_90D"]
+    exclude = set(target_cols) | {"INDEX_DATE", "COMOR_COUNT"}
+    feature_cols = [col for col in df.select_dtypes(include=[np.number]).columns if col not in exclude]
+    valid_rows = np.flatnonzero(df[target_cols].notna().all(axis=1).to_numpy())
+    X, y, n_test = build_training_arrays(df, valid_rows, feature_cols, target_cols)
+    del df
+    X_test, X_train = X[:n_test], X[n_test:]
+    y_test, y_train = y[:n_test, 0], y[n_test:, 0]
+
+    search = HalvingRandomSearchCV(
+        make_regressor(backend, n_jobs=1), SEARCH_SPACES[backend],
+        n_candidates=n_candidates, factor=3, resource="n_samples", min_resources="exhaust",
+        cv=3, scoring=LatencyAwareScorer(budget_ms), n_jobs=n_jobs, random_state=42,
+    )
+    search.fit(X_train, y_train)
+
+    results = pd.DataFrame(search.cv_results_)
+    final_round = results[results["iter"] == results["iter"].max()].sort_values("rank_test_score")
+    print(f"\n📊 {len(results)} fits over {results['iter'].max() + 1} rounds "
+          f"({', '.join(str(n) for n in search.n_resources_)} rows)")
+    print("🏁 Final round:")
+    for _, row in final_round.head(5).iterrows():
+        print(f"   {row['mean_test_score']:.3f}  {row['params']}")
+
+    best = search.best_estimator_
+    test_r2 = r2_score(y_test, best.predict(X_test))
+    latency = patient_latency_ms(best, X_test, n_rows=200)
+    print(f"\n✅ Best: {search.best_params_}")
+    print(f"   RISK_30D test R²: {test_r2:.3f}, patient latency p50: {latency:.1f} ms "
+          f"({'within' if latency <= budget_ms else 'OVER'} the {budget_ms:.0f} ms budget)")
+
+    os.makedirs("models", exist_ok=True)
+    result_path = f"models/tuning_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    result = {
+        "backend": backend,
+        "best_params": search.best_params_,
+        "search_score": float(search.best_score_),
+        "test_r2_30d": float(test_r2),
+        "patient_latency_ms": latency,
+        "latency_budget_ms": budget_ms,
+        "n_candidates": n_candidates,
+    }
+    with open(result_path, "w") as f:
+        json.dump(result, f, indent=2)
+    print(f"💾 {result_path}  (train with: python train_model.py --backend {backend} --params {result_path})")
+    print(f"⏱️  Search took {time.perf_counter() - start:.1f}s")
+    return result
 
 if __name__ == "__main__":
-    model, score, metrics, feats = quick_train()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Train the risk models")
+    parser.add_argument("--csv", default="trainingk.csv", help="training data")
+    parser.add_argument("--incremental", action="store_true",
+                        help="warm-start the newest model with rows added since its watermark")
+    parser.add_argument("--base", help="comprehensive model to extend (default: newest in models/)")
+    parser.add_argument("--new-trees", type=int, default=NEW_TREES, help="trees added per target")
+    parser.add_argument("--max-trees", type=int, default=MAX_TREES, help="trees kept per target")
+    parser.add_argument("--backend", choices=BACKENDS, default=MODEL_BACKEND,
+                        help="regressor type (default: MODEL_BACKEND or random_forest)")
+    parser.add_argument("--jobs", type=int, default=TRAIN_JOBS, help="cores used to fit the models")
+    parser.add_argument("--no-shap", action="store_true", help="skip the SHAP feature importance step")
+    parser.add_argument("--shap-rows", type=int, default=SHAP_MAX_ROWS,
+                        help="test rows explained for feature importance (0: all)")
+    parser.add_argument("--tune", action="store_true",
+                        help="search hyperparameters for --backend instead of training")
+    parser.add_argument("--candidates", type=int, default=24, help="parameter sets the search starts with")
+    parser.add_argument("--latency-budget-ms", type=float, default=LATENCY_BUDGET_MS,
+                        help="per-patient prediction budget the search must respect")
+    parser.add_argument("--params", help="JSON of regressor parameters, e.g. a models/tuning_*.json result")
+    args = parser.parse_args()
+
+    if args.tune:
+        tune(args.csv, args.backend, args.candidates, args.jobs, args.latency_budget_ms)
+    elif args.incremental:
+        incremental_train(args.csv, args.base, args.new_trees, args.max_trees)
+    else:
+        params = load_params(args.params) if args.params else None
+        model, score, metrics, feats = quick_train(args.csv, args.jobs, explain=not args.no_shap,
+                                                   backend=args.backend, params=params, shap_rows=args.shap_rows)
\ No newline at end of file
@@ -0,0 +1,13 @@
+#!/usr/bin/env python3
+"""
+WSGI entry point for production servers
+- gunicorn -c gunicorn.conf.py wsgi:app
+- waitress-serve --port=5000 wsgi:app   (pure Python, also runs on Windows)
+"""
+
+from app import app, preload
+
+# With gunicorn's preload_app this runs once in the master, before workers are forked
+preload()
+
+__all__ = ["app"]